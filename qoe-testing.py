@@ -3,21 +3,46 @@ Quality of Experience (QoE) Testing Script
 -----------------------------------------
 This script uses Python, Selenium, and headless Chrome to measure various
 performance metrics for a list of websites including:
-- Page load time (Total time to load the page)
+- Page load time (Browser's loadEventEnd - navigationStart)
 - Time to first byte (TTFB)
 - Above-the-fold load time (First Contentful Paint)
 - Latency (Delay before the first byte is received)
 - Error rate (Percentage of errors during testing)
 - Time to interactive (Time that the page is fully loaded and interactive)
 
+Harness phases (driver startup, navigation, log retrieval and parsing,
+script evaluation) are timed separately so the harness's own overhead is
+visible next to the page metrics.
+
+With --ab-test the extension's overhead is measured in one pass: every
+sample loads the URL with and without the extension side by side and the
+paired differences are tested for significance.
+
+URLs can be tested sequentially or on a pool of concurrent headless Chrome
+workers (--workers N). Each URL can also be measured under several emulated
+network profiles (--network-profile 3g --network-profile 4g); the
+URL x profile matrix runs on the same worker pool and results are keyed by
+profile. Large URL lists can be split across hosts through a
+shared work queue (see qoe_queue.py and the enqueue, work and merge
+commands).
+
 Results are saved in a format viewable in a web browser.
 """
 
+import argparse
+import asyncio
+import concurrent.futures
 import time
 import json
-import statistics
 import datetime
+import functools
+import multiprocessing.util
 import os
+import re
+import socket
+import sys
+import threading
+import uuid
 from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -25,25 +50,654 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.common.exceptions import InvalidSessionIdException, TimeoutException, WebDriverException
+
+from qoe_bench import compare_to_baseline, load_report, print_report, run_benchmark
+from qoe_cdp import CDPEngine, CDPError
+from qoe_columnar import ColumnarWriter, export_jsonl
+from qoe_compare import COMPARE_METRICS, compare_samples, load_samples, print_comparison
+from qoe_history import HistoryStore, result_key, shared_hosts
+from qoe_monitor import MetricsServer, MonitorStore, parse_schedule
+from qoe_network import NETWORK_PROFILES, emulation_params, resolve_profiles
+from qoe_perflog import PerformanceLogDrain, configure_performance_log, extract_network_metrics
+from qoe_queue import WorkQueue
+from qoe_report import write_html_report
+from qoe_scheduler import DeadlineScheduler
+from qoe_sessions import DriverPool, PROFILE_POLICIES, ServicePool
+from qoe_sinks import JSONLSink
+from qoe_trace import Tracer
+from qoe_stats import QuantileSketch, paired_t_test, relative_ci_halfwidth, wilcoxon_signed_rank
+from qoe_vitals import VITALS_METRICS, VITALS_SCRIPT
+from qoe_waterfall import Waterfall
+
+
+# Measurement engines QoETester can drive Chrome with
+ENGINES = ("selenium", "cdp")
+
+# Browser variants loaded side by side in A/B extension-overhead mode
+AB_VARIANTS = ("baseline", "extension")
+
+# Additional network metrics pulled from the performance log
+NETWORK_METRICS = (
+    "latency", "dns_time", "connect_time", "ssl_time",
+    "request_count", "failed_requests", "transfer_bytes"
+)
+
+# Additional in-page metrics returned by PAGE_METRICS_SCRIPT
+PAGE_METRICS = ("resource_count", "resource_transfer_bytes")
+
+# Harness timings per sample: driver startup, navigation until the load
+# event (which includes the performance log drains), performance log
+# retrieval and parsing, in-page script evaluation, the whole sample, and
+# the part of the sample that is not the browser's own page load
+PHASE_METRICS = (
+    "driver_startup_time", "navigation_time", "log_retrieval_time",
+    "log_parse_time", "script_evaluation_time", "sample_time", "harness_overhead"
+)
+
+# Metrics averaged into each URL's result entry
+METRICS = (
+    ("page_load_time", "above_fold_time", "ttfb", "time_to_interactive")
+    + VITALS_METRICS + NETWORK_METRICS + PAGE_METRICS + PHASE_METRICS
+)
+
+# Identifies the document currently loaded in a session
+DOCUMENT_ORIGIN_SCRIPT = "return performance.timeOrigin;"
+
+# True once a new document has committed and its load event has finished.
+# Pages load with the "none" page load strategy while the performance log is
+# drained, so driver.get() returns before the navigation commits and the
+# previous document (about:blank or a pooled session's last page, whose
+# timeOrigin is arguments[0]) must not count as loaded
+LOAD_COMPLETE_SCRIPT = """
+return performance.timeOrigin !== arguments[0]
+    && document.readyState === 'complete' && performance.timing.loadEventEnd > 0;
+"""
+
+# Collects every browser-side metric in a single WebDriver round trip
+PAGE_METRICS_SCRIPT = """
+const perf = window.performance;
+const toJSON = (entry) => entry.toJSON ? entry.toJSON() : entry;
+
+const paint = perf.getEntriesByType('paint').map(toJSON);
+const fcpEntry = paint.filter(entry => entry.name === 'first-contentful-paint')[0];
+
+// Legacy Navigation Timing (absolute epoch milliseconds)
+const timing = {};
+for (const key in perf.timing) {
+    if (typeof perf.timing[key] === 'number') {
+        timing[key] = perf.timing[key];
+    }
+}
+const navEntry = perf.getEntriesByType('navigation')[0];
+
+// LCP, CLS, long tasks, TBT and TTI recorded since document start by
+// qoe_vitals.VITALS_SCRIPT
+const vitals = window.__qoeVitals ? window.__qoeVitals.snapshot() : null;
+
+const resources = perf.getEntriesByType('resource');
+let transferSize = 0;
+for (const entry of resources) {
+    transferSize += entry.transferSize || 0;
+}
+
+return {
+    fcp: fcpEntry ? fcpEntry.startTime : null,
+    vitals: vitals,
+    timing: timing,
+    navigation: navEntry ? toJSON(navEntry) : null,
+    paint: paint,
+    resource_count: resources.length,
+    resource_transfer_bytes: transferSize
+};
+"""
+
+
+def browser_load_time(page):
+    """
+    Return the browser's own page load time from in-page metrics.
+    
+    Args:
+        page (dict): In-page metrics from PAGE_METRICS_SCRIPT
+        
+    Returns:
+        float: loadEventEnd - navigationStart in milliseconds, or None if
+            the load event has not finished
+    """
+    navigation = page.get("navigation") or {}
+    if navigation.get("loadEventEnd"):
+        return navigation["loadEventEnd"] - navigation.get("startTime", 0)
+    timing = page.get("timing") or {}
+    if timing.get("loadEventEnd") and timing.get("navigationStart"):
+        return timing["loadEventEnd"] - timing["navigationStart"]
+    return None
+
+
+def close_service_pool(service_pool):
+    """Stop a chromedriver ServicePool and print how much startup it saved."""
+    stats = service_pool.stats()
+    service_pool.close()
+    if stats["launches"]:
+        print(
+            f"Shared chromedriver: {stats['sessions']} sessions on {stats['services']} services "
+            f"({stats['launches']} launches, {stats['service_startup_time']:.0f} ms each)"
+        )
+    if stats["saved_time"] is not None:
+        print(
+            f"Session startup: {stats['cold_session_time']:.0f} ms launching chromedriver, "
+            f"{stats['warm_session_time']:.0f} ms attached; saved {stats['saved_time_per_session']:.0f} ms "
+            f"per attached session, {stats['saved_time'] / 1000:.1f} s in total"
+        )
+
+
+# QoETester instances installed in this worker process, by tester token
+_WORKER_TESTERS = {}
+
+# QoETester attributes each process builds for itself
+_PROCESS_LOCAL_STATE = ("_driver_pools", "_service_pool", "_sink", "_columnar", "_driver_pool_lock", "tracer")
+
+# QoETester attributes holding the run's URLs and results, which worker
+# processes never read
+_RESULT_STATE = ("urls", "shared_hosts", "results", "run_sketches", "scheduler_stats")
+
+# Settings that change between runs and travel with every task
+_TASK_STATE = ("run_id",)
+
+
+def _install_tester(token, state):
+    """Process pool initializer: build this process's copy of a QoETester once."""
+    tester = QoETester.__new__(QoETester)
+    tester.__setstate__(state)
+    _WORKER_TESTERS[token] = tester
+
+
+def _restore_tester(token, settings):
+    """Unpickle a QoETester as this process's installed instance for the same tester."""
+    tester = _WORKER_TESTERS.get(token)
+    if tester is None:
+        raise RuntimeError("QoETester was not installed in this worker process; "
+                           "create process pools with QoETester._make_executor()")
+    # Pick up settings changed since the last task, e.g. run_id
+    tester.__dict__.update(settings)
+    return tester
+
+
+class URLSummary:
+    """Streaming reduction of one URL's samples into its result entry."""
+    
+    def __init__(self, url, profile=None, keep_values=()):
+        """
+        Initialize an empty summary.
+        
+        Args:
+            url (str): URL the samples belong to
+            profile (str, optional): Network profile the samples used
+            keep_values (tuple): Metrics whose raw per-iteration values are
+                kept for the result; the others are only sketched
+        """
+        self.url = url
+        self.profile = profile
+        self.sample_count = 0
+        self.errors = []
+        # Samples won by a hedged duplicate load are biased towards the
+        # faster of two loads, so they are summarized apart from the others
+        self.hedge_wins = 0
+        self.hedged_sketches = {}
+        self.sketches = {metric: QuantileSketch() for metric in METRICS}
+        # Raw per-iteration values, for rank tests between runs
+        self.values = {metric: [] for metric in keep_values}
+        # Set by an adaptive SamplingPlan once the URL is done
+        self.converged = None
+    
+    def add(self, sample, hedge_won=None):
+        """
+        Fold one sample into the summary.
+        
+        Args:
+            sample (dict): Sample returned by QoETester._run_iteration
+            hedge_won (bool, optional): Whether a hedged duplicate won the
+                sample, default the sample's "hedge_won" flag. Such samples
+                only go into the separate hedged statistics.
+        """
+        self.sample_count += 1
+        if sample["error"]:
+            self.errors.append((sample["iteration"], sample["error"]))
+        if hedge_won is None:
+            hedge_won = sample.get("hedge_won")
+        if hedge_won:
+            self.hedge_wins += 1
+            for metric, value in sample["metrics"].items():
+                if metric in self.sketches:
+                    self.hedged_sketches.setdefault(metric, QuantileSketch()).add(value)
+            return
+        for metric, value in sample["metrics"].items():
+            if metric in self.sketches:
+                self.sketches[metric].add(value)
+            if metric in self.values:
+                self.values[metric].append(value)
+    
+    def result(self):
+        """
+        Return the URL's result entry.
+        
+        Returns:
+            dict: Error rate and messages, the mean of every metric (None
+                without data), distribution statistics under "stats" and the
+                raw per-iteration values of the keep_values metrics under
+                "values". Means, statistics and values leave out hedge-won
+                samples, whose statistics are under "hedged_stats".
+        """
+        # Calculate error rate
+        error_rate = (len(self.errors) / self.sample_count) * 100 if self.sample_count else 0.0
+        
+        result = {
+            "url": self.url,
+            "error_rate": error_rate,
+            "error_messages": [message for _, message in sorted(self.errors, key=lambda error: error[0])]
+        }
+        
+        # Calculate average metrics if we have data
+        stats = {}
+        for metric, sketch in self.sketches.items():
+            if sketch.count:
+                result[metric] = sketch.mean
+                stats[metric] = sketch.summary()
+            else:
+                result[metric] = None
+        result["samples"] = self.sample_count
+        if self.profile is not None:
+            result["profile"] = self.profile
+        if self.converged is not None:
+            result["converged"] = self.converged
+        if self.hedge_wins:
+            result["hedge_wins"] = self.hedge_wins
+            result["hedged_stats"] = {metric: sketch.summary() for metric, sketch in self.hedged_sketches.items()}
+        result["stats"] = stats
+        if self.values:
+            result["values"] = {metric: values for metric, values in self.values.items() if values}
+        
+        return result
+
+
+class PairedSummary:
+    """
+    Streaming reduction of one URL's with/without-extension sample pairs.
+    
+    Each variant is summarized like a normal URL, and for every pair where
+    both loads succeeded (and no hedged duplicate won) the per-metric
+    difference (extension minus baseline) is kept for the paired
+    significance tests.
+    """
+    
+    def __init__(self, url, profile=None, keep_values=()):
+        """
+        Initialize an empty summary.
+        
+        Args:
+            url (str): URL the pairs belong to
+            profile (str, optional): Network profile the pairs used
+            keep_values (tuple): Metrics whose raw values each variant keeps
+        """
+        self.url = url
+        self.profile = profile
+        self.variants = {variant: URLSummary(url, profile, keep_values) for variant in AB_VARIANTS}
+        self.differences = {metric: [] for metric in METRICS}
+        self.converged = None
+    
+    @property
+    def sample_count(self):
+        return self.variants["extension"].sample_count
+    
+    @property
+    def sketches(self):
+        # Adaptive sampling converges on the loads with the extension
+        return self.variants["extension"].sketches
+    
+    def add(self, pair):
+        """
+        Fold one pair into the summary.
+        
+        Args:
+            pair (dict): Pair returned by QoETester._run_pair
+        """
+        samples = pair["variants"]
+        for variant, sample in samples.items():
+            self.variants[variant].add(sample, hedge_won=pair.get("hedge_won"))
+        if pair.get("hedge_won") or samples["extension"]["error"] or samples["baseline"]["error"]:
+            return
+        for metric, differences in self.differences.items():
+            with_extension = samples["extension"]["metrics"].get(metric)
+            without_extension = samples["baseline"]["metrics"].get(metric)
+            if with_extension is not None and without_extension is not None:
+                differences.append(with_extension - without_extension)
+    
+    def overhead(self, confidence=0.95):
+        """
+        Return the extension's overhead per metric.
+        
+        Args:
+            confidence (float): Confidence level of the interval and the
+                significance threshold (p < 1 - confidence)
+            
+        Returns:
+            dict: Metric to pairs, mean and median difference, confidence
+                interval, difference relative to the baseline mean, paired
+                t-test and Wilcoxon signed-rank p-values and a significant
+                flag, for metrics with at least two pairs
+        """
+        overhead = {}
+        for metric, differences in self.differences.items():
+            t_test = paired_t_test(differences, confidence)
+            if t_test is None:
+                continue
+            wilcoxon = wilcoxon_signed_rank(differences)
+            baseline_mean = self.variants["baseline"].sketches[metric].mean
+            ordered = sorted(differences)
+            middle = len(ordered) // 2
+            overhead[metric] = {
+                "pairs": t_test["n"],
+                "mean_difference": t_test["mean"],
+                "median_difference": (ordered[middle] + ordered[~middle]) / 2,
+                "ci_low": t_test["ci_low"],
+                "ci_high": t_test["ci_high"],
+                "relative_difference": t_test["mean"] / baseline_mean if baseline_mean else None,
+                "t_p_value": t_test["p_value"],
+                "wilcoxon_p_value": wilcoxon["p_value"] if wilcoxon else 1.0,
+                "significant": t_test["p_value"] < 1 - confidence,
+            }
+        return overhead
+
+
+class SamplingPlan:
+    """
+    Decides which samples to take for each URL (or URL and network
+    profile pair).
+    
+    A fixed plan schedules exactly `iterations` samples per URL up front.
+    An adaptive plan schedules `min_iterations` samples, then one more at a
+    time until the confidence interval on the mean of every convergence
+    metric is within `target_precision` of the mean, or `iterations`
+    samples have been taken. Stable URLs stop early and the sampling budget
+    goes to the noisy ones.
+    """
+    
+    def __init__(self, cases, iterations, adaptive=False, min_iterations=3,
+                 target_precision=0.05, confidence=0.95,
+                 convergence_metrics=("page_load_time",), summary_factory=URLSummary):
+        """
+        Initialize the plan.
+        
+        Args:
+            cases (list): (url, network profile name or None) pairs to
+                sample
+            iterations (int): Samples per URL (the maximum when adaptive)
+            adaptive (bool): Stop sampling a URL once its metrics converge
+            min_iterations (int): Samples taken before checking convergence
+            target_precision (float): Relative confidence interval
+                half-width to reach, e.g. 0.05 for mean +/- 5%
+            confidence (float): Confidence level of the interval
+            convergence_metrics (tuple): Metrics that must converge
+            summary_factory (type): Called with (url, profile) to create
+                each case's summary (URLSummary or PairedSummary)
+        """
+        self.cases = cases
+        self.iterations = iterations
+        self.adaptive = adaptive
+        self.min_iterations = max(2, min(min_iterations, iterations))
+        self.target_precision = target_precision
+        self.confidence = confidence
+        self.convergence_metrics = convergence_metrics
+        self.summary_factory = summary_factory
+        self._summaries = {}
+        self._scheduled = {}
+        self._in_flight = {}
+    
+    def initial_tasks(self):
+        """
+        Return the samples to schedule up front.
+        
+        Iterations are interleaved round-robin across URLs so slow sites
+        don't serialise behind each other at the end of the run.
+        
+        Returns:
+            list: (case index, iteration) tuples
+        """
+        batch = self.min_iterations if self.adaptive else self.iterations
+        for index in range(len(self.cases)):
+            self._scheduled[index] = self._in_flight[index] = batch
+        return [(index, i) for i in range(batch) for index in range(len(self.cases))]
+    
+    def add(self, index, sample):
+        """
+        Record a finished sample.
+        
+        Args:
+            index (int): Index of the sample's case
+            sample (dict): Sample returned by QoETester._run_iteration
+            
+        Returns:
+            tuple: (follow-up (case index, iteration) tasks, the case's
+                URLSummary if it needs no more samples, else None)
+        """
+        if index not in self._summaries:
+            self._summaries[index] = self.summary_factory(*self.cases[index])
+        summary = self._summaries[index]
+        summary.add(sample)
+        self._in_flight[index] -= 1
+        if self._in_flight[index]:
+            return [], None
+        
+        if self.adaptive:
+            summary.converged = self.converged(summary)
+            if not summary.converged and self._scheduled[index] < self.iterations:
+                iteration = self._scheduled[index]
+                self._scheduled[index] += 1
+                self._in_flight[index] = 1
+                return [(index, iteration)], None
+        return [], self._summaries.pop(index)
+    
+    def converged(self, summary):
+        """
+        Check whether a URL's convergence metrics are precise enough.
+        
+        Metrics without any data (every sample failed) have nothing left
+        to refine and count as converged.
+        
+        Args:
+            summary (URLSummary|PairedSummary): Samples collected for the URL
+            
+        Returns:
+            bool: True if no more samples are needed
+        """
+        if summary.sample_count < self.min_iterations:
+            return False
+        for metric in self.convergence_metrics:
+            sketch = summary.sketches[metric]
+            if not sketch.count:
+                continue
+            if sketch.count < 2:
+                return False
+            precision = relative_ci_halfwidth(sketch, self.confidence)
+            if precision is not None and precision > self.target_precision:
+                return False
+        return True
 
 
 class QoETester:
-    def __init__(self, urls, iterations=3, timeout=60, extension_path=None):
+    def __init__(self, urls, iterations=3, timeout=60, extension_path=None,
+                 workers=1, executor="thread", ordered=True,
+                 worker_js_heap_mb=None, worker_renderer_processes=None,
+                 max_tasks_per_worker=None, profile_policy="fresh",
+                 max_session_uses=50, engine="selenium", chrome_binary=None,
+                 results_stream=None, history_db=None, adaptive=False,
+                 min_iterations=3, target_precision=0.05, confidence=0.95,
+                 convergence_metrics=("page_load_time",), network_profiles=None,
+                 waterfall_dir=None, waterfall_max_requests=500, ab_test=False,
+                 ab_parallel=True, chromedriver_services=1, run_budget=None,
+                 url_budget=None, hedge_slots=0, hedge_quantile=0.9,
+                 max_retries=0, retry_backoff=1.0, trace_file=None, profile_file=None,
+                 log_poll_interval=0.1, columnar_dir=None, keep_values=COMPARE_METRICS):
         """
         Initialize the QoE tester with a list of URLs to test.
         
         Args:
             urls (list): List of URLs to test
-            iterations (int): Number of times to test each URL
+            iterations (int): Number of times to test each URL (the
+                maximum in adaptive mode)
             timeout (int): Maximum wait time for page load in seconds
             extension_path (str, optional): Path to Chrome extension to load
+            workers (int): Number of headless Chrome workers running at once.
+                1 keeps the original sequential behaviour.
+            executor (str): "thread" or "process" pool used when workers > 1
+            ordered (bool): Merge results in URL order (True) or in the order
+                URLs finish (False)
+            worker_js_heap_mb (int, optional): V8 heap limit for each
+                worker's renderer
+            worker_renderer_processes (int, optional): Maximum number of
+                renderer processes each worker's Chrome may spawn
+            max_tasks_per_worker (int, optional): Recycle a worker process
+                after this many samples (process executor only)
+            profile_policy (str): "fresh" starts a new browser for every
+                sample; "reused" keeps warm sessions and resets cache,
+                cookies, storage and service workers between navigations
+            max_session_uses (int): Samples a reused session serves before
+                it is replaced
+            engine (str): "selenium" drives Chrome through chromedriver;
+                "cdp" speaks the DevTools Protocol directly with asyncio and
+                runs up to `workers` tabs concurrently in one browser
+            chrome_binary (str, optional): Chrome executable for the CDP
+                engine
+            results_stream (str, optional): JSON Lines file every sample is
+                appended to as soon as it finishes
+            history_db (str, optional): SQLite history store that
+                generate_report adds each run's results to
+            adaptive (bool): Stop sampling a URL once the confidence
+                interval on its convergence metrics is narrow enough
+            min_iterations (int): Samples per URL before checking
+                convergence in adaptive mode
+            target_precision (float): Relative confidence interval
+                half-width to reach in adaptive mode (0.05 = mean +/- 5%)
+            confidence (float): Confidence level of that interval
+            convergence_metrics (tuple): Metrics that must converge
+            network_profiles (list|dict, optional): Network profiles to
+                measure every URL under: preset names from
+                qoe_network.NETWORK_PROFILES, "name:latency:download:upload"
+                specs, or a dict of profiles keyed by name. Results are then
+                keyed "<domain> [<profile>]". The URL x profile matrix
+                shares the worker pool, so use at least as many workers as
+                profiles to run them side by side.
+            waterfall_dir (str, optional): Capture every request of each
+                load and save it as a HAR-like file under
+                <waterfall_dir>/<run_id>/
+            waterfall_max_requests (int): Requests kept per captured page
+            ab_test (bool): Measure the extension's overhead: every sample
+                is a pair of loads with and without the extension, results
+                are keyed "<domain> [baseline]" and "<domain> [extension]"
+                and the extension entry carries the paired differences
+                under "overhead". Requires extension_path and the selenium
+                engine.
+            ab_parallel (bool): Run the two loads of a pair at the same time
+                (so both see the same network conditions) instead of one
+                after the other in alternating order
+            chromedriver_services (int): Long-lived chromedriver processes
+                every session in a worker process attaches to; 0 starts a
+                chromedriver per session
+            run_budget (float, optional): Wall-clock seconds for the whole
+                run; samples not taken by then are recorded as skipped
+            url_budget (float, optional): Wall-clock seconds each URL (and
+                network profile) may spend across all of its samples
+            hedge_slots (int): Extra browsers that duplicate loads running
+                past their URL's typical latency; the first to succeed wins
+            hedge_quantile (float): Quantile of earlier load durations
+                after which a load is hedged
+            max_retries (int): Retries of a sample that failed with a
+                WebDriver error, with exponential backoff
+            retry_backoff (float): Seconds before the first retry
+            trace_file (str, optional): Record spans around every harness
+                phase and write them here as Chrome trace-event JSON (see
+                finish_profiling)
+            profile_file (str, optional): Run cProfile over the run and
+                write the pstats data here (cProfile only sees the thread
+                that started the run)
+            log_poll_interval (float): Seconds between performance log
+                drains while a page loads
+            columnar_dir (str, optional): Also stream every sample into a
+                columnar store (see qoe_columnar.py) at
+                <columnar_dir>/qoe_samples_<run_id>.qoecol
+            keep_values (iterable): Metrics whose raw per-iteration values
+                are written into each result under "values" for the compare
+                command, by default the page QoE metrics it tests; other
+                metrics are only summarized
         """
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor: {executor}")
+        if profile_policy not in PROFILE_POLICIES:
+            raise ValueError(f"Unknown profile policy: {profile_policy}")
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        if ab_test and not extension_path:
+            raise ValueError("A/B mode needs an extension_path")
+        if ab_test and engine != "selenium":
+            raise ValueError("A/B mode uses the selenium engine")
+        scheduled = run_budget is not None or url_budget is not None or hedge_slots or max_retries
+        if scheduled and (engine != "selenium" or executor != "thread"):
+            raise ValueError("Budgets, hedging and retries need the selenium engine and thread executor")
+
         self.urls = urls
+        # Hosts with several tested pages, whose result keys include the page
+        self.shared_hosts = shared_hosts(urls)
         self.iterations = iterations
         self.timeout = timeout
         self.extension_path = extension_path
+        self.workers = max(1, int(workers))
+        self.executor = executor
+        self.ordered = ordered
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.profile_policy = profile_policy
+        self.max_session_uses = max_session_uses
+        self.engine = engine
+        self.chrome_binary = chrome_binary
+        self.results_stream = results_stream
+        self.history_db = history_db
+        self.adaptive = adaptive
+        self.min_iterations = min_iterations
+        self.target_precision = target_precision
+        self.confidence = confidence
+        self.convergence_metrics = tuple(convergence_metrics)
+        self.network_profiles = resolve_profiles(network_profiles or ())
+        self.waterfall_dir = waterfall_dir
+        self.waterfall_max_requests = waterfall_max_requests
+        self.ab_test = ab_test
+        self.ab_parallel = ab_parallel
+        self.chromedriver_services = chromedriver_services
+        self.run_budget = run_budget
+        self.url_budget = url_budget
+        self.hedge_slots = hedge_slots
+        self.hedge_quantile = hedge_quantile
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.scheduler_stats = {}
+        self.log_poll_interval = log_poll_interval
+        self.columnar_dir = columnar_dir
+        unknown = set(keep_values) - set(METRICS)
+        if unknown:
+            raise ValueError(f"Unknown metrics to keep values of: {', '.join(sorted(unknown))}")
+        self.keep_values = tuple(keep_values)
+        self.trace_file = trace_file
+        self.profile_file = profile_file
+        self.tracer = Tracer(enabled=bool(trace_file), profile=bool(profile_file))
+        unknown = set(self.convergence_metrics) - set(METRICS)
+        if unknown:
+            raise ValueError(f"Unknown convergence metrics: {', '.join(sorted(unknown))}")
+        self.run_id = None
         self.results = {}
+        self.run_sketches = {metric: QuantileSketch() for metric in METRICS}
+        self._driver_pools = {}
+        self._service_pool = None
+        self._driver_pool_lock = threading.Lock()
+        self._sink = None
+        self._columnar = None
+        self._token = uuid.uuid4().hex
         
         # Setup Chrome options
         self.chrome_options = Options()
@@ -56,14 +710,223 @@ class QoETester:
         # Load extension if path is provided
         if extension_path:
             self.chrome_options.add_argument(f"--load-extension={extension_path}")
+
+        # Per-worker resource limits
+        if worker_js_heap_mb:
+            self.chrome_options.add_argument(f"--js-flags=--max-old-space-size={int(worker_js_heap_mb)}")
+        if worker_renderer_processes:
+            self.chrome_options.add_argument(f"--renderer-process-limit={int(worker_renderer_processes)}")
         
-        # Add performance logging capabilities
-        self.chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        # Network-only performance log, drained while the page loads, so
+        # driver.get must not block until the load event
+        configure_performance_log(self.chrome_options)
+        self.chrome_options.page_load_strategy = "none"
         self.chrome_options.add_argument("--enable-automation")
         
-    def setup_driver(self):
-        """Set up and return a new WebDriver instance."""
-        return webdriver.Chrome(options=self.chrome_options)
+        # Same browser without the extension for the A/B baseline
+        self.baseline_options = None
+        if ab_test:
+            self.baseline_options = Options()
+            for argument in self.chrome_options.arguments:
+                if not argument.startswith("--load-extension="):
+                    self.baseline_options.add_argument(argument)
+            configure_performance_log(self.baseline_options)
+            self.baseline_options.page_load_strategy = "none"
+        
+    def __getstate__(self):
+        # Worker processes build their own driver and service pools and
+        # never see the run's results
+        state = self.__dict__.copy()
+        for name in _PROCESS_LOCAL_STATE + _RESULT_STATE:
+            del state[name]
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.urls = []
+        self.shared_hosts = set()
+        self.results = {}
+        self.run_sketches = {metric: QuantileSketch() for metric in METRICS}
+        self.scheduler_stats = {}
+        self._driver_pools = {}
+        self._service_pool = None
+        self._sink = None
+        self._columnar = None
+        self._driver_pool_lock = threading.Lock()
+        # Spans go back to the parent with every sample (see _run_traced)
+        self.tracer = Tracer(enabled=bool(self.trace_file))
+    
+    def __reduce__(self):
+        # Every task sent to a worker process carries the tester. The
+        # settings were installed once per process by the pool initializer,
+        # so a task only ships the token and the per-run settings, and its
+        # size does not grow with the run
+        return _restore_tester, (self._token, {name: getattr(self, name) for name in _TASK_STATE})
+    
+    def setup_driver(self, variant=None):
+        """
+        Set up and return a new WebDriver instance.
+        
+        Args:
+            variant (str, optional): "baseline" starts Chrome without the
+                extension in A/B mode
+        """
+        options = self.baseline_options if variant == "baseline" else self.chrome_options
+        with self.tracer.span("chrome.start", variant=variant):
+            if self.chromedriver_services:
+                driver = self.service_pool().start_session(
+                    lambda service: webdriver.Chrome(options=options, service=service)
+                )
+            else:
+                driver = webdriver.Chrome(options=options)
+        # Web Vitals observers must be in place before the page's scripts
+        # run; the registration lasts for the whole session
+        try:
+            driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": VITALS_SCRIPT})
+        except Exception:
+            driver.quit()
+            raise
+        return driver
+    
+    def service_pool(self):
+        """Return this process's chromedriver service pool, creating it on first use."""
+        with self._driver_pool_lock:
+            if self._service_pool is None:
+                self._service_pool = ServicePool(self.chromedriver_services)
+                if multiprocessing.parent_process() is not None:
+                    multiprocessing.util.Finalize(
+                        self._service_pool, close_service_pool, args=(self._service_pool,), exitpriority=5
+                    )
+            return self._service_pool
+    
+    def driver_pool(self, variant=None):
+        """Return this process's session pool for a variant, creating it on first use."""
+        with self._driver_pool_lock:
+            pool = self._driver_pools.get(variant)
+            if pool is None:
+                pool = self._driver_pools[variant] = DriverPool(
+                    functools.partial(self.setup_driver, variant),
+                    policy=self.profile_policy,
+                    max_uses=self.max_session_uses
+                )
+                if multiprocessing.parent_process() is not None:
+                    # Quit warm browsers when a pool worker process exits
+                    multiprocessing.util.Finalize(pool, pool.close, exitpriority=10)
+            return pool
+    
+    def close(self):
+        """Quit any warm browser sessions, stop chromedriver and close the results streams."""
+        with self._driver_pool_lock:
+            pools, self._driver_pools = self._driver_pools, {}
+            service_pool, self._service_pool = self._service_pool, None
+        for pool in pools.values():
+            pool.close()
+        if service_pool:
+            close_service_pool(service_pool)
+        if self._sink:
+            self._sink.close()
+            self._sink = None
+        if self._columnar:
+            self._columnar.close()
+            print(f"Columnar samples saved: {self._columnar.path} ({self._columnar.rows} rows)")
+            self._columnar = None
+    
+    def _record_sample(self, sample):
+        """
+        Append a finished sample to the results streams that are configured,
+        and merge the spans a worker process sent with it into the trace.
+        
+        Args:
+            sample (dict): Sample returned by _run_iteration, or a pair
+                returned by _run_pair (each load is written separately)
+            
+        Returns:
+            dict: The same sample
+        """
+        trace = sample.pop("trace", None)
+        if trace is not None:
+            self.tracer.merge(trace)
+        if "variants" in sample:
+            for variant_sample in sample["variants"].values():
+                self._record_sample(variant_sample)
+            return sample
+        if self.results_stream or self.columnar_dir:
+            record = {
+                "run_id": self.run_id,
+                "timestamp": datetime.datetime.now().isoformat(),
+                "domain": urlparse(sample["url"]).netloc
+            }
+            record.update(sample)
+            if self.results_stream:
+                if self._sink is None:
+                    self._sink = JSONLSink(self.results_stream)
+                self._sink.write(record)
+            if self.columnar_dir:
+                if self._columnar is None:
+                    path = os.path.join(self.columnar_dir, f"qoe_samples_{self.run_id or 'run'}.qoecol")
+                    self._columnar = ColumnarWriter(path)
+                self._columnar.write(record)
+        return sample
+    
+    def measure_network(self, logs, waterfall=None):
+        """
+        Extract all network metrics from performance logs in a single pass.
+        
+        Irrelevant log entries are rejected before they are JSON-decoded.
+        
+        Args:
+            logs: Performance logs from Chrome
+            waterfall (Waterfall, optional): Also records every request
+            
+        Returns:
+            dict: Network metrics (TTFB, latency, DNS/connect/TLS time in
+                milliseconds, request count, failures and bytes transferred)
+        """
+        return extract_network_metrics(logs, waterfall)
+    
+    def wait_for_load(self, driver, drain, previous_origin=None, deadline=None):
+        """
+        Drain the performance log until the new page's load event has
+        finished.
+        
+        This is what bounds a load: with the "none" page load strategy the
+        WebDriver page load timeout never fires.
+        
+        The check runs while the navigation is still in progress, so it can
+        fail when the old document unloads or a redirect swaps the execution
+        context. Such errors only mean the new page is not ready yet and
+        polling goes on; only a session that is gone (e.g. quit by a
+        cancelled scheduler attempt) ends the wait early.
+        
+        Args:
+            driver: WebDriver that has started navigating
+            drain (PerformanceLogDrain): Drain for the driver's log
+            previous_origin (float, optional): performance.timeOrigin of the
+                document loaded before driver.get()
+            deadline (float, optional): time.monotonic() by which the page
+                must have loaded, default timeout seconds from now
+            
+        Raises:
+            TimeoutException: If the page did not load within the timeout
+            InvalidSessionIdException: If the browser session ended
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                if driver.execute_script(LOAD_COMPLETE_SCRIPT, previous_origin):
+                    break
+            except InvalidSessionIdException:
+                raise
+            except WebDriverException:
+                # The document is being replaced; poll the next one
+                pass
+            if time.monotonic() >= deadline:
+                raise TimeoutException(f"Page did not load within {self.timeout} s")
+            drain.drain()
+            time.sleep(self.log_poll_interval)
+        # Events logged up to the load event
+        drain.drain()
     
     def measure_ttfb(self, logs):
         """
@@ -75,22 +938,25 @@ class QoETester:
         Returns:
             float: Time to First Byte in milliseconds
         """
-        for log in logs:
-            if log["message"]:
-                message = json.loads(log["message"])
-                if (
-                    "message" in message
-                    and "method" in message["message"]
-                    and message["message"]["method"] == "Network.responseReceived"
-                ):
-                    params = message["message"].get("params", {})
-                    if params.get("type") == "Document":
-                        response = params.get("response", {})
-                        timing = response.get("timing")
-                        if timing:
-                            # TTFB = receiveHeadersEnd - sendEnd
-                            return timing.get("receiveHeadersEnd", 0) - timing.get("sendEnd", 0)
-        return None
+        return self.measure_network(logs)["ttfb"]
+    
+    def collect_page_metrics(self, driver):
+        """
+        Collect all browser-side metrics with a single script evaluation.
+        
+        Args:
+            driver: WebDriver instance
+            
+        Returns:
+            dict: FCP in milliseconds, the Web Vitals snapshot (LCP, CLS,
+                long tasks, TBT and TTI), legacy and Level 2 Navigation
+                Timing, paint entries and resource counts; empty if the
+                script failed
+        """
+        try:
+            return driver.execute_script(PAGE_METRICS_SCRIPT) or {}
+        except Exception:
+            return {}
     
     def measure_above_fold_time(self, driver):
         """
@@ -102,15 +968,7 @@ class QoETester:
         Returns:
             float: Time to render above-the-fold content in milliseconds
         """
-        try:
-            script = """
-            return performance.getEntriesByType('paint')
-                .filter(entry => entry.name === 'first-contentful-paint')[0].startTime;
-            """
-            fcp = driver.execute_script(script)
-            return fcp
-        except Exception:
-            return None
+        return self.collect_page_metrics(driver).get("fcp")
     
     def measure_time_to_interactive(self, driver):
         """
@@ -120,134 +978,791 @@ class QoETester:
             driver: WebDriver instance
             
         Returns:
-            float: Time to Interactive in milliseconds
+            float: Time to Interactive in milliseconds (see qoe_vitals)
+        """
+        return (self.collect_page_metrics(driver).get("vitals") or {}).get("tti")
+    
+    def _new_sample(self, url, iteration, profile=None):
+        """Return an empty sample for one load of a URL."""
+        return {
+            "url": url,
+            "iteration": iteration,
+            "profile": profile,
+            "metrics": {},
+            "navigation": None,
+            "timing": None,
+            "paint": [],
+            "vitals": None,
+            "waterfall": None,
+            "error": None
+        }
+    
+    def _record_metrics(self, sample, phases, network, page):
+        """
+        Store the measurements of one page load in its sample.
+        
+        Page load time is the browser's own loadEventEnd - navigationStart.
+        If the page did not report it, the wall-clock navigation time is
+        used instead.
+        
+        Args:
+            sample (dict): Sample returned by _new_sample
+            phases (dict): Harness phase timings in milliseconds
+            network (dict): Network metrics from measure_network
+            page (dict): In-page metrics from PAGE_METRICS_SCRIPT
+        """
+        page_load_time = browser_load_time(page)
+        if page_load_time is None:
+            page_load_time = phases.get("navigation_time")
+        sample["metrics"]["page_load_time"] = page_load_time
+        
+        if network["ttfb"]:
+            sample["metrics"]["ttfb"] = network["ttfb"]
+        for metric in NETWORK_METRICS:
+            if network[metric] is not None:
+                sample["metrics"][metric] = network[metric]
+        
+        if page.get("fcp"):
+            sample["metrics"]["above_fold_time"] = page["fcp"]
+        vitals = page.get("vitals") or {}
+        if vitals.get("tti") is not None:
+            sample["metrics"]["time_to_interactive"] = vitals["tti"]
+        for metric, key in zip(VITALS_METRICS, ("lcp", "cls", "tbt", "long_tasks")):
+            if vitals.get(key) is not None:
+                sample["metrics"][metric] = vitals[key]
+        for metric in PAGE_METRICS:
+            if page.get(metric) is not None:
+                sample["metrics"][metric] = page[metric]
+        sample["navigation"] = page.get("navigation")
+        sample["timing"] = page.get("timing")
+        sample["paint"] = page.get("paint", [])
+        sample["vitals"] = page.get("vitals")
+        
+        for metric in PHASE_METRICS:
+            if phases.get(metric) is not None:
+                sample["metrics"][metric] = phases[metric]
+        if "sample_time" in phases and page_load_time is not None:
+            sample["metrics"]["harness_overhead"] = max(0.0, phases["sample_time"] - page_load_time)
+    
+    def _new_waterfall(self):
+        """Return an empty Waterfall if waterfall capture is enabled, else None."""
+        return Waterfall(self.waterfall_max_requests) if self.waterfall_dir else None
+    
+    def _save_waterfall(self, sample, waterfall):
+        """
+        Write a sample's waterfall to a HAR-like file and record its path.
+        
+        Args:
+            sample (dict): Sample the waterfall belongs to
+            waterfall (Waterfall): Captured requests
+        """
+        name = re.sub(r"[^A-Za-z0-9.-]+", "_", result_key(sample["url"], sample["profile"], page=True)).strip("_")
+        path = os.path.join(self.waterfall_dir, self.run_id or "run", f"{name}_{sample['iteration']}.har")
+        sample["waterfall"] = waterfall.write_har(path, page_url=sample["url"])
+    
+    def _run_iteration(self, url, iteration=0, profile=None, variant=None, attempt=None):
+        """
+        Load a URL once and collect a single sample.
+        
+        Args:
+            url (str): URL to test
+            iteration (int): Index of this sample for the URL
+            profile (str, optional): Network profile to emulate
+            variant (str, optional): A/B variant to load the URL in
+            attempt (Attempt, optional): Scheduler attempt the load belongs
+                to; cancelling it quits the browser
+            
+        Returns:
+            dict: Sample with the URL, iteration, collected metrics and
+                error message (None if the load succeeded)
         """
+        sample = self._new_sample(url, iteration, profile)
+        if variant is not None:
+            sample["variant"] = variant
+        waterfall = self._new_waterfall()
+        pool = self.driver_pool(variant)
+        driver = None
+        phases = {}
+        tracer = self.tracer
+        start_time = time.perf_counter()
         try:
-            script = """
-            const observer = new PerformanceObserver((list) => {
-                const entries = list.getEntries();
-                for (const entry of entries) {
-                    if (entry.name === 'TTI') {
-                        return entry.startTime;
-                    }
-                }
-            });
-            
-            // Register observer and start timing
-            observer.observe({entryTypes: ['measure']});
-            
-            // Create a simple way to detect interactivity
-            // When page is interactive, most elements should be clickable
-            const allElements = document.querySelectorAll('a, button, input');
-            if (allElements.length > 0) {
-                performance.mark('interactive_elements_found');
-                performance.measure('TTI', 'navigationStart', 'interactive_elements_found');
-                const tti = performance.getEntriesByName('TTI')[0];
-                return tti ? tti.duration : null;
-            }
-            return null;
-            """
-            tti = driver.execute_script(script)
-            if not tti:
-                # Fallback: Use domInteractive as an approximation
-                timing_script = "return window.performance.timing.domInteractive - window.performance.timing.navigationStart;"
-                tti = driver.execute_script(timing_script)
-            return tti
-        except Exception:
-            return None
+            driver = pool.acquire()
+            if attempt is not None:
+                attempt.bind(driver)
+            if self.network_profiles:
+                # Always set, so a reused session drops the last profile
+                driver.execute_cdp_cmd("Network.enable", {})
+                driver.execute_cdp_cmd("Network.emulateNetworkConditions", self._emulation(profile))
+            # Events of a reused session's reset are not part of the sample
+            drain = PerformanceLogDrain(driver, waterfall)
+            drain.discard()
+            previous_origin = driver.execute_script(DOCUMENT_ORIGIN_SCRIPT)
+            mark = time.perf_counter()
+            phases["driver_startup_time"] = (mark - start_time) * 1000  # Convert to ms
+            tracer.add("driver.acquire", start_time, mark)
+            
+            # Navigate to the URL, draining the performance log (TTFB and
+            # the other network metrics) while the page loads
+            deadline = time.monotonic() + self.timeout
+            driver.get(url)
+            self.wait_for_load(driver, drain, previous_origin, deadline)
+            end = time.perf_counter()
+            phases["navigation_time"] = (end - mark) * 1000
+            phases["log_retrieval_time"] = drain.retrieval_time
+            phases["log_parse_time"] = drain.parse_time
+            tracer.add("driver.get", mark, end,
+                       {"log_entries": drain.entries, "log_batches": drain.batches,
+                        "largest_batch": drain.largest_batch})
+            network = drain.metrics()
+            
+            # Collect Above-the-fold load time, Time to Interactive and
+            # the rest of the in-page metrics in one round trip
+            mark = time.perf_counter()
+            page = self.collect_page_metrics(driver)
+            end = time.perf_counter()
+            phases["script_evaluation_time"] = (end - mark) * 1000
+            phases["sample_time"] = (end - start_time) * 1000
+            tracer.add("collect_page_metrics", mark, end)
+            
+            self._record_metrics(sample, phases, network, page)
+            if waterfall is not None:
+                with tracer.span("save_waterfall"):
+                    self._save_waterfall(sample, waterfall)
+            
+        except TimeoutException:
+            sample["error"] = f"Timeout loading {url}"
+        except WebDriverException as e:
+            sample["error"] = f"WebDriver error: {str(e)}"
+        except Exception as e:
+            sample["error"] = f"Error: {str(e)}"
+        finally:
+            if driver:
+                # A failed load may leave the session in an unknown state
+                cancelled = attempt is not None and attempt.cancelled
+                with tracer.span("driver.release"):
+                    pool.release(driver, visited_urls=[url], discard=sample["error"] is not None or cancelled)
+            tracer.add("sample", start_time, time.perf_counter(),
+                       {"url": url, "iteration": iteration, "profile": profile, "variant": variant,
+                        "error": sample["error"]})
+        
+        return sample
     
-    def test_url(self, url):
+    def _run_pair(self, url, iteration=0, profile=None, attempt=None):
         """
-        Test a single URL and collect metrics.
+        Load a URL with and without the extension and collect both samples.
+        
+        With ab_parallel the two loads run at the same time in separate
+        browsers; otherwise they run back to back, alternating which
+        variant goes first so neither consistently benefits from warm
+        upstream caches.
         
         Args:
             url (str): URL to test
+            iteration (int): Index of this pair for the URL
+            profile (str, optional): Network profile to emulate
+            attempt (Attempt, optional): Scheduler attempt both loads
+                belong to
             
         Returns:
-            dict: Metrics for the URL
+            dict: URL, iteration, profile and "variants" mapping each
+                variant to its sample
         """
-        metrics = {
-            "page_load_time": [],
-            "above_fold_time": [],
-            "ttfb": [],
-            "time_to_interactive": [],
-            "errors": 0,
-            "error_messages": []
+        order = AB_VARIANTS if iteration % 2 == 0 else AB_VARIANTS[::-1]
+        samples = {}
+        if self.ab_parallel:
+            def run_second():
+                samples[order[1]] = self._run_iteration(url, iteration, profile, order[1], attempt)
+            second = threading.Thread(target=run_second, name="qoe-ab-pair")
+            second.start()
+            samples[order[0]] = self._run_iteration(url, iteration, profile, order[0], attempt)
+            second.join()
+        else:
+            for variant in order:
+                samples[variant] = self._run_iteration(url, iteration, profile, variant, attempt)
+        # A pair is only usable if both loads succeeded, in every run mode
+        errors = [samples[variant]["error"] for variant in AB_VARIANTS if samples[variant]["error"]]
+        return {
+            "url": url,
+            "iteration": iteration,
+            "profile": profile,
+            "variants": {variant: samples[variant] for variant in AB_VARIANTS},
+            "error": errors[0] if errors else None
         }
+    
+    async def _run_iteration_cdp(self, engine, url, iteration=0, profile=None):
+        """
+        Load a URL once through the CDP engine and collect a single sample.
         
-        for i in range(self.iterations):
-            driver = None
-            try:
-                start_time = time.time()
-                driver = self.setup_driver()
-                driver.set_page_load_timeout(self.timeout)
-                
-                # Navigate to the URL
-                driver.get(url)
-                
-                # Measure page load time
-                page_load_time = (time.time() - start_time) * 1000  # Convert to ms
-                metrics["page_load_time"].append(page_load_time)
-                
-                # Get performance logs
-                logs = driver.get_log("performance")
-                
-                # Measure Time to First Byte
-                ttfb = self.measure_ttfb(logs)
-                if ttfb:
-                    metrics["ttfb"].append(ttfb)
-                
-                # Measure Above-the-fold load time
-                above_fold_time = self.measure_above_fold_time(driver)
-                if above_fold_time:
-                    metrics["above_fold_time"].append(above_fold_time)
-                
-                # Measure Time to Interactive
-                tti = self.measure_time_to_interactive(driver)
-                if tti:
-                    metrics["time_to_interactive"].append(tti)
-                
-            except TimeoutException:
-                metrics["errors"] += 1
-                metrics["error_messages"].append(f"Timeout loading {url}")
-            except WebDriverException as e:
-                metrics["errors"] += 1
-                metrics["error_messages"].append(f"WebDriver error: {str(e)}")
-            except Exception as e:
-                metrics["errors"] += 1
-                metrics["error_messages"].append(f"Error: {str(e)}")
-            finally:
-                if driver:
-                    driver.quit()
+        Args:
+            engine (CDPEngine): Running CDP engine
+            url (str): URL to test
+            iteration (int): Index of this sample for the URL
+            profile (str, optional): Network profile to emulate
+            
+        Returns:
+            dict: Sample in the same format as _run_iteration
+        """
+        sample = self._new_sample(url, iteration, profile)
+        try:
+            network = self._emulation(profile) if self.network_profiles else None
+            waterfall = self._new_waterfall()
+            measurement = await engine.measure(url, network=network, waterfall=waterfall)
+            self._record_metrics(sample, measurement["phases"], measurement["network"], measurement["page"])
+            if waterfall is not None:
+                self._save_waterfall(sample, waterfall)
+        except asyncio.TimeoutError:
+            sample["error"] = f"Timeout loading {url}"
+        except CDPError as e:
+            sample["error"] = f"CDP error: {str(e)}"
+        except Exception as e:
+            sample["error"] = f"Error: {str(e)}"
+        return sample
+    
+    def _emulation(self, profile):
+        """Return Network.emulateNetworkConditions parameters for a profile name."""
+        return emulation_params(self.network_profiles.get(profile) or NETWORK_PROFILES["none"])
+    
+    def _cases(self):
+        """
+        Return the (url, network profile) pairs to test.
         
-        # Calculate error rate
-        error_rate = (metrics["errors"] / self.iterations) * 100
+        Returns:
+            list: Every URL with each configured profile, or with None when
+                no profiles are configured
+        """
+        profiles = list(self.network_profiles) or [None]
+        return [(url, profile) for url in self.urls for profile in profiles]
+    
+    def _result_key(self, url, profile=None, variant=None):
+        """
+        Return the results key for a URL tested under a network profile and A/B variant.
         
-        # Calculate averages
-        result = {
-            "url": url,
-            "error_rate": error_rate,
-            "error_messages": metrics["error_messages"]
+        The key is the domain, followed by the page for hosts the run tests
+        more than one page of.
+        """
+        return result_key(url, profile, variant, page=urlparse(url).netloc in self.shared_hosts)
+    
+    def _store_result(self, url, profile, result):
+        """Add a case's result to self.results (one entry per variant in A/B mode)."""
+        if self.ab_test:
+            for variant, variant_result in result.items():
+                self.results[self._result_key(url, profile, variant)] = variant_result
+        else:
+            self.results[self._result_key(url, profile)] = result
+    
+    def _sample_runner(self):
+        """Return the method that takes one sample of a case."""
+        return self._pool_task(self._run_pair if self.ab_test else self._run_iteration)
+    
+    def _pool_task(self, method):
+        """
+        Return what to submit to the worker pool to call a sampling method.
+        
+        Worker processes record spans in their own tracer, so with tracing
+        on the method runs through _run_traced, which sends them back.
+        """
+        if self.executor == "process" and self.tracer.enabled:
+            return functools.partial(self._run_traced, method.__name__)
+        return method
+    
+    def _run_traced(self, method, *args):
+        """Take a sample in a worker process and attach the spans it recorded."""
+        sample = getattr(self, method)(*args)
+        sample["trace"] = self.tracer.export()
+        return sample
+    
+    def _summarize(self, url, samples):
+        """
+        Reduce the samples collected for a URL to its result entry.
+        
+        Args:
+            url (str): URL the samples belong to
+            samples (iterable): Samples returned by _run_iteration, or a
+                URLSummary or PairedSummary that has already consumed them
+            
+        Returns:
+            dict: Metrics for the URL, or in A/B mode a dict with the
+                metrics of each variant
+        """
+        if isinstance(samples, PairedSummary):
+            results = {variant: self._summarize(url, summary) for variant, summary in samples.variants.items()}
+            for variant, result in results.items():
+                result["variant"] = variant
+            results["extension"]["overhead"] = samples.overhead(self.confidence)
+            return results
+        if isinstance(samples, URLSummary):
+            summary = samples
+        else:
+            summary = URLSummary(url, keep_values=self.keep_values)
+            for sample in samples:
+                summary.add(sample)
+        
+        # Fold the URL's distributions into the run-wide ones
+        for metric, sketch in summary.sketches.items():
+            self.run_sketches[metric].merge(sketch)
+        
+        return summary.result()
+    
+    def run_statistics(self):
+        """
+        Return distribution statistics across every sample of the run.
+        
+        Returns:
+            dict: Metric name to count, min, max, mean, stddev and
+                p50/p90/p95/p99 for metrics that have data
+        """
+        return {
+            metric: sketch.summary()
+            for metric, sketch in self.run_sketches.items()
+            if sketch.count
         }
+    
+    def test_url(self, url, profile=None):
+        """
+        Test a single URL and collect metrics.
         
-        # Calculate average metrics if we have data
-        for metric in ["page_load_time", "above_fold_time", "ttfb", "time_to_interactive"]:
-            if metrics[metric]:
-                result[metric] = statistics.mean(metrics[metric])
-            else:
-                result[metric] = None
+        Args:
+            url (str): URL to test
+            profile (str, optional): Network profile to emulate
+            
+        Returns:
+            dict: Metrics for the URL
+        """
+        with self.tracer.span("test_url", url=url, profile=profile):
+            plan = self._sampling_plan([(url, profile)])
+            tasks = plan.initial_tasks()
+            summary = None
+            while tasks:
+                index, iteration = tasks.pop(0)
+                sample = self._record_sample(self._sample_runner()(url, iteration, profile))
+                follow_ups, summary = plan.add(index, sample)
+                tasks.extend(follow_ups)
+            with self.tracer.span("summarize"):
+                return self._summarize(url, summary)
+    
+    def _sampling_plan(self, cases):
+        """Return a SamplingPlan for (url, profile) cases with this tester's settings."""
+        return SamplingPlan(
+            cases,
+            self.iterations,
+            adaptive=self.adaptive,
+            min_iterations=self.min_iterations,
+            target_precision=self.target_precision,
+            confidence=self.confidence,
+            convergence_metrics=self.convergence_metrics,
+            summary_factory=functools.partial(PairedSummary if self.ab_test else URLSummary,
+                                              keep_values=self.keep_values)
+        )
+    
+    def _finish_url(self, cases, index, summary, summaries):
+        """
+        Summarize a case whose sampling is complete.
         
-        return result
+        With ordered=False the result is merged into self.results right
+        away; otherwise it is kept in `summaries` for _merge_results.
+        """
+        url, profile = cases[index]
+        with self.tracer.span("summarize"):
+            summaries[index] = self._summarize(url, summary)
+        print(f"Completed testing {url}" + (f" [{profile}]" if profile is not None else ""))
+        if not self.ordered:
+            self._store_result(url, profile, summaries[index])
+    
+    def _merge_results(self, cases, summaries):
+        """Merge per-case summaries into self.results in URL order."""
+        if self.ordered:
+            for index in sorted(summaries):
+                self._store_result(*cases[index], summaries[index])
+    
+    def _make_executor(self):
+        """Create the worker pool used for concurrent runs."""
+        if self.executor == "process":
+            kwargs = {}
+            if self.max_tasks_per_worker:
+                kwargs["max_tasks_per_child"] = self.max_tasks_per_worker
+            return concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_install_tester,
+                initargs=(self._token, self.__getstate__()),
+                **kwargs
+            )
+        return concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="qoe-worker")
+    
+    def _run_parallel(self):
+        """
+        Run every URL x profile x iteration sample on a pool of browser
+        workers.
+        
+        The SamplingPlan decides which samples to take; follow-up samples of
+        an adaptive plan are submitted as earlier ones finish. Samples are
+        folded into a per-URL URLSummary as they arrive and each URL is
+        summarized as soon as its last sample is in. With ordered=True the
+        summaries are merged into self.results in URL order once the run
+        completes, so the output does not depend on which worker finished
+        first.
+        """
+        cases = self._cases()
+        plan = self._sampling_plan(cases)
+        summaries = {}
+        
+        with self._make_executor() as pool:
+            futures = {}
+            
+            run = self._sample_runner()
+            
+            def submit(index, iteration):
+                url, profile = cases[index]
+                futures[pool.submit(run, url, iteration, profile)] = index
+            
+            for task in plan.initial_tasks():
+                submit(*task)
+            
+            while futures:
+                done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    index = futures.pop(future)
+                    follow_ups, summary = plan.add(index, self._record_sample(future.result()))
+                    for task in follow_ups:
+                        submit(*task)
+                    if summary:
+                        self._finish_url(cases, index, summary, summaries)
+        
+        self._merge_results(cases, summaries)
+    
+    def _is_transient(self, sample):
+        """Return True if a failed sample is worth retrying."""
+        return (sample["error"] or "").startswith("WebDriver error:")
+    
+    def _skipped_sample(self, url, iteration, profile, error):
+        """Return the sample (or A/B pair) recorded for a sample that was never taken."""
+        sample = self._new_sample(url, iteration, profile)
+        sample["error"] = error
+        if self.ab_test:
+            sample["variants"] = {
+                variant: dict(self._new_sample(url, iteration, profile), variant=variant, error=error)
+                for variant in AB_VARIANTS
+            }
+        return sample
+    
+    def _run_scheduled(self):
+        """
+        Run every URL x profile x iteration sample under the configured
+        budgets, with hedged duplicate loads and retries.
+        
+        The DeadlineScheduler takes the samples the SamplingPlan asks for
+        on up to `workers` browsers plus `hedge_slots` spare ones. Samples
+        skipped because a budget ran out are recorded as errors. Results
+        are merged the same way as in _run_parallel.
+        """
+        cases = self._cases()
+        plan = self._sampling_plan(cases)
+        summaries = {}
+        scheduler = DeadlineScheduler(
+            self._sample_runner(),
+            workers=self.workers,
+            run_budget=self.run_budget,
+            url_budget=self.url_budget,
+            hedge_quantile=self.hedge_quantile,
+            hedge_slots=self.hedge_slots,
+            max_retries=self.max_retries,
+            backoff=self.retry_backoff,
+            is_retryable=self._is_transient,
+            skipped_sample=self._skipped_sample
+        )
+        
+        def deliver(index, sample):
+            follow_ups, summary = plan.add(index, self._record_sample(sample))
+            if summary:
+                self._finish_url(cases, index, summary, summaries)
+            return follow_ups
+        
+        scheduler.run(plan, cases, deliver)
+        self._merge_results(cases, summaries)
+        self.scheduler_stats = dict(scheduler.stats)
+        stats = scheduler.stats
+        print(f"Scheduler: {stats['attempts']} attempts, {stats['hedges']} hedges "
+              f"({stats['hedge_wins']} won), {stats['retries']} retries, "
+              f"{stats['cancelled']} cancelled, {stats['skipped']} skipped")
+    
+    async def _run_cdp(self):
+        """
+        Run every URL x profile x iteration sample as concurrent tabs over
+        CDP.
+        
+        Up to `workers` page loads are in flight at once in a single
+        browser driven from one event loop. Results are merged the same
+        way as in _run_parallel.
+        """
+        engine = CDPEngine(
+            chrome_args=self.chrome_options.arguments,
+            timeout=self.timeout,
+            page_script=PAGE_METRICS_SCRIPT,
+            init_script=VITALS_SCRIPT,
+            max_tabs=self.workers,
+            chrome_binary=self.chrome_binary,
+            # Extensions only run in the default browser context
+            isolate=not self.extension_path
+        )
+        cases = self._cases()
+        plan = self._sampling_plan(cases)
+        summaries = {}
+        
+        async def run_one(index, iteration):
+            url, profile = cases[index]
+            return index, await self._run_iteration_cdp(engine, url, iteration, profile)
+        
+        async with engine:
+            tasks = {asyncio.ensure_future(run_one(*task)) for task in plan.initial_tasks()}
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index, sample = task.result()
+                    follow_ups, summary = plan.add(index, self._record_sample(sample))
+                    tasks.update(asyncio.ensure_future(run_one(*follow_up)) for follow_up in follow_ups)
+                    if summary:
+                        self._finish_url(cases, index, summary, summaries)
+        
+        self._merge_results(cases, summaries)
     
     def run_tests(self):
         """Run tests for all URLs and store the results."""
-        for url in self.urls:
-            print(f"Testing {url}...")
-            result = self.test_url(url)
-            domain = urlparse(url).netloc
-            self.results[domain] = result
-            print(f"Completed testing {url}")
+        self.run_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        matrix = f" x {len(self.network_profiles)} network profiles" if self.network_profiles else ""
+        self.tracer.start_profile()
+        run_start = time.perf_counter()
+        try:
+            if self.engine == "cdp":
+                print(f"Testing {len(self.urls)} URLs{matrix} over CDP with up to {self.workers} concurrent tabs...")
+                asyncio.run(self._run_cdp())
+                return self.results
+            
+            if self.run_budget is not None or self.url_budget is not None or self.hedge_slots or self.max_retries:
+                print(f"Testing {len(self.urls)} URLs{matrix} with {self.workers} workers "
+                      f"and {self.hedge_slots} hedge slots under a deadline scheduler...")
+                self._run_scheduled()
+                return self.results
+            
+            if self.workers > 1:
+                print(f"Testing {len(self.urls)} URLs{matrix} with {self.workers} {self.executor} workers...")
+                self._run_parallel()
+                return self.results
+            
+            for url, profile in self._cases():
+                label = url + (f" [{profile}]" if profile is not None else "")
+                print(f"Testing {label}...")
+                self._store_result(url, profile, self.test_url(url, profile))
+                print(f"Completed testing {label}")
+        finally:
+            with self.tracer.span("close"):
+                self.close()
+            self.tracer.add("run_tests", run_start, time.perf_counter(), {"urls": len(self.urls)})
+        
+        return self.results
+    
+    def run_worker(self, queue, worker_id=None, poll_interval=5.0):
+        """
+        Claim and run samples from a shared WorkQueue until it is drained.
+        
+        Up to `workers` samples run at once on the usual worker pool. A
+        background thread heartbeats the leases of samples in flight, so a
+        slow page is not handed to another worker while a dead worker's
+        tasks are re-queued once their lease expires. While other workers
+        still hold leases this worker keeps polling, in case they die.
+        Adaptive sampling, network profiles, A/B mode and the CDP engine are
+        not used in queue mode.
+        
+        Args:
+            queue (WorkQueue): Shared queue (see qoe_queue.py)
+            worker_id (str, optional): Unique worker id, defaults to
+                "<hostname>-<pid>"
+            poll_interval (float): Seconds between polls when there is
+                nothing to claim
+            
+        Returns:
+            int: Number of samples this worker completed
+        """
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.run_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        in_flight = {}
+        stop = threading.Event()
+        
+        def heartbeat():
+            while not stop.wait(queue.lease_seconds / 3):
+                queue.heartbeat(worker_id, [task.id for task in list(in_flight.values())])
+        
+        heartbeat_thread = threading.Thread(target=heartbeat, name="qoe-heartbeat", daemon=True)
+        heartbeat_thread.start()
+        completed = 0
+        print(f"Worker {worker_id} running {self.workers} {self.executor} workers on {queue.path}...")
+        self.tracer.start_profile()
+        run_start = time.perf_counter()
+        try:
+            with self._make_executor() as pool:
+                run = self._pool_task(self._run_iteration)
+                while True:
+                    free = self.workers - len(in_flight)
+                    if free:
+                        for task in queue.claim(worker_id, free):
+                            in_flight[pool.submit(run, task.url, task.iteration)] = task
+                    if not in_flight:
+                        if not queue.outstanding():
+                            break
+                        stop.wait(poll_interval)
+                        continue
+                    done, _ = concurrent.futures.wait(
+                        in_flight, timeout=poll_interval, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        task = in_flight.pop(future)
+                        with self.tracer.span("queue.complete"):
+                            queue.complete(worker_id, task.id, self._record_sample(future.result()))
+                        completed += 1
+                        print(f"Completed {task.url} (iteration {task.iteration + 1})")
+        finally:
+            stop.set()
+            heartbeat_thread.join()
+            queue.release(worker_id, [task.id for task in in_flight.values()])
+            self.close()
+            self.tracer.add("run_worker", run_start, time.perf_counter(), {"worker": worker_id})
+        
+        return completed
+    
+    def run_monitor(self, interval=300, schedules=None, host="127.0.0.1", port=9464, window=100,
+                    stop=None, poll_interval=0.5):
+        """
+        Re-test the URLs on a schedule and serve their metrics on /metrics.
+        
+        Every URL x network profile case is loaded again `interval` seconds
+        (or its own schedule) after its previous load started, one sample at
+        a time per case and up to `workers` at once. A case that is still
+        running when it is due again is run once it finishes. Samples are
+        kept in the in-memory MonitorStore (and written to results_stream if
+        set); nothing is written to disk otherwise. Adaptive sampling and
+        the CDP engine are not used in monitor mode.
+        
+        Args:
+            interval (float): Default seconds between loads of a URL
+            schedules (dict, optional): URL to its own interval in seconds
+            host (str): Interface the metrics endpoint binds
+            port (int): Port of the metrics endpoint
+            window (int): Recent samples per URL kept for the gauges
+            stop (threading.Event, optional): Set to stop the monitor;
+                otherwise it runs until interrupted
+            poll_interval (float): Longest wait before `stop` is checked
+                again while loads are running
+            
+        Returns:
+            MonitorStore: The store with everything collected
+        """
+        if self.engine != "selenium":
+            raise ValueError("Monitor mode uses the selenium engine")
+        schedules = dict(schedules or {})
+        unknown = set(schedules) - set(self.urls)
+        if unknown:
+            raise ValueError(f"Schedules for URLs that are not monitored: {', '.join(sorted(unknown))}")
+        stop = stop or threading.Event()
+        self.run_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        store = MonitorStore(METRICS, window=window)
+        server = MetricsServer(store, host=host, port=port)
+        cases = self._cases()
+        due = [time.monotonic()] * len(cases)
+        iterations = [0] * len(cases)
+        run = self._sample_runner()
         
+        def labels(sample, variant=None):
+            labels = [("url", sample["url"])]
+            if sample.get("profile") is not None:
+                labels.append(("profile", sample["profile"]))
+            if variant is not None:
+                labels.append(("variant", variant))
+            return tuple(labels)
+        
+        matrix = f" x {len(self.network_profiles)} network profiles" if self.network_profiles else ""
+        print(f"Monitoring {len(self.urls)} URLs{matrix} with {self.workers} workers; metrics on {server.url}")
+        pool = self._make_executor()
+        try:
+            in_flight = {}
+            while not stop.is_set():
+                now = time.monotonic()
+                running = set(in_flight.values())
+                for index, (url, profile) in enumerate(cases):
+                    if len(in_flight) >= self.workers:
+                        break
+                    if index in running or due[index] > now:
+                        continue
+                    due[index] = now + schedules.get(url, interval)
+                    in_flight[pool.submit(run, url, iterations[index], profile)] = index
+                    iterations[index] += 1
+                
+                if len(in_flight) < self.workers:
+                    running = set(in_flight.values())
+                    idle = [due[index] for index in range(len(cases)) if index not in running]
+                    timeout = max(0.01, min(idle) - time.monotonic()) if idle else None
+                else:
+                    # Every worker is busy: overdue URLs have to wait
+                    # for a load to finish
+                    timeout = None
+                if in_flight:
+                    # Bounded so a set `stop` is noticed while loads run
+                    timeout = poll_interval if timeout is None else min(timeout, poll_interval)
+                    done, _ = concurrent.futures.wait(
+                        in_flight, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                else:
+                    stop.wait(timeout)
+                    done = ()
+                for future in done:
+                    in_flight.pop(future)
+                    sample = self._record_sample(future.result())
+                    if "variants" in sample:
+                        for variant, variant_sample in sample["variants"].items():
+                            store.add(variant_sample, labels(variant_sample, variant))
+                    else:
+                        store.add(sample, labels(sample))
+        except KeyboardInterrupt:
+            print("Monitor stopped.")
+        finally:
+            # Loads still running are abandoned rather than waited for;
+            # stopping the shared chromedriver in close() ends them
+            pool.shutdown(wait=False, cancel_futures=True)
+            server.close()
+            self.close()
+        
+        return store
+    
+    def merge_queue(self, queue):
+        """
+        Summarize every finished sample in a WorkQueue into self.results.
+        
+        Samples are streamed URL by URL, so only one URL's summary is held
+        in memory at a time besides the results themselves.
+        
+        Args:
+            queue (WorkQueue): Queue the workers completed
+            
+        Returns:
+            dict: Test results keyed like run_tests' results
+        """
+        self.run_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.urls = queue.urls()
+        self.shared_hosts = shared_hosts(self.urls)
+        # Summaries of the current URL, by network profile
+        summaries = {}
+        
+        def store_summaries():
+            for profile, summary in summaries.items():
+                self._store_result(summary.url, profile, self._summarize(summary.url, summary))
+            summaries.clear()
+        
+        for url, sample in queue.iter_samples():
+            if summaries and next(iter(summaries.values())).url != url:
+                store_summaries()
+            profile = sample.get("profile")
+            summary = summaries.get(profile)
+            if summary is None:
+                summary = summaries[profile] = URLSummary(url, profile, self.keep_values)
+            summary.add(sample)
+        store_summaries()
         return self.results
     
     def generate_report(self, output_dir="reports"):
@@ -260,318 +1775,429 @@ class QoETester:
         Returns:
             str: Path to the generated report
         """
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        report_file = os.path.join(output_dir, f"qoe_report_{timestamp}.html")
-        
-        # Create HTML report
-        html = """
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Quality of Experience Test Results</title>
-            <style>
-                body {
-                    font-family: Arial, sans-serif;
-                    line-height: 1.6;
-                    margin: 0;
-                    padding: 20px;
-                    color: #333;
-                }
-                h1 {
-                    color: #2c3e50;
-                    border-bottom: 2px solid #3498db;
-                    padding-bottom: 10px;
-                }
-                .summary {
-                    margin: 20px 0;
-                    padding: 15px;
-                    background-color: #f8f9fa;
-                    border-radius: 5px;
-                }
-                table {
-                    width: 100%;
-                    border-collapse: collapse;
-                    margin: 20px 0;
-                }
-                th, td {
-                    padding: 12px 15px;
-                    border: 1px solid #ddd;
-                    text-align: left;
-                }
-                th {
-                    background-color: #3498db;
-                    color: white;
-                    position: sticky;
-                    top: 0;
-                }
-                tr:nth-child(even) {
-                    background-color: #f2f2f2;
-                }
-                .error {
-                    color: #e74c3c;
-                }
-                .domain {
-                    font-weight: bold;
-                }
-                .chart-container {
-                    height: 400px;
-                    margin: 30px 0;
-                }
-                .footer {
-                    margin-top: 30px;
-                    text-align: center;
-                    font-size: 0.8em;
-                    color: #7f8c8d;
-                }
-            </style>
-            <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-        </head>
-        <body>
-            <h1>Quality of Experience Test Results</h1>
-            <div class="summary">
-                <p><strong>Test Date:</strong> """ + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + """</p>
-                <p><strong>Number of Sites Tested:</strong> """ + str(len(self.results)) + """</p>
-            </div>
-            
-            <h2>Results Table</h2>
-            <table>
-                <thead>
-                    <tr>
-                        <th>Domain</th>
-                        <th>Page Load Time (ms)</th>
-                        <th>Above-fold Time (ms)</th>
-                        <th>Time to First Byte (ms)</th>
-                        <th>Time to Interactive (ms)</th>
-                        <th>Error Rate (%)</th>
-                    </tr>
-                </thead>
-                <tbody>
-        """
-        
-        # Add data rows
-        domains = []
-        page_load_times = []
-        above_fold_times = []
-        ttfbs = []
-        ttis = []
-        
-        for domain, data in self.results.items():
-            domains.append(domain)
-            page_load_times.append(data.get("page_load_time", 0) or 0)
-            above_fold_times.append(data.get("above_fold_time", 0) or 0)
-            ttfbs.append(data.get("ttfb", 0) or 0)
-            ttis.append(data.get("time_to_interactive", 0) or 0)
-            
-            html += f"""
-                <tr>
-                    <td class="domain">{domain}</td>
-                    <td>{"%.2f" % data.get("page_load_time", "N/A") if data.get("page_load_time") else "N/A"}</td>
-                    <td>{"%.2f" % data.get("above_fold_time", "N/A") if data.get("above_fold_time") else "N/A"}</td>
-                    <td>{"%.2f" % data.get("ttfb", "N/A") if data.get("ttfb") else "N/A"}</td>
-                    <td>{"%.2f" % data.get("time_to_interactive", "N/A") if data.get("time_to_interactive") else "N/A"}</td>
-                    <td>{"%.2f" % data.get("error_rate", 0)}%</td>
-                </tr>
-            """
-            
-            # Add error messages if any
-            if data.get("error_messages"):
-                html += f"""
-                <tr>
-                    <td colspan="6" class="error">
-                        <strong>Errors:</strong><br>
-                        {"<br>".join(data.get("error_messages", []))}
-                    </td>
-                </tr>
-                """
-        
-        html += """
-                </tbody>
-            </table>
-            
-            <h2>Performance Charts</h2>
-            
-            <div class="chart-container">
-                <canvas id="pageLoadChart"></canvas>
-            </div>
-            
-            <div class="chart-container">
-                <canvas id="ttfbChart"></canvas>
-            </div>
-            
-            <div class="chart-container">
-                <canvas id="timeToInteractiveChart"></canvas>
-            </div>
-            
-            <script>
-                // Page Load Time Chart
-                const pageLoadCtx = document.getElementById('pageLoadChart').getContext('2d');
-                new Chart(pageLoadCtx, {
-                    type: 'bar',
-                    data: {
-                        labels: """ + json.dumps(domains) + """,
-                        datasets: [{
-                            label: 'Page Load Time (ms)',
-                            data: """ + json.dumps(page_load_times) + """,
-                            backgroundColor: 'rgba(52, 152, 219, 0.7)',
-                            borderColor: 'rgba(52, 152, 219, 1)',
-                            borderWidth: 1
-                        }, {
-                            label: 'Above-fold Time (ms)',
-                            data: """ + json.dumps(above_fold_times) + """,
-                            backgroundColor: 'rgba(46, 204, 113, 0.7)',
-                            borderColor: 'rgba(46, 204, 113, 1)',
-                            borderWidth: 1
-                        }]
-                    },
-                    options: {
-                        responsive: true,
-                        maintainAspectRatio: false,
-                        plugins: {
-                            title: {
-                                display: true,
-                                text: 'Page Load Times Comparison'
-                            }
-                        },
-                        scales: {
-                            y: {
-                                beginAtZero: true,
-                                title: {
-                                    display: true,
-                                    text: 'Time (ms)'
-                                }
-                            }
-                        }
-                    }
-                });
-                
-                // TTFB Chart
-                const ttfbCtx = document.getElementById('ttfbChart').getContext('2d');
-                new Chart(ttfbCtx, {
-                    type: 'bar',
-                    data: {
-                        labels: """ + json.dumps(domains) + """,
-                        datasets: [{
-                            label: 'Time to First Byte (ms)',
-                            data: """ + json.dumps(ttfbs) + """,
-                            backgroundColor: 'rgba(155, 89, 182, 0.7)',
-                            borderColor: 'rgba(155, 89, 182, 1)',
-                            borderWidth: 1
-                        }]
-                    },
-                    options: {
-                        responsive: true,
-                        maintainAspectRatio: false,
-                        plugins: {
-                            title: {
-                                display: true,
-                                text: 'Time to First Byte'
-                            }
-                        },
-                        scales: {
-                            y: {
-                                beginAtZero: true,
-                                title: {
-                                    display: true,
-                                    text: 'Time (ms)'
-                                }
-                            }
-                        }
-                    }
-                });
-                
-                // Time to Interactive Chart
-                const ttiCtx = document.getElementById('timeToInteractiveChart').getContext('2d');
-                new Chart(ttiCtx, {
-                    type: 'bar',
-                    data: {
-                        labels: """ + json.dumps(domains) + """,
-                        datasets: [{
-                            label: 'Time to Interactive (ms)',
-                            data: """ + json.dumps(ttis) + """,
-                            backgroundColor: 'rgba(231, 76, 60, 0.7)',
-                            borderColor: 'rgba(231, 76, 60, 1)',
-                            borderWidth: 1
-                        }]
-                    },
-                    options: {
-                        responsive: true,
-                        maintainAspectRatio: false,
-                        plugins: {
-                            title: {
-                                display: true,
-                                text: 'Time to Interactive'
-                            }
-                        },
-                        scales: {
-                            y: {
-                                beginAtZero: true,
-                                title: {
-                                    display: true,
-                                    text: 'Time (ms)'
-                                }
-                            }
-                        }
-                    }
-                });
-            </script>
-            
-            <div class="footer">
-                <p>Generated on """ + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + """</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        # Write the HTML report to file
-        with open(report_file, "w") as f:
-            f.write(html)
-        
-        # Also generate JSON data
-        json_file = os.path.join(output_dir, f"qoe_data_{timestamp}.json")
-        with open(json_file, "w") as f:
-            json.dump(self.results, f, indent=4)
-        
-        print(f"Report generated: {report_file}")
-        print(f"JSON data saved: {json_file}")
+        with self.tracer.span("generate_report"):
+            if not os.path.exists(output_dir):
+                os.makedirs(output_dir)
+            
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            report_file = os.path.join(output_dir, f"qoe_report_{timestamp}.html")
+            
+            # Create HTML report
+            with self.tracer.span("report.html"):
+                write_html_report(self.results, report_file, run_statistics=self.run_statistics())
+            
+            # Also generate JSON data
+            json_file = os.path.join(output_dir, f"qoe_data_{timestamp}.json")
+            with self.tracer.span("report.json"), open(json_file, "w") as f:
+                json.dump(self.results, f, indent=4)
+            
+            print(f"Report generated: {report_file}")
+            print(f"JSON data saved: {json_file}")
+            
+            # Add the run to the history store
+            if self.history_db:
+                with self.tracer.span("report.history"), HistoryStore(self.history_db) as store:
+                    store.ingest_results(
+                        self.results,
+                        run_at=datetime.datetime.strptime(timestamp, "%Y%m%d_%H%M%S"),
+                        source=os.path.abspath(json_file)
+                    )
+                print(f"History updated: {self.history_db}")
         
         return report_file
+    
+    def finish_profiling(self):
+        """
+        Write the trace and cProfile data of the run and print their
+        summaries.
+        
+        Call it once the run (and its report) is done; it does nothing
+        unless trace_file or profile_file is set.
+        """
+        self.tracer.stop_profile(self.profile_file)
+        if self.profile_file:
+            print(f"Profile saved: {self.profile_file}")
+        if self.trace_file:
+            self.tracer.print_summary()
+            self.tracer.write(self.trace_file)
+            print(f"Trace saved: {self.trace_file} (open in chrome://tracing or ui.perfetto.dev)")
 
 
-def main():
-    """Main function to run the QoE tests."""
-    # List of URLs to test
-    urls = [
-        "https://www.google.com",
-        "https://www.amazon.com",
-        "https://www.wikipedia.org",
-        "https://www.github.com",
-        "https://www.stackoverflow.com"
-    ]
-    
-    # Example extension path - replace with your actual extension path
+# Default list of URLs to test when none are given on the command line
+DEFAULT_URLS = [
+    "https://www.google.com",
+    "https://www.amazon.com",
+    "https://www.wikipedia.org",
+    "https://www.github.com",
+    "https://www.stackoverflow.com"
+]
+
+
+# Command line sub-commands; "run" is used when none is given
+COMMANDS = ("run", "bench", "enqueue", "work", "merge", "monitor", "export", "compare")
+
+
+def add_tester_arguments(parser):
+    """Add the options that configure a QoETester to an argument parser."""
+    parser.add_argument("--iterations", type=int, default=3,
+                        help="Number of times to test each URL")
+    parser.add_argument("--timeout", type=int, default=60,
+                        help="Maximum wait time for page load in seconds")
     # For Chrome extensions, you can use:
     # 1. Unpacked extension folder path
     # 2. Path to .crx file
-    extension_path = "/path/to/your/extension"  # Example path
+    parser.add_argument("--extension-path", default=None,
+                        help="Path to a Chrome extension to load")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of concurrent headless Chrome workers (tabs with --engine cdp)")
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread",
+                        help="Worker pool type used when --workers > 1")
+    parser.add_argument("--unordered", action="store_true",
+                        help="Merge results in completion order instead of URL order")
+    parser.add_argument("--worker-js-heap-mb", type=int, default=None,
+                        help="V8 heap limit for each worker's renderer")
+    parser.add_argument("--worker-renderer-processes", type=int, default=None,
+                        help="Maximum renderer processes per worker Chrome")
+    parser.add_argument("--max-tasks-per-worker", type=int, default=None,
+                        help="Recycle worker processes after this many samples")
+    parser.add_argument("--profile-policy", choices=PROFILE_POLICIES, default="fresh",
+                        help="Start a fresh browser per sample or reuse warm sessions")
+    parser.add_argument("--max-session-uses", type=int, default=50,
+                        help="Samples a reused browser session serves before it is replaced")
+    parser.add_argument("--engine", choices=ENGINES, default="selenium",
+                        help="Drive Chrome through chromedriver or directly over CDP (asyncio)")
+    parser.add_argument("--chrome-binary", default=None,
+                        help="Chrome executable used by the CDP engine")
+    parser.add_argument("--results-stream", default=None,
+                        help="Append every sample to this JSON Lines file as it finishes")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Stop sampling a URL once its metrics converge (--iterations is the maximum)")
+    parser.add_argument("--min-iterations", type=int, default=3,
+                        help="Samples per URL before checking convergence")
+    parser.add_argument("--target-precision", type=float, default=0.05,
+                        help="Relative confidence interval half-width to reach (0.05 = +/- 5%%)")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="Confidence level of the convergence interval")
+    parser.add_argument("--convergence-metric", action="append", dest="convergence_metrics", metavar="METRIC",
+                        help="Metric that must converge in adaptive mode (repeatable, default: page_load_time)")
+    parser.add_argument("--network-profile", action="append", dest="network_profiles", metavar="PROFILE",
+                        help="Emulate a network profile (repeatable): one of " + ", ".join(NETWORK_PROFILES) +
+                             ", or name:latency_ms:down_kbps:up_kbps")
+    parser.add_argument("--chromedriver-services", type=int, default=1,
+                        help="Long-lived chromedriver processes shared by all sessions (0: one per session)")
+    parser.add_argument("--ab-test", action="store_true",
+                        help="Measure --extension-path's overhead with paired loads with and without it")
+    parser.add_argument("--ab-sequential", action="store_true",
+                        help="Run the two loads of an A/B pair back to back instead of at the same time")
+    parser.add_argument("--waterfall-dir", default=None,
+                        help="Capture every request of each load as a HAR-like file in this directory")
+    parser.add_argument("--waterfall-max-requests", type=int, default=500,
+                        help="Requests kept per captured page")
+    parser.add_argument("--run-budget", type=float, default=None,
+                        help="Wall-clock seconds for the whole run; samples not taken by then are skipped")
+    parser.add_argument("--url-budget", type=float, default=None,
+                        help="Wall-clock seconds each URL may spend across all of its samples")
+    parser.add_argument("--hedge-slots", type=int, default=0,
+                        help="Spare browsers that duplicate loads running past their URL's typical latency")
+    parser.add_argument("--hedge-quantile", type=float, default=0.9,
+                        help="Quantile of earlier load durations after which a load is hedged")
+    parser.add_argument("--max-retries", type=int, default=0,
+                        help="Retries of a sample that failed with a WebDriver error")
+    parser.add_argument("--retry-backoff", type=float, default=1.0,
+                        help="Seconds before the first retry, doubled for every further retry")
+    parser.add_argument("--columnar-dir", default=None,
+                        help="Also stream every sample into a columnar .qoecol store in this directory")
+    parser.add_argument("--keep-values", action="append", default=None, metavar="METRIC",
+                        help="Write this metric's raw per-iteration values into the results (repeatable, "
+                             "default: the page QoE metrics compared by the compare command)")
+    parser.add_argument("--log-poll-interval", type=float, default=0.1,
+                        help="Seconds between performance log drains while a page loads")
+    parser.add_argument("--trace-file", default=None,
+                        help="Write harness phase timings to this Chrome trace-event JSON file")
+    parser.add_argument("--profile-file", default=None,
+                        help="Run cProfile over the run and write the pstats data to this file")
+
+
+def tester_kwargs(args):
+    """Return QoETester keyword arguments for parsed tester options."""
+    return {
+        "iterations": args.iterations,
+        "timeout": args.timeout,
+        "extension_path": args.extension_path,
+        "workers": args.workers,
+        "executor": args.executor,
+        "ordered": not args.unordered,
+        "worker_js_heap_mb": args.worker_js_heap_mb,
+        "worker_renderer_processes": args.worker_renderer_processes,
+        "max_tasks_per_worker": args.max_tasks_per_worker,
+        "profile_policy": args.profile_policy,
+        "max_session_uses": args.max_session_uses,
+        "engine": args.engine,
+        "chrome_binary": args.chrome_binary,
+        "results_stream": args.results_stream,
+        "adaptive": args.adaptive,
+        "min_iterations": args.min_iterations,
+        "target_precision": args.target_precision,
+        "confidence": args.confidence,
+        "convergence_metrics": args.convergence_metrics or ("page_load_time",),
+        "network_profiles": args.network_profiles,
+        "waterfall_dir": args.waterfall_dir,
+        "waterfall_max_requests": args.waterfall_max_requests,
+        "ab_test": args.ab_test,
+        "ab_parallel": not args.ab_sequential,
+        "chromedriver_services": args.chromedriver_services,
+        "run_budget": args.run_budget,
+        "url_budget": args.url_budget,
+        "hedge_slots": args.hedge_slots,
+        "hedge_quantile": args.hedge_quantile,
+        "max_retries": args.max_retries,
+        "retry_backoff": args.retry_backoff,
+        "log_poll_interval": args.log_poll_interval,
+        "columnar_dir": args.columnar_dir,
+        "keep_values": COMPARE_METRICS if args.keep_values is None else args.keep_values,
+        "trace_file": args.trace_file,
+        "profile_file": args.profile_file
+    }
+
+
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv.insert(0, "run")
     
+    parser = argparse.ArgumentParser(description="Quality of Experience (QoE) testing with headless Chrome")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    run_parser = commands.add_parser("run", help="Test URLs and generate a report (default)")
+    run_parser.add_argument("urls", nargs="*", default=DEFAULT_URLS,
+                            help="URLs to test (defaults to a small built-in list)")
+    add_tester_arguments(run_parser)
+    run_parser.add_argument("--history-db", default=None,
+                            help="SQLite history store to add this run's results to")
+    run_parser.add_argument("--output-dir", default="reports",
+                            help="Directory to save the report")
+    
+    bench_parser = commands.add_parser("bench", help="Benchmark the harness against local synthetic pages")
+    add_tester_arguments(bench_parser)
+    bench_parser.add_argument("--output", default=None,
+                              help="Save the benchmark report as JSON")
+    bench_parser.add_argument("--baseline", default=None,
+                              help="Benchmark report to check for regressions against")
+    bench_parser.add_argument("--tolerance", type=float, default=0.2,
+                              help="Allowed relative regression against the baseline")
+    
+    enqueue_parser = commands.add_parser("enqueue", help="Add URL x iteration tasks to a shared work queue")
+    enqueue_parser.add_argument("urls", nargs="*", help="URLs to test")
+    enqueue_parser.add_argument("--queue", required=True, help="SQLite work queue file")
+    enqueue_parser.add_argument("--url-file", default=None,
+                                help="File with one URL per line (for lists too long for the command line)")
+    enqueue_parser.add_argument("--iterations", type=int, default=3,
+                                help="Number of times to test each URL")
+    
+    work_parser = commands.add_parser("work", help="Run samples from a shared work queue until it is drained")
+    work_parser.add_argument("--queue", required=True, help="SQLite work queue file")
+    add_tester_arguments(work_parser)
+    work_parser.add_argument("--worker-id", default=None,
+                             help="Unique worker id (default: <hostname>-<pid>)")
+    work_parser.add_argument("--lease-seconds", type=float, default=300,
+                             help="Lease length; leases are renewed every third of this while a sample runs")
+    work_parser.add_argument("--max-attempts", type=int, default=3,
+                             help="Expired leases after which a task is marked failed")
+    
+    merge_parser = commands.add_parser("merge", help="Merge a work queue's samples into one report")
+    merge_parser.add_argument("--queue", required=True, help="SQLite work queue file")
+    merge_parser.add_argument("--history-db", default=None,
+                              help="SQLite history store to add the merged results to")
+    merge_parser.add_argument("--output-dir", default="reports",
+                              help="Directory to save the report")
+    
+    monitor_parser = commands.add_parser("monitor", help="Re-test URLs on a schedule and serve /metrics")
+    monitor_parser.add_argument("urls", nargs="*",
+                                help="URLs to monitor (defaults to the --schedule URLs, or a small built-in list)")
+    add_tester_arguments(monitor_parser)
+    monitor_parser.add_argument("--interval", type=float, default=300,
+                                help="Seconds between loads of each URL")
+    monitor_parser.add_argument("--schedule", action="append", default=[], metavar="URL=SECONDS",
+                                help="Own interval for one URL (repeatable)")
+    monitor_parser.add_argument("--host", default="127.0.0.1",
+                                help="Interface the metrics endpoint binds")
+    monitor_parser.add_argument("--port", type=int, default=9464,
+                                help="Port of the OpenMetrics endpoint (/metrics)")
+    monitor_parser.add_argument("--window", type=int, default=100,
+                                help="Recent samples per URL kept for the gauges")
+    
+    export_parser = commands.add_parser("export", help="Convert JSON Lines results streams to a columnar store")
+    export_parser.add_argument("inputs", nargs="+", help="JSON Lines files written with --results-stream")
+    export_parser.add_argument("--output", required=True, help="Store directory to write (e.g. month.qoecol)")
+    
+    compare_parser = commands.add_parser("compare", help="Find URLs that got significantly slower between two runs")
+    compare_parser.add_argument("baseline", help="qoe_data_*.json, results stream (.jsonl) or columnar store "
+                                                 "of the earlier run")
+    compare_parser.add_argument("candidate", help="The same for the run to check")
+    compare_parser.add_argument("--alpha", type=float, default=0.05,
+                                help="False discovery rate of the Benjamini-Hochberg corrected tests")
+    compare_parser.add_argument("--min-effect", type=float, default=0.33,
+                                help="Smallest Cliff's delta counted as a regression")
+    compare_parser.add_argument("--min-change", type=float, default=0.05,
+                                help="Smallest relative change of the median counted as a regression")
+    compare_parser.add_argument("--metric", action="append", default=None, dest="metrics",
+                                help="Metric to compare (repeatable, default: the page QoE metrics)")
+    compare_parser.add_argument("--output", default=None,
+                                help="Save the comparison as JSON")
+    
+    return parser.parse_args(argv)
+
+
+def print_overhead(results, metrics=("page_load_time", "ttfb", "above_fold_time", "time_to_interactive")):
+    """Print the A/B extension overhead of every URL as a table."""
+    print(f"{'Extension overhead':<40}{'Metric':<22}{'Pairs':>6}{'Mean':>10}{'CI':>22}{'Rel':>8}{'p (t)':>9}{'p (W)':>9}")
+    for key, result in results.items():
+        for metric in metrics:
+            overhead = result.get("overhead", {}).get(metric)
+            if not overhead:
+                continue
+            interval = f"[{overhead['ci_low']:.1f}, {overhead['ci_high']:.1f}]"
+            relative = overhead["relative_difference"]
+            relative = f"{relative * 100:+.1f}%" if relative is not None else "N/A"
+            marker = " *" if overhead["significant"] else ""
+            print(f"{key:<40}{metric:<22}{overhead['pairs']:>6}{overhead['mean_difference']:>10.1f}{interval:>22}"
+                  f"{relative:>8}{overhead['t_p_value']:>9.4f}{overhead['wilcoxon_p_value']:>9.4f}{marker}")
+
+
+def run_command(args):
+    """Test the URLs and generate a report."""
     # Create and run the tester
-    # Comment out the extension_path parameter if not using an extension
-    tester = QoETester(
-        urls, 
-        iterations=3, 
-        timeout=60,
-        extension_path=extension_path  # Pass the extension path
-    )
+    tester = QoETester(args.urls, history_db=args.history_db, **tester_kwargs(args))
     results = tester.run_tests()
-    report_path = tester.generate_report()
+    report_path = tester.generate_report(output_dir=args.output_dir)
+    tester.finish_profiling()
+    if tester.ab_test:
+        print_overhead(results)
     
     print(f"Testing completed. Open {report_path} in a web browser to view the results.")
+    return 0
+
+
+def bench_command(args):
+    """Benchmark the harness against local synthetic pages."""
+    kwargs = tester_kwargs(args)
+    # Benchmark results are matched to scenarios by domain alone
+    del kwargs["iterations"], kwargs["network_profiles"], kwargs["ab_test"]
+    testers = []
+    
+    def make_tester(urls, iterations):
+        testers.append(QoETester(urls, iterations=iterations, **kwargs))
+        return testers[-1]
+    
+    report = run_benchmark(make_tester, iterations=args.iterations)
+    for tester in testers:
+        tester.finish_profiling()
+    print_report(report)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Benchmark report saved: {args.output}")
+    
+    if args.baseline:
+        regressions = compare_to_baseline(report, load_report(args.baseline), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+def enqueue_command(args):
+    """Add URL x iteration tasks to a work queue."""
+    urls = list(args.urls)
+    if args.url_file:
+        with open(args.url_file) as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    with WorkQueue(args.queue) as queue:
+        added = queue.enqueue(urls, args.iterations)
+        print(f"Queued {added} tasks for {len(urls)} URLs in {args.queue} ({queue.outstanding()} outstanding)")
+    return 0
+
+
+def work_command(args):
+    """Run samples from a work queue until it is drained."""
+    with WorkQueue(args.queue, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts) as queue:
+        tester = QoETester([], **tester_kwargs(args))
+        completed = tester.run_worker(queue, worker_id=args.worker_id)
+    tester.finish_profiling()
+    print(f"Worker finished after {completed} samples.")
+    return 0
+
+
+def monitor_command(args):
+    """Monitor URLs continuously and serve their metrics."""
+    schedules = dict(parse_schedule(spec) for spec in args.schedule)
+    urls = list(dict.fromkeys(list(args.urls) + list(schedules))) or DEFAULT_URLS
+    tester = QoETester(urls, **tester_kwargs(args))
+    tester.run_monitor(interval=args.interval, schedules=schedules, host=args.host, port=args.port,
+                       window=args.window)
+    tester.finish_profiling()
+    return 0
+
+
+def export_command(args):
+    """Convert JSON Lines results streams into one columnar store."""
+    rows = export_jsonl(args.inputs, args.output)
+    print(f"Exported {rows} samples to {args.output}")
+    return 0
+
+
+def compare_command(args):
+    """Compare two runs; exits with 1 if anything regressed and 2 if nothing could be tested."""
+    metrics = args.metrics or COMPARE_METRICS
+    comparison = compare_samples(
+        load_samples(args.baseline, metrics), load_samples(args.candidate, metrics),
+        alpha=args.alpha, min_effect=args.min_effect, min_change=args.min_change, metrics=metrics
+    )
+    print_comparison(comparison)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(comparison, f, indent=4)
+        print(f"Comparison saved: {args.output}")
+    if not comparison["comparisons"]:
+        # Nothing was tested, so the run cannot pass as "no regressions"
+        print("Error: every URL/metric pair was skipped; nothing could be tested", file=sys.stderr)
+        return 2
+    return 1 if comparison["regressions"] else 0
+
+
+def merge_command(args):
+    """Merge a work queue's samples into one report."""
+    with WorkQueue(args.queue) as queue:
+        counts = queue.counts()
+        if counts["pending"] or counts["leased"]:
+            print(f"Warning: {counts['pending'] + counts['leased']} tasks are not finished yet")
+        tester = QoETester([], history_db=args.history_db)
+        tester.merge_queue(queue)
+    report_path = tester.generate_report(output_dir=args.output_dir)
+    
+    print(f"Merged {counts['done']} samples ({counts['failed']} failed tasks). "
+          f"Open {report_path} in a web browser to view the results.")
+    return 0
+
+
+def main(argv=None):
+    """Main function to run the QoE tests."""
+    args = parse_args(argv)
+    handlers = {
+        "run": run_command,
+        "bench": bench_command,
+        "enqueue": enqueue_command,
+        "work": work_command,
+        "merge": merge_command,
+        "monitor": monitor_command,
+        "export": export_command,
+        "compare": compare_command
+    }
+    return handlers[args.command](args)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
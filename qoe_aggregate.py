@@ -0,0 +1,554 @@
+"""
+Multi-Run Aggregation
+---------------------
+Loads many qoe_data_<timestamp>.json runs into one NumPy array indexed by
+(run, url, metric) so cross-run summaries are batched array operations
+instead of loops over dicts.
+
+The "url" axis holds result keys (the page, plus [profile] / [variant]
+labels where those were used). Only the metrics asked for are loaded, by
+default the page QoE metrics in DEFAULT_METRICS; any numeric result field,
+or "<metric>.p50" ... "<metric>.p99" from the "stats" block, can be
+selected. Values are float32, NaN where a run has no value, and every
+reduction ignores NaN.
+
+- reduce: mean/median/percentiles/... over runs or over URLs
+- group_by: per-domain summaries across all runs, or hour/day/week
+  roll-ups per URL, computed with one sort per metric rather than a loop
+  over groups
+- rolling: sliding windows over consecutive runs
+- correlation: pairwise-complete Pearson correlation between metrics
+
+Parsing JSON is the slow part: files are parsed in a process pool, and the
+array can be cached as a .npz file so later loads read the cache and parse
+only run files that are new.
+
+Requires NumPy (pip install numpy).
+
+Usage:
+    python qoe_aggregate.py --cache reports/runs.npz summary page_load_time --by domain
+    python qoe_aggregate.py rollup ttfb --period day --func p95
+    python qoe_aggregate.py correlate page_load_time ttfb time_to_interactive
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import glob
+import json
+import os
+import warnings
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+from qoe_history import BUCKETS, run_timestamp, split_result_key
+from qoe_vitals import VITALS_METRICS
+
+# Metrics loaded when none are asked for
+DEFAULT_METRICS = (
+    ("page_load_time", "above_fold_time", "ttfb", "time_to_interactive")
+    + VITALS_METRICS + ("error_rate",)
+)
+
+# Reductions accepted by name, besides percentiles written as "p<number>"
+REDUCTIONS = ("mean", "median", "min", "max", "std", "count")
+
+
+def _require_numpy():
+    if numpy is None:
+        raise RuntimeError("qoe_aggregate requires NumPy (pip install numpy)")
+
+
+def _percentile(func):
+    """Return the percentile of a "p<number>" reduction name, or None."""
+    if func.startswith("p") and func[1:].replace(".", "", 1).isdigit():
+        return float(func[1:])
+    return None
+
+
+def _reducer(func):
+    """
+    Return a NaN-ignoring reduction f(array, axis) for a reduction name.
+
+    Args:
+        func (str): One of REDUCTIONS, or a percentile such as "p95"
+    """
+    if func == "count":
+        return lambda values, axis: (~numpy.isnan(values)).sum(axis=axis)
+    if func in ("mean", "median", "min", "max", "std"):
+        function = getattr(numpy, "nan" + func)
+    elif _percentile(func) is not None:
+        q = _percentile(func)
+        function = lambda values, axis: numpy.nanpercentile(values, q, axis=axis)  # noqa: E731
+    else:
+        raise ValueError(f"Unknown reduction {func!r}; use one of {', '.join(REDUCTIONS)} or p<percentile>")
+
+    def reduce(values, axis):
+        # All-NaN slices are expected (a URL missing from some runs)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return function(values, axis=axis)
+    return reduce
+
+
+def _grouped_reduce(values, codes, groups, func):
+    """
+    Reduce the rows of each group with one sort per column.
+
+    Args:
+        values (numpy.ndarray): (rows, columns) values, NaN where missing
+        codes (numpy.ndarray): Group of every row, 0 .. groups - 1
+        groups (int): Number of groups
+        func (str): mean, median, min, max, std, count or p<percentile>
+
+    Returns:
+        numpy.ndarray: (groups, columns) float64, NaN for empty groups
+    """
+    if func not in REDUCTIONS and _percentile(func) is None:
+        raise ValueError(f"Unknown reduction {func!r}; use one of {', '.join(REDUCTIONS)} or p<percentile>")
+    result = numpy.full((groups, values.shape[1]), numpy.nan)
+    for column in range(values.shape[1]):
+        data = values[:, column]
+        present = ~numpy.isnan(data)
+        data = data[present].astype(numpy.float64)
+        group = codes[present]
+        counts = numpy.bincount(group, minlength=groups)
+        filled = counts > 0
+        if func == "count":
+            result[:, column] = counts
+            continue
+        if func in ("mean", "std"):
+            sums = numpy.bincount(group, weights=data, minlength=groups)
+            with numpy.errstate(invalid="ignore", divide="ignore"):
+                means = sums / counts
+                if func == "mean":
+                    result[:, column] = means
+                else:
+                    squares = numpy.bincount(group, weights=data * data, minlength=groups)
+                    result[:, column] = numpy.sqrt(numpy.maximum(squares / counts - means * means, 0.0))
+            continue
+        # Order statistics: sort by group, then value, and index into each
+        # group's run with linear interpolation (NumPy's default method)
+        order = numpy.lexsort((data, group))
+        data = data[order]
+        starts = numpy.cumsum(counts) - counts
+        q = {"min": 0.0, "max": 100.0, "median": 50.0}.get(func)
+        q = _percentile(func) if q is None else q
+        position = starts[filled] + q / 100 * (counts[filled] - 1)
+        low = numpy.floor(position).astype(numpy.intp)
+        high = numpy.ceil(position).astype(numpy.intp)
+        fraction = position - low
+        result[filled, column] = data[low] + (data[high] - data[low]) * fraction
+    return result
+
+
+def _metric_getter(metric):
+    """Return a function reading a metric (or "<metric>.pNN") from a result entry."""
+    name, _, percentile = metric.partition(".")
+    if percentile:
+        def get(result):
+            value = ((result.get("stats") or {}).get(name) or {}).get(percentile)
+            return value if isinstance(value, (int, float)) else numpy.nan
+    else:
+        def get(result):
+            value = result.get(metric)
+            return value if isinstance(value, (int, float)) else numpy.nan
+    return get
+
+
+def _extract(results, metrics):
+    """
+    Pick the metrics of every result entry of one run.
+
+    Returns:
+        tuple: (result keys, float32 array of shape (keys, metrics))
+    """
+    getters = [_metric_getter(metric) for metric in metrics]
+    block = numpy.array([[get(result) for get in getters] for result in results.values()], dtype=numpy.float32)
+    return list(results), block.reshape(len(results), len(getters))
+
+
+def _read_run(path, metrics):
+    """Parse one results file (in a pool worker) and return (run time, keys, block, source)."""
+    with open(path) as f:
+        results = json.load(f)
+    return (run_timestamp(path),) + _extract(results, metrics) + (os.path.abspath(path),)
+
+
+class RunCube:
+    """Runs x URLs x metrics array of QoE results."""
+
+    def __init__(self, values, run_times, urls, metrics, domains=None, sources=None):
+        """
+        Wrap an existing array; see from_directory() to load runs.
+
+        Args:
+            values (numpy.ndarray): Array of shape (runs, urls, metrics),
+                NaN where a run has no value
+            run_times (numpy.ndarray): Unix time of every run
+            urls (list): Result key of every URL index
+            metrics (list): Name of every metric index
+            domains (list, optional): Domain of every URL index
+            sources (list, optional): File each run was loaded from
+        """
+        _require_numpy()
+        self.values = numpy.asarray(values, dtype=numpy.float32)
+        self.run_times = numpy.asarray(run_times, dtype=numpy.float64)
+        sources = list(sources) if sources is not None else [None] * len(self.run_times)
+        if numpy.any(numpy.diff(self.run_times) < 0):
+            order = numpy.argsort(self.run_times, kind="stable")
+            self.values = self.values[order]
+            self.run_times = self.run_times[order]
+            sources = [sources[index] for index in order]
+        self.sources = sources
+        self.urls = list(urls)
+        self.metrics = list(metrics)
+        self.domains = list(domains) if domains is not None else [split_result_key(url)[0] for url in self.urls]
+        self._url_index = {url: index for index, url in enumerate(self.urls)}
+        self._metric_index = {metric: index for index, metric in enumerate(self.metrics)}
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @classmethod
+    def _from_blocks(cls, blocks, count, metrics):
+        """
+        Fill a preallocated array run by run.
+
+        Args:
+            blocks (iterable): (run time, result keys, (keys, metrics)
+                array, source) per run, in run order
+            count (int): Number of runs
+            metrics (list): Metric of every block column
+        """
+        url_index = {}
+        run_times, sources = [], []
+        # Grown along the URL axis (doubling) as new URLs turn up
+        values = numpy.full((count, 64, len(metrics)), numpy.nan, dtype=numpy.float32)
+        for run, (run_time, keys, block, source) in enumerate(blocks):
+            run_times.append(run_time)
+            sources.append(source)
+            rows = [url_index.setdefault(key, len(url_index)) for key in keys]
+            if len(url_index) > values.shape[1]:
+                grown = numpy.full((count, max(len(url_index), 2 * values.shape[1]), len(metrics)),
+                                   numpy.nan, dtype=numpy.float32)
+                grown[:, :values.shape[1]] = values
+                values = grown
+            values[run, rows] = block
+        return cls(values[:len(run_times), :len(url_index)], run_times, list(url_index), metrics, None, sources)
+
+    @classmethod
+    def from_results(cls, runs, metrics=DEFAULT_METRICS):
+        """
+        Build a cube from results dicts.
+
+        Args:
+            runs (list): (run_time, results dict, source) tuples, with
+                results as written by generate_report
+            metrics (iterable): Metrics to load
+
+        Returns:
+            RunCube
+        """
+        _require_numpy()
+        metrics = list(metrics)
+        blocks = ((run_time,) + _extract(results, metrics) + (source,) for run_time, results, source in runs)
+        return cls._from_blocks(blocks, len(runs), metrics)
+
+    @classmethod
+    def from_files(cls, paths, metrics=DEFAULT_METRICS, workers=None):
+        """
+        Build a cube from qoe_data_<timestamp>.json files.
+
+        Args:
+            paths (list): Result files
+            metrics (iterable): Metrics to load
+            workers (int, optional): Processes parsing files, default one
+                per CPU
+
+        Returns:
+            RunCube
+        """
+        _require_numpy()
+        metrics = list(metrics)
+        paths = sorted(paths, key=run_timestamp)
+        workers = min(workers or os.cpu_count() or 1, len(paths))
+        if workers <= 1:
+            return cls._from_blocks((_read_run(path, metrics) for path in paths), len(paths), metrics)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            blocks = pool.map(_read_run, paths, [metrics] * len(paths), chunksize=max(1, len(paths) // (4 * workers)))
+            return cls._from_blocks(blocks, len(paths), metrics)
+
+    @classmethod
+    def from_directory(cls, directory="reports", pattern="qoe_data_*.json", cache=None, metrics=None,
+                       workers=None):
+        """
+        Load every run in a reports directory.
+
+        Args:
+            directory (str): Directory with qoe_data_*.json files
+            pattern (str): File name glob
+            cache (str, optional): .npz cache; only files not in it are
+                parsed, and it is rewritten when new runs were added. A
+                cache without every requested metric is rebuilt
+            metrics (iterable, optional): Metrics to load, default
+                DEFAULT_METRICS
+            workers (int, optional): Processes parsing files, default one
+                per CPU
+
+        Returns:
+            RunCube
+        """
+        metrics = list(metrics or DEFAULT_METRICS)
+        paths = [os.path.abspath(path) for path in sorted(glob.glob(os.path.join(directory, pattern)))]
+        cube = cls.load(cache) if cache and os.path.exists(cache) else None
+        if cube is not None and not set(metrics) <= set(cube.metrics):
+            cube = None
+        if cube is None:
+            cube = cls.from_files(paths, metrics, workers)
+        else:
+            known = set(cube.sources)
+            new = [path for path in paths if path not in known]
+            if not new:
+                return cube
+            cube = cube.concat(cls.from_files(new, cube.metrics, workers))
+        if cache:
+            cube.save(cache)
+        return cube
+
+    def concat(self, other):
+        """
+        Return a cube with the runs of both cubes (URL and metric axes are
+        merged).
+        """
+        urls = self.urls + [url for url in other.urls if url not in self._url_index]
+        domains = self.domains + [domain for url, domain in zip(other.urls, other.domains)
+                                  if url not in self._url_index]
+        metrics = self.metrics + [metric for metric in other.metrics if metric not in self._metric_index]
+        values = numpy.full((len(self.run_times) + len(other.run_times), len(urls), len(metrics)), numpy.nan,
+                            dtype=numpy.float32)
+        values[:len(self.run_times), :len(self.urls), :len(self.metrics)] = self.values
+        url_index = {url: index for index, url in enumerate(urls)}
+        metric_index = {metric: index for index, metric in enumerate(metrics)}
+        other_urls = numpy.array([url_index[url] for url in other.urls], dtype=numpy.intp)
+        other_metrics = numpy.array([metric_index[metric] for metric in other.metrics], dtype=numpy.intp)
+        values[len(self.run_times):, other_urls[:, None], other_metrics[None, :]] = other.values
+        return RunCube(
+            values,
+            numpy.concatenate([self.run_times, other.run_times]),
+            urls, metrics, domains,
+            self.sources + other.sources
+        )
+
+    def save(self, path):
+        """Write the cube to a .npz file."""
+        with open(path, "wb") as f:
+            numpy.savez(
+                f,
+                values=self.values,
+                run_times=self.run_times,
+                urls=numpy.array(self.urls, dtype=str),
+                metrics=numpy.array(self.metrics, dtype=str),
+                domains=numpy.array(self.domains, dtype=str),
+                sources=numpy.array([source or "" for source in self.sources], dtype=str),
+            )
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Read a cube written by save()."""
+        _require_numpy()
+        with numpy.load(path) as data:
+            return cls(
+                data["values"], data["run_times"],
+                data["urls"].tolist(), data["metrics"].tolist(), data["domains"].tolist(),
+                [source or None for source in data["sources"].tolist()]
+            )
+
+    def _metric_slice(self, metrics):
+        if metrics is None:
+            return slice(None), self.metrics
+        if isinstance(metrics, str):
+            metrics = [metrics]
+        try:
+            return [self._metric_index[metric] for metric in metrics], list(metrics)
+        except KeyError as e:
+            raise KeyError(f"Unknown metric {e.args[0]!r}; available: {', '.join(self.metrics)}")
+
+    def metric(self, name):
+        """Return one metric as a (runs, urls) array view."""
+        return self.values[:, :, self._metric_slice(name)[0][0]]
+
+    def reduce(self, func="median", over="run", metrics=None):
+        """
+        Reduce over runs or over URLs.
+
+        Args:
+            func (str): mean, median, min, max, std, count or p<percentile>
+            over (str): "run" (one value per URL) or "url" (one value per run)
+            metrics (str|list, optional): Metrics to keep, default all
+
+        Returns:
+            tuple: (labels, metric names, array of shape (labels, metrics)),
+                labels being the URLs or the run times
+        """
+        columns, names = self._metric_slice(metrics)
+        values = self.values[:, :, columns]
+        if over == "run":
+            return self.urls, names, _reducer(func)(values, 0)
+        if over == "url":
+            return self.run_times, names, _reducer(func)(values, 1)
+        raise ValueError("over must be 'run' or 'url'")
+
+    def group_by(self, key="domain", func="median", metrics=None):
+        """
+        Summarize groups of URLs across all runs, or groups of runs per URL.
+
+        Args:
+            key (str): "domain" groups URLs (every run and URL of a domain
+                is pooled); "hour", "day" or "week" groups runs into
+                calendar periods (UTC) for each URL
+            func (str): mean, median, min, max, std, count or p<percentile>
+            metrics (str|list, optional): Metrics to keep, default all
+
+        Returns:
+            tuple: (group labels, metric names, array) where the array has
+                shape (domains, metrics) or (periods, urls, metrics); period
+                labels are the periods' start times
+        """
+        columns, names = self._metric_slice(metrics)
+        values = self.values[:, :, columns]
+        runs, urls, width = values.shape
+        if key == "domain":
+            domains, codes = numpy.unique(numpy.array(self.domains, dtype=str), return_inverse=True)
+            # Every (run, url) row belongs to its URL's domain
+            row_codes = numpy.broadcast_to(codes, (runs, urls)).ravel()
+            result = _grouped_reduce(values.reshape(-1, width), row_codes, len(domains), func)
+            return domains.tolist(), names, result
+        if key in BUCKETS:
+            size = BUCKETS[key]
+            labels, periods = numpy.unique(numpy.floor(self.run_times / size) * size, return_inverse=True)
+            # One group per (period, url)
+            row_codes = (periods[:, None] * urls + numpy.arange(urls)[None, :]).ravel()
+            result = _grouped_reduce(values.reshape(-1, width), row_codes, len(labels) * urls, func)
+            return labels, names, result.reshape(len(labels), urls, width)
+        raise ValueError(f"Unknown group key {key!r}; use domain, {', '.join(BUCKETS)}")
+
+    def rolling(self, window, func="mean", metrics=None):
+        """
+        Apply a reduction over a sliding window of consecutive runs.
+
+        Args:
+            window (int): Runs per window
+            func (str): mean, median, min, max, std, count or p<percentile>
+            metrics (str|list, optional): Metrics to keep, default all
+
+        Returns:
+            tuple: (run times, metric names, array of shape (runs, urls,
+                metrics)); the first window - 1 runs are NaN
+        """
+        columns, names = self._metric_slice(metrics)
+        values = self.values[:, :, columns]
+        window = int(window)
+        result = numpy.full(values.shape, numpy.nan)
+        if window < 1 or window > len(values):
+            return self.run_times, names, result
+        if func in ("mean", "count"):
+            # Running sums: O(runs) however long the window is
+            present = ~numpy.isnan(values)
+            zero = numpy.zeros((1,) + values.shape[1:])
+            sums = numpy.concatenate([zero, numpy.cumsum(numpy.where(present, values, 0.0), axis=0, dtype=numpy.float64)])
+            counts = numpy.concatenate([zero, numpy.cumsum(present, axis=0)])
+            window_counts = counts[window:] - counts[:-window]
+            if func == "count":
+                result[window - 1:] = window_counts
+            else:
+                with numpy.errstate(invalid="ignore", divide="ignore"):
+                    result[window - 1:] = (sums[window:] - sums[:-window]) / window_counts
+            return self.run_times, names, result
+        windows = numpy.lib.stride_tricks.sliding_window_view(values, window, axis=0)
+        result[window - 1:] = _reducer(func)(windows, -1)
+        return self.run_times, names, result
+
+    def correlation(self, metrics=None):
+        """
+        Pearson correlation between metrics over every (run, url) pair.
+
+        Each pair of metrics uses the rows where both have a value.
+
+        Args:
+            metrics (str|list, optional): Metrics to correlate, default all
+
+        Returns:
+            tuple: (metric names, array of shape (metrics, metrics))
+        """
+        columns, names = self._metric_slice(metrics)
+        values = self.values[:, :, columns].reshape(-1, len(names)).astype(numpy.float64)
+        present = (~numpy.isnan(values)).astype(numpy.float64)
+        x = numpy.where(present > 0, values, 0.0)
+        # Pairwise sums over rows where both metrics are present
+        n = present.T @ present
+        sum_x = x.T @ present
+        sum_xx = (x * x).T @ present
+        sum_xy = x.T @ x
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            covariance = sum_xy - sum_x * sum_x.T / n
+            variance_x = sum_xx - sum_x * sum_x / n
+            result = covariance / numpy.sqrt(variance_x * variance_x.T)
+        result[n < 2] = numpy.nan
+        return names, numpy.clip(result, -1.0, 1.0)
+
+
+def _print_table(row_labels, column_labels, values):
+    print("\t".join([""] + [str(label) for label in column_labels]))
+    for label, row in zip(row_labels, values):
+        print("\t".join([str(label)] + ["" if numpy.isnan(value) else f"{value:.2f}" for value in row]))
+
+
+def main(argv=None):
+    """Command line interface for multi-run aggregation."""
+    parser = argparse.ArgumentParser(description="Aggregate QoE results across runs")
+    parser.add_argument("--reports", default="reports", help="Directory with qoe_data_*.json files")
+    parser.add_argument("--cache", default=None, help=".npz cache of the loaded runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    summary_parser = commands.add_parser("summary", help="Summarize metrics per URL or domain across runs")
+    summary_parser.add_argument("metrics", nargs="*", help="Metrics (default: the page QoE metrics)")
+    summary_parser.add_argument("--by", choices=("url", "domain"), default="url")
+    summary_parser.add_argument("--func", default="median")
+
+    rollup_parser = commands.add_parser("rollup", help="Roll a metric up per period")
+    rollup_parser.add_argument("metric")
+    rollup_parser.add_argument("--period", choices=sorted(BUCKETS), default="day")
+    rollup_parser.add_argument("--func", default="median")
+
+    correlate_parser = commands.add_parser("correlate", help="Correlation between metrics")
+    correlate_parser.add_argument("metrics", nargs="*", help="Metrics (default: the page QoE metrics)")
+
+    args = parser.parse_args(argv)
+    requested = [args.metric] if args.command == "rollup" else args.metrics
+    cube = RunCube.from_directory(args.reports, cache=args.cache, metrics=requested or None)
+    print(f"Loaded {cube.shape[0]} runs x {cube.shape[1]} URLs x {cube.shape[2]} metrics")
+    if args.command == "summary":
+        if args.by == "domain":
+            labels, names, values = cube.group_by("domain", args.func, args.metrics or None)
+        else:
+            labels, names, values = cube.reduce(args.func, "run", args.metrics or None)
+        _print_table(labels, names, values)
+    elif args.command == "rollup":
+        periods, names, values = cube.group_by(args.period, args.func, args.metric)
+        labels = [datetime.datetime.fromtimestamp(period, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M")
+                  for period in periods]
+        # One row per period, one column per URL
+        _print_table(labels, cube.urls, values[:, :, 0])
+    else:
+        names, values = cube.correlation(args.metrics or None)
+        _print_table(names, names, values)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+QoE Harness Benchmark
+---------------------
+Measures the QoE harness itself against synthetic pages served locally, so
+changes to QoETester can be checked for speed and accuracy without touching
+the internet.
+
+Every scenario gets its own local HTTP server (and therefore its own result
+key) serving a page with a configurable server delay, HTML payload size,
+number of subresources and main-thread render cost. The benchmark runs a
+tester over all scenarios and reports:
+- harness throughput (samples per second of wall-clock time)
+- harness overhead per sample
+- measurement accuracy: measured TTFB minus the injected server delay
+
+Run it through the tester's command line: python qoe-testing.py bench
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Default benchmark scenarios
+SCENARIOS = [
+    {"name": "baseline", "delay": 0, "size": 2048, "resources": 0, "render": 0},
+    {"name": "slow-server", "delay": 250, "size": 2048, "resources": 0, "render": 0},
+    {"name": "large-payload", "delay": 50, "size": 2 * 1024 * 1024, "resources": 0, "render": 0},
+    {"name": "many-resources", "delay": 50, "size": 8192, "resources": 50, "render": 0},
+    {"name": "heavy-render", "delay": 50, "size": 8192, "resources": 5, "render": 300},
+]
+
+# Subresources are served with this delay and size
+RESOURCE_DELAY_MS = 10
+RESOURCE_SIZE = 4096
+
+
+def render_page(size, resources, render):
+    """
+    Build a synthetic HTML page.
+
+    Args:
+        size (int): Approximate size of the HTML in bytes
+        resources (int): Number of subresources (alternating images and
+            stylesheets)
+        render (int): Milliseconds of main-thread work run before load
+
+    Returns:
+        bytes: HTML document
+    """
+    parts = ["<!DOCTYPE html><html><head><title>QoE benchmark</title>"]
+    for i in range(resources):
+        if i % 2:
+            parts.append(f'<link rel="stylesheet" href="/asset?kind=css&i={i}">')
+    if render:
+        parts.append(
+            "<script>const end = performance.now() + %d; while (performance.now() < end) {}</script>" % render
+        )
+    parts.append("</head><body><h1>QoE benchmark</h1><a href='#'>link</a><button>button</button>")
+    for i in range(resources):
+        if not i % 2:
+            parts.append(f'<img src="/asset?kind=img&i={i}" width="1" height="1">')
+    html = "".join(parts)
+    padding = max(0, size - len(html) - len("<p></p></body></html>"))
+    return (html + "<p>" + "x" * padding + "</p></body></html>").encode()
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        scenario = self.server.scenario
+        if parsed.path == "/":
+            time.sleep(scenario["delay"] / 1000)
+            body = render_page(scenario["size"], scenario["resources"], scenario["render"])
+            content_type = "text/html; charset=utf-8"
+        elif parsed.path == "/asset":
+            time.sleep(RESOURCE_DELAY_MS / 1000)
+            if query.get("kind") == ["css"]:
+                body = b"/*" + b"x" * RESOURCE_SIZE + b"*/"
+                content_type = "text/css"
+            else:
+                body = b"\0" * RESOURCE_SIZE
+                content_type = "image/gif"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """Local HTTP server for one synthetic-page scenario."""
+
+    def __init__(self, scenario, host="127.0.0.1"):
+        """
+        Start serving a scenario on an ephemeral port.
+
+        Args:
+            scenario (dict): name, delay (ms), size (bytes), resources and
+                render (ms)
+            host (str): Interface to bind
+        """
+        self.scenario = scenario
+        self._server = ThreadingHTTPServer((host, 0), _FixtureHandler)
+        self._server.daemon_threads = True
+        self._server.scenario = scenario
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def run_benchmark(tester_factory, scenarios=SCENARIOS, iterations=3):
+    """
+    Run a tester against local synthetic pages and measure the harness.
+
+    Args:
+        tester_factory (callable): Called with (urls, iterations) and
+            returns a configured QoETester
+        scenarios (list): Scenario dicts, see SCENARIOS
+        iterations (int): Samples per scenario
+
+    Returns:
+        dict: Overall throughput and overhead, plus per-scenario accuracy
+    """
+    servers = [FixtureServer(scenario) for scenario in scenarios]
+    try:
+        urls = [server.url for server in servers]
+        tester = tester_factory(urls, iterations)
+        start_time = time.perf_counter()
+        results = tester.run_tests()
+        elapsed = time.perf_counter() - start_time
+    finally:
+        for server in servers:
+            server.close()
+
+    report = {
+        "elapsed_seconds": elapsed,
+        "samples": 0,
+        "errors": 0,
+        "scenarios": [],
+    }
+    for server, url in zip(servers, urls):
+        result = results.get(urlparse(url).netloc, {})
+        samples = result.get("samples", 0)
+        errors = round(samples * result.get("error_rate", 0) / 100)
+        report["samples"] += samples
+        report["errors"] += errors
+        ttfb = result.get("ttfb")
+        delay = server.scenario["delay"]
+        report["scenarios"].append({
+            "name": server.scenario["name"],
+            "injected_delay": delay,
+            "ttfb": ttfb,
+            "ttfb_error": ttfb - delay if ttfb is not None else None,
+            "page_load_time": result.get("page_load_time"),
+            "harness_overhead": result.get("harness_overhead"),
+            "errors": errors,
+        })
+
+    stats = tester.run_statistics()
+    report["samples_per_second"] = report["samples"] / elapsed if elapsed else None
+    for metric in ("harness_overhead", "driver_startup_time", "sample_time"):
+        report[f"{metric}_mean"] = stats.get(metric, {}).get("mean")
+        report[f"{metric}_p95"] = stats.get(metric, {}).get("p95")
+    return report
+
+
+def compare_to_baseline(report, baseline, tolerance=0.2):
+    """
+    Check a benchmark report against a saved baseline.
+
+    Args:
+        report (dict): Report from run_benchmark
+        baseline (dict): Earlier report
+        tolerance (float): Allowed relative regression, e.g. 0.2 for 20%
+
+    Returns:
+        list: Human readable regression messages (empty if none)
+    """
+    regressions = []
+    old, new = baseline.get("samples_per_second"), report.get("samples_per_second")
+    if old and new is not None and new < old * (1 - tolerance):
+        regressions.append(f"throughput dropped from {old:.2f} to {new:.2f} samples/s")
+    for metric in ("harness_overhead_mean", "sample_time_mean"):
+        old, new = baseline.get(metric), report.get(metric)
+        if old and new is not None and new > old * (1 + tolerance):
+            regressions.append(f"{metric} grew from {old:.1f} to {new:.1f} ms")
+    return regressions
+
+
+def print_report(report):
+    """Print a benchmark report as a table."""
+    def fmt(value):
+        return f"{value:.1f}" if isinstance(value, (int, float)) else "N/A"
+
+    print(f"{'Scenario':<16}{'Delay':>8}{'TTFB':>10}{'TTFB err':>10}{'Load':>10}{'Overhead':>10}{'Errors':>8}")
+    for scenario in report["scenarios"]:
+        print(
+            f"{scenario['name']:<16}{scenario['injected_delay']:>8}{fmt(scenario['ttfb']):>10}"
+            f"{fmt(scenario['ttfb_error']):>10}{fmt(scenario['page_load_time']):>10}"
+            f"{fmt(scenario['harness_overhead']):>10}{scenario['errors']:>8}"
+        )
+    print(f"Samples: {report['samples']} in {report['elapsed_seconds']:.1f} s "
+          f"({fmt(report['samples_per_second'])} samples/s)")
+    print(f"Harness overhead per sample: mean {fmt(report['harness_overhead_mean'])} ms, "
+          f"p95 {fmt(report['harness_overhead_p95'])} ms")
+    print(f"Driver startup per sample: mean {fmt(report['driver_startup_time_mean'])} ms")
+
+
+def load_report(path):
+    """Load a benchmark report saved as JSON."""
+    with open(path) as f:
+        return json.load(f)
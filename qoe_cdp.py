@@ -0,0 +1,334 @@
+"""
+Asyncio Chrome DevTools Protocol Engine
+---------------------------------------
+Drives headless Chrome directly over the DevTools websocket instead of going
+through chromedriver. A single browser is launched and every page load gets
+its own isolated browser context (fresh cookies, cache and storage) and tab.
+When an extension has to be present, tabs share the default context with the
+HTTP cache disabled instead, since extensions do not run in new contexts.
+All tabs share one websocket using flattened target sessions, and Network and
+Page events are consumed as Chrome pushes them, so one event loop can keep
+dozens of page loads in flight.
+
+Requires the optional "websockets" package (pip install websockets).
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import shutil
+import tempfile
+
+try:
+    import websockets
+except ImportError:  # pragma: no cover - optional dependency
+    websockets = None
+
+from qoe_perflog import NETWORK_METHODS, NetworkMetrics
+
+# Executable names tried when no Chrome binary is given
+CHROME_CANDIDATES = (
+    "google-chrome",
+    "google-chrome-stable",
+    "chromium",
+    "chromium-browser",
+    "chrome",
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+)
+
+
+class CDPError(Exception):
+    """Raised when Chrome answers a DevTools command with an error."""
+
+
+def find_chrome(chrome_binary=None):
+    """
+    Locate the Chrome executable.
+
+    Args:
+        chrome_binary (str, optional): Explicit path or executable name
+
+    Returns:
+        str: Path to Chrome
+    """
+    candidates = (chrome_binary,) if chrome_binary else CHROME_CANDIDATES
+    for candidate in candidates:
+        path = shutil.which(candidate) or (candidate if os.path.isfile(candidate) else None)
+        if path:
+            return path
+    raise FileNotFoundError("Could not find a Chrome executable; pass chrome_binary")
+
+
+class CDPConnection:
+    """Browser-level DevTools websocket multiplexing flattened target sessions."""
+
+    def __init__(self, websocket):
+        self._websocket = websocket
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._sessions = {}
+        self._reader = asyncio.ensure_future(self._read_loop())
+
+    @classmethod
+    async def connect(cls, url):
+        """Open a connection to a browser websocket URL."""
+        if websockets is None:
+            raise RuntimeError("The CDP engine requires the 'websockets' package (pip install websockets)")
+        websocket = await websockets.connect(url, max_size=None, ping_interval=None)
+        return cls(websocket)
+
+    async def _read_loop(self):
+        try:
+            async for raw in self._websocket:
+                message = json.loads(raw)
+                if "id" in message:
+                    future = self._pending.pop(message["id"], None)
+                    if future and not future.done():
+                        if "error" in message:
+                            future.set_exception(CDPError(message["error"].get("message", "Unknown error")))
+                        else:
+                            future.set_result(message.get("result", {}))
+                else:
+                    queue = self._sessions.get(message.get("sessionId"))
+                    if queue is not None:
+                        queue.put_nowait((message["method"], message.get("params", {})))
+        except Exception as e:
+            error = e
+        else:
+            error = CDPError("DevTools connection closed")
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def send(self, method, params=None, session_id=None):
+        """
+        Send a DevTools command and wait for its result.
+
+        Args:
+            method (str): DevTools method, e.g. "Page.navigate"
+            params (dict, optional): Command parameters
+            session_id (str, optional): Target session to address
+
+        Returns:
+            dict: Command result
+        """
+        command_id = next(self._ids)
+        message = {"id": command_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = future
+        await self._websocket.send(json.dumps(message))
+        return await future
+
+    def events(self, session_id):
+        """Return the queue receiving (method, params) events for a session."""
+        return self._sessions.setdefault(session_id, asyncio.Queue())
+
+    def forget(self, session_id):
+        """Stop routing events for a detached session."""
+        self._sessions.pop(session_id, None)
+
+    async def close(self):
+        await self._websocket.close()
+        await self._reader
+
+
+class CDPEngine:
+    """Measure page loads over CDP with many concurrent tabs in one browser."""
+
+    def __init__(self, chrome_args=(), timeout=60, page_script=None, max_tabs=16,
+                 chrome_binary=None, isolate=True, init_script=None):
+        """
+        Initialize the engine.
+
+        Args:
+            chrome_args (iterable): Extra Chrome command line arguments
+            timeout (int): Maximum wait time for page load in seconds
+            page_script (str, optional): Script body (using "return") that
+                collects in-page metrics after load
+            max_tabs (int): Maximum number of page loads in flight
+            chrome_binary (str, optional): Path to the Chrome executable
+            isolate (bool): Give every load its own browser context. If
+                False, tabs open in the default context (where extensions
+                run) with the HTTP cache disabled.
+            init_script (str, optional): Script run at document start in
+                every tab, before the page's own scripts
+        """
+        self.chrome_args = list(chrome_args)
+        self.timeout = timeout
+        self.page_script = page_script
+        self.max_tabs = max(1, int(max_tabs))
+        self.chrome_binary = chrome_binary
+        self.isolate = isolate
+        self.init_script = init_script
+        self._process = None
+        self._profile_dir = None
+        self._connection = None
+        self._slots = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def start(self):
+        """Launch Chrome and connect to its DevTools websocket."""
+        self._profile_dir = tempfile.mkdtemp(prefix="qoe-cdp-")
+        args = [
+            find_chrome(self.chrome_binary),
+            "--remote-debugging-port=0",
+            f"--user-data-dir={self._profile_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+        ] + self.chrome_args + ["about:blank"]
+        self._process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+        self._connection = await CDPConnection.connect(await self._browser_url())
+        self._slots = asyncio.Semaphore(self.max_tabs)
+
+    async def _browser_url(self):
+        """Wait for Chrome to write DevToolsActivePort and build the websocket URL."""
+        port_file = os.path.join(self._profile_dir, "DevToolsActivePort")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        while loop.time() < deadline:
+            if self._process.returncode is not None:
+                raise CDPError(f"Chrome exited with code {self._process.returncode}")
+            try:
+                with open(port_file) as f:
+                    lines = f.read().split()
+                if len(lines) >= 2:
+                    return f"ws://127.0.0.1:{lines[0]}{lines[1]}"
+            except FileNotFoundError:
+                pass
+            await asyncio.sleep(0.05)
+        raise asyncio.TimeoutError("Chrome did not open its DevTools port")
+
+    async def close(self):
+        """Close the browser and remove its temporary profile."""
+        if self._connection:
+            try:
+                await asyncio.wait_for(self._connection.send("Browser.close"), 5)
+            except Exception:
+                pass
+            try:
+                await self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+        if self._process and self._process.returncode is None:
+            try:
+                await asyncio.wait_for(self._process.wait(), 5)
+            except asyncio.TimeoutError:
+                self._process.kill()
+                await self._process.wait()
+        self._process = None
+        if self._profile_dir:
+            shutil.rmtree(self._profile_dir, ignore_errors=True)
+            self._profile_dir = None
+
+    async def measure(self, url, network=None, waterfall=None):
+        """
+        Load a URL in a new isolated tab and collect its metrics.
+
+        Args:
+            url (str): URL to load
+            network (dict, optional): Network.emulateNetworkConditions
+                parameters applied to the tab before navigating
+            waterfall (qoe_waterfall.Waterfall, optional): Records every
+                request of the load
+
+        Returns:
+            dict: "phases" with harness timings in milliseconds
+                (driver_startup_time for tab setup, navigation_time,
+                script_evaluation_time and sample_time), "network" metrics
+                (see qoe_perflog.NetworkMetrics) and "page" metrics returned
+                by the page script
+        """
+        async with self._slots:
+            return await self._measure(url, network, waterfall)
+
+    async def _measure(self, url, network=None, waterfall=None):
+        send = self._connection.send
+        loop = asyncio.get_running_loop()
+        phases = {}
+        sample_start = loop.time()
+        context_id = None
+        target_id = None
+        session_id = None
+        try:
+            create = {"url": "about:blank"}
+            if self.isolate:
+                context = await send("Target.createBrowserContext")
+                context_id = create["browserContextId"] = context["browserContextId"]
+            target = await send("Target.createTarget", create)
+            target_id = target["targetId"]
+            attached = await send("Target.attachToTarget", {"targetId": target["targetId"], "flatten": True})
+            session_id = attached["sessionId"]
+            events = self._connection.events(session_id)
+
+            await send("Network.enable", session_id=session_id)
+            await send("Page.enable", session_id=session_id)
+            if not self.isolate:
+                await send("Network.setCacheDisabled", {"cacheDisabled": True}, session_id)
+            if network:
+                await send("Network.emulateNetworkConditions", network, session_id)
+            if self.init_script:
+                await send("Page.addScriptToEvaluateOnNewDocument", {"source": self.init_script}, session_id)
+
+            network_metrics = NetworkMetrics()
+            start_time = loop.time()
+            phases["driver_startup_time"] = (start_time - sample_start) * 1000
+            navigation = await send("Page.navigate", {"url": url}, session_id)
+            if navigation.get("errorText"):
+                raise CDPError(f"Navigation failed: {navigation['errorText']}")
+
+            deadline = start_time + self.timeout
+            while True:
+                method, params = await asyncio.wait_for(events.get(), max(0, deadline - loop.time()))
+                if method in NETWORK_METHODS:
+                    network_metrics.feed(((method, params),))
+                    if waterfall is not None:
+                        waterfall.add(method, params)
+                elif method == "Page.loadEventFired":
+                    break
+            phases["navigation_time"] = (loop.time() - start_time) * 1000
+
+            page = {}
+            script_start = loop.time()
+            if self.page_script:
+                evaluation = await send("Runtime.evaluate", {
+                    "expression": f"(() => {{{self.page_script}}})()",
+                    "returnByValue": True,
+                }, session_id)
+                if "exceptionDetails" not in evaluation:
+                    page = evaluation.get("result", {}).get("value") or {}
+            phases["script_evaluation_time"] = (loop.time() - script_start) * 1000
+
+            # Events that arrived after load (e.g. late loadingFinished)
+            while not events.empty():
+                method, params = events.get_nowait()
+                if method in NETWORK_METHODS:
+                    network_metrics.feed(((method, params),))
+                    if waterfall is not None:
+                        waterfall.add(method, params)
+
+            phases["sample_time"] = (loop.time() - sample_start) * 1000
+            return {"phases": phases, "network": network_metrics.metrics(), "page": page}
+        finally:
+            if session_id:
+                self._connection.forget(session_id)
+            try:
+                if context_id:
+                    await send("Target.disposeBrowserContext", {"browserContextId": context_id})
+                elif target_id:
+                    await send("Target.closeTarget", {"targetId": target_id})
+            except Exception:
+                pass
+
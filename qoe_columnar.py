@@ -0,0 +1,414 @@
+"""
+Columnar Sample Export
+----------------------
+Per-sample results stored column by column in a directory of raw .npy files
+plus a JSON manifest, so one metric can be read across millions of samples
+without parsing anything else.
+
+    qoe_samples_20250424_165607.qoecol/
+        manifest.json        rows, columns, dtypes and string categories
+        url.npy              int32 codes into the manifest's categories
+        iteration.npy        int32
+        timestamp.npy        float64 (Unix seconds)
+        page_load_time.npy   float32 (NaN where the sample has no value)
+        ...
+
+String columns (run id, URL, domain, profile, variant, error) are
+dictionary-encoded: each row stores an int32 code, -1 for None. Metrics are
+4-byte floats, like the waterfall columns.
+
+ColumnarWriter streams rows to disk in chunks, so an export never holds more
+than one chunk in memory. It needs only the standard library. ColumnStore
+memory-maps a column on first access: as a NumPy array when NumPy is
+installed, otherwise as a zero-copy memoryview. With pyarrow installed a
+store can also be converted to an Arrow table or written as Parquet.
+
+Usage:
+    python qoe-testing.py export --output month.qoecol results/*.jsonl
+
+    store = ColumnStore("month.qoecol")
+    load_times = store.column("page_load_time")      # mmap, nothing parsed
+    urls = store.strings("url")
+"""
+
+import datetime
+import json
+import mmap
+import os
+import sys
+import threading
+from array import array
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+FORMAT = "qoe-columnar"
+VERSION = 1
+MANIFEST = "manifest.json"
+
+# Dictionary-encoded string columns and plain columns, with array typecodes
+STRING_COLUMNS = ("run_id", "url", "domain", "profile", "variant", "error")
+FIXED_COLUMNS = {"timestamp": "d", "iteration": "i"}
+METRIC_TYPECODE = "f"
+
+_BYTE_ORDER = "<" if sys.byteorder == "little" else ">"
+_DTYPES = {"d": "f8", "f": "f4", "i": "i4", "B": "u1"}
+
+# Every .npy file gets a header of this size, rewritten with the final
+# row count on flush
+_HEADER_SIZE = 128
+_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+def _npy_header(typecode, rows):
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (
+        _BYTE_ORDER + _DTYPES[typecode], rows
+    )
+    padding = _HEADER_SIZE - len(_MAGIC) - 2 - len(header) - 1
+    return _MAGIC + (_HEADER_SIZE - len(_MAGIC) - 2).to_bytes(2, "little") + (header + " " * padding + "\n").encode()
+
+
+def _timestamp(value):
+    """Return Unix seconds for an ISO string or number, NaN if missing."""
+    if value is None:
+        return float("nan")
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return float("nan")
+
+
+class _ColumnFile:
+    """One .npy file being appended to."""
+
+    def __init__(self, path, typecode, rows_before=0, fill=0, chunk_rows=4096):
+        self.path = path
+        self.typecode = typecode
+        self.rows = 0
+        self.buffer = array(typecode)
+        self._file = open(path, "w+b")
+        self._file.write(_npy_header(typecode, 0))
+        if rows_before:
+            # A column that appears late is back-filled straight to the
+            # file, one chunk at a time
+            chunk = array(typecode, [fill]) * min(rows_before, chunk_rows)
+            for start in range(0, rows_before, len(chunk)):
+                chunk[:min(len(chunk), rows_before - start)].tofile(self._file)
+            self.rows = rows_before
+
+    def flush(self):
+        if self.buffer:
+            self._file.seek(0, os.SEEK_END)
+            self.buffer.tofile(self._file)
+            self.rows += len(self.buffer)
+            self.buffer = array(self.typecode)
+        self._file.seek(0)
+        self._file.write(_npy_header(self.typecode, self.rows))
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+class ColumnarWriter:
+    """Streams per-sample records into a columnar store directory."""
+
+    def __init__(self, path, chunk_rows=4096):
+        """
+        Create a store directory (an existing one is overwritten).
+
+        Args:
+            path (str): Store directory, conventionally ending in .qoecol
+            chunk_rows (int): Rows buffered in memory before they are
+                written
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.rows = 0
+        self._pending = 0
+        self._columns = {}
+        self._categories = {name: {} for name in STRING_COLUMNS}
+        self._metrics = []
+        self._lock = threading.Lock()
+        for name in STRING_COLUMNS:
+            self._add_column(name, "i", -1)
+        for name, typecode in FIXED_COLUMNS.items():
+            self._add_column(name, typecode, float("nan") if typecode == "d" else -1)
+
+    def _add_column(self, name, typecode, fill):
+        path = os.path.join(self.path, f"{name}.npy")
+        self._columns[name] = _ColumnFile(path, typecode, self.rows, fill, self.chunk_rows)
+
+    def _code(self, name, value):
+        if value is None:
+            return -1
+        categories = self._categories[name]
+        code = categories.get(value)
+        if code is None:
+            code = categories[value] = len(categories)
+        return code
+
+    def write(self, record):
+        """
+        Append one sample.
+
+        Args:
+            record (dict): Sample, as written to the JSON Lines results
+                stream (run_id, timestamp, url, domain, profile, variant,
+                iteration, metrics and error)
+        """
+        with self._lock:
+            columns = self._columns
+            for name in STRING_COLUMNS:
+                value = record.get(name)
+                columns[name].buffer.append(self._code(name, None if value is None else str(value)))
+            columns["timestamp"].buffer.append(_timestamp(record.get("timestamp")))
+            iteration = record.get("iteration")
+            columns["iteration"].buffer.append(-1 if iteration is None else int(iteration))
+
+            metrics = record.get("metrics") or {}
+            for metric in metrics:
+                if metric not in columns:
+                    self._metrics.append(metric)
+                    self._add_column(metric, METRIC_TYPECODE, float("nan"))
+            nan = float("nan")
+            for metric in self._metrics:
+                value = metrics.get(metric)
+                columns[metric].buffer.append(nan if value is None else float(value))
+
+            self.rows += 1
+            self._pending += 1
+            if self._pending >= self.chunk_rows:
+                self._flush()
+
+    def _flush(self):
+        for column in self._columns.values():
+            column.flush()
+        self._pending = 0
+        manifest = {
+            "format": FORMAT,
+            "version": VERSION,
+            "rows": self.rows,
+            "metrics": self._metrics,
+            "columns": {
+                name: {
+                    "file": os.path.basename(column.path),
+                    "dtype": _BYTE_ORDER + _DTYPES[column.typecode],
+                    "typecode": column.typecode,
+                }
+                for name, column in self._columns.items()
+            },
+            "categories": {name: list(categories) for name, categories in self._categories.items()},
+        }
+        temporary = os.path.join(self.path, MANIFEST + ".tmp")
+        with open(temporary, "w") as f:
+            json.dump(manifest, f, separators=(",", ":"))
+        os.replace(temporary, os.path.join(self.path, MANIFEST))
+
+    def flush(self):
+        """Write buffered rows and the manifest, leaving a readable store."""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Flush and close every column file."""
+        with self._lock:
+            self._flush()
+            for column in self._columns.values():
+                column.close()
+            self._columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ColumnStore:
+    """Lazy, memory-mapped reader for a store written by ColumnarWriter."""
+
+    def __init__(self, path):
+        """
+        Open a store. Only the manifest is read.
+
+        Args:
+            path (str): Store directory
+        """
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"{path} is not a {FORMAT} store")
+        if manifest.get("version", 0) > VERSION:
+            raise ValueError(f"{path} uses {FORMAT} version {manifest['version']}, newer than {VERSION}")
+        self.path = path
+        self.manifest = manifest
+        self.rows = manifest["rows"]
+        self.metrics = tuple(manifest["metrics"])
+        self._cache = {}
+        self._maps = []
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def columns(self):
+        return tuple(self.manifest["columns"])
+
+    def column(self, name):
+        """
+        Return a column without copying it into memory.
+
+        Args:
+            name (str): Column (a metric, "timestamp", "iteration", or a
+                string column's codes)
+
+        Returns:
+            numpy.ndarray (memory-mapped, read-only) if NumPy is installed,
+                otherwise a read-only memoryview of the column's values
+        """
+        cached = self._cache.get(name)
+        if cached is not None:
+            return cached
+        info = self.manifest["columns"].get(name)
+        if info is None:
+            raise KeyError(f"No column {name!r} in {self.path}")
+        path = os.path.join(self.path, info["file"])
+        if numpy is not None:
+            values = numpy.load(path, mmap_mode="r")[:self.rows]
+        else:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size <= _HEADER_SIZE:
+                    values = memoryview(array(info["typecode"]))
+                else:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._maps.append(mapped)
+                    width = array(info["typecode"]).itemsize
+                    values = memoryview(mapped)[_HEADER_SIZE:_HEADER_SIZE + self.rows * width].cast(info["typecode"])
+        self._cache[name] = values
+        return values
+
+    def categories(self, name):
+        """Return the distinct values of a string column, indexed by code."""
+        return self.manifest["categories"][name]
+
+    def strings(self, name):
+        """
+        Decode a string column.
+
+        Returns:
+            list: One value per row (None where the row had none)
+        """
+        categories = self.categories(name)
+        return [categories[code] if code >= 0 else None for code in self.column(name)]
+
+    def to_arrow(self):
+        """
+        Return the store as a pyarrow Table (string columns as dictionary
+        arrays).
+
+        Returns:
+            pyarrow.Table
+        """
+        if pyarrow is None:
+            raise RuntimeError("to_arrow requires pyarrow (pip install pyarrow)")
+        arrays, names = [], []
+        for name, info in self.manifest["columns"].items():
+            values = self.column(name)
+            if name in STRING_COLUMNS:
+                codes = pyarrow.array([code if code >= 0 else None for code in values], type=pyarrow.int32())
+                arrays.append(pyarrow.DictionaryArray.from_arrays(codes, pyarrow.array(self.categories(name))))
+            else:
+                arrays.append(pyarrow.array(values))
+            names.append(name)
+        return pyarrow.Table.from_arrays(arrays, names=names)
+
+    def write_parquet(self, path):
+        """Write the store as a Parquet file (requires pyarrow)."""
+        if pyarrow is None:
+            raise RuntimeError("write_parquet requires pyarrow (pip install pyarrow)")
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(self.to_arrow(), path)
+        return path
+
+    def close(self):
+        """Release the memory maps (columns returned earlier become invalid)."""
+        self._cache = {}
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                # A memoryview of it is still in use
+                pass
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_column(paths, name):
+    """
+    Concatenate one column across several stores, e.g. a month of runs.
+
+    Only that column's files are read.
+
+    Args:
+        paths (iterable): Store directories
+        name (str): Column name; stores without it contribute NaN (metrics)
+            or -1 (codes) rows
+
+    Returns:
+        numpy.ndarray if NumPy is installed, otherwise an array.array
+    """
+    parts = []
+    for path in paths:
+        store = ColumnStore(path)
+        if name in store.manifest["columns"]:
+            parts.append(store.column(name))
+        else:
+            typecode = METRIC_TYPECODE if name not in STRING_COLUMNS else "i"
+            fill = float("nan") if typecode == METRIC_TYPECODE else -1
+            parts.append(array(typecode, [fill]) * store.rows)
+    if numpy is not None:
+        return numpy.concatenate([numpy.asarray(part) for part in parts]) if parts else numpy.empty(0)
+    result = None
+    for part in parts:
+        if result is None:
+            result = array(part.format if isinstance(part, memoryview) else part.typecode)
+        result.extend(part.tolist() if isinstance(part, memoryview) else part)
+    return result if result is not None else array(METRIC_TYPECODE)
+
+
+def export_jsonl(paths, output, chunk_rows=4096):
+    """
+    Convert JSON Lines results streams into one columnar store.
+
+    Args:
+        paths (iterable): JSON Lines files written with --results-stream
+        output (str): Store directory to write
+        chunk_rows (int): Rows buffered per write
+
+    Returns:
+        int: Number of samples exported
+    """
+    from qoe_sinks import read_jsonl
+
+    with ColumnarWriter(output, chunk_rows=chunk_rows) as writer:
+        for path in paths:
+            for record in read_jsonl(path):
+                writer.write(record)
+        return writer.rows
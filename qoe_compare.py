@@ -0,0 +1,354 @@
+"""
+Run Comparison
+--------------
+Finds the URLs and metrics that got significantly slower (or faster)
+between two runs.
+
+For every result key and metric present in both runs, the per-sample
+values are compared with a two-sided Mann-Whitney U test, which makes no
+assumption about the shape of the distributions and is robust to the
+outliers page loads are full of. Thousands of URLs mean thousands of tests,
+so the p-values are adjusted with Benjamini-Hochberg to keep the false
+discovery rate at the chosen alpha.
+
+A difference only counts as a regression if it is also large enough to
+matter:
+- Cliff's delta (how often a candidate load is slower than a baseline
+  load, minus the reverse) of at least min_effect
+- the median grew by at least min_change (relative)
+
+Every metric is lower-is-better, so regressions are ranked by relative
+median change. With NumPy installed the tests run batched per sample size
+in array operations; without it they fall back to qoe_stats.
+
+The samples are read from what a run already streams to disk: a JSON Lines
+results stream (--results-stream), a columnar store (--columnar-dir), or a
+qoe_data_*.json results file, which keeps the raw values of the page QoE
+metrics unless the run narrowed --keep-values. Only the page QoE metrics are
+compared by default; harness timings would just inflate the number of
+tests the false discovery rate is spread over.
+
+With m and n samples the smallest p-value the exact test can reach is
+2 / C(m + n, m), 0.1 for 3 loads a side. URL/metric pairs whose smallest
+p-value is above alpha could never be flagged, so they are reported as
+underpowered and left out of the corrected tests.
+
+Usage:
+    python qoe-testing.py compare reports/qoe_data_old.json reports/qoe_data_new.json
+"""
+
+import json
+import math
+import os
+import statistics
+from urllib.parse import urlparse
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+from qoe_columnar import MANIFEST, ColumnStore
+from qoe_history import result_key, shared_hosts
+from qoe_sinks import read_jsonl
+from qoe_stats import (
+    MANN_WHITNEY_EXACT_MAX, benjamini_hochberg, mann_whitney_null_cdf, mann_whitney_p_value, mann_whitney_u
+)
+from qoe_vitals import VITALS_METRICS
+
+# Metrics compared by default: what the page's visitors see
+COMPARE_METRICS = ("page_load_time", "above_fold_time", "ttfb", "time_to_interactive") + VITALS_METRICS
+
+# Smallest sample size per side that is tested
+MIN_SAMPLES = 2
+
+
+def _add_value(samples, key, metric, value):
+    """Append one value unless it is missing (None or NaN)."""
+    if value is None or value != value:
+        return
+    samples.setdefault(key, {}).setdefault(metric, []).append(float(value))
+
+
+def _keyed(samples, urls):
+    """Re-key {(url, profile, variant): values} by result key, as the run of the URLs did."""
+    hosts = shared_hosts(urls)
+    return {
+        result_key(url, profile, variant, page=urlparse(url).netloc in hosts): values
+        for (url, profile, variant), values in samples.items()
+    }
+
+
+def _samples_from_store(path, metrics):
+    """Per-sample values of a columnar store, reading only the needed columns."""
+    store = ColumnStore(path)
+    try:
+        keys = list(zip(store.strings("url"), store.strings("profile"), store.strings("variant")))
+        samples = {}
+        for metric in metrics:
+            if metric not in store.metrics:
+                continue
+            column = store.column(metric)
+            values = column.tolist() if hasattr(column, "tolist") else list(column)
+            for key, value in zip(keys, values):
+                _add_value(samples, key, metric, value)
+        return _keyed(samples, store.categories("url"))
+    finally:
+        store.close()
+
+
+def samples_from_results(results, metrics=None):
+    """
+    Per-sample values kept in a results dict (its "values" blocks).
+
+    Args:
+        results (dict): Results keyed by result key
+        metrics (iterable, optional): Metrics to keep, default all kept
+
+    Returns:
+        dict: {key: {metric: [values]}}; keys without raw values map to an
+            empty dict
+    """
+    metrics = set(metrics) if metrics is not None else None
+    samples = {}
+    for key, result in results.items():
+        samples.setdefault(key, {})
+        for metric, values in (result.get("values") or {}).items():
+            if metrics is None or metric in metrics:
+                for value in values:
+                    _add_value(samples, key, metric, value)
+    return samples
+
+
+def load_samples(path, metrics=COMPARE_METRICS):
+    """
+    Read a run's per-sample values, keyed like its results.
+
+    Args:
+        path (str): JSON Lines results stream (.jsonl), columnar store
+            directory, or qoe_data_*.json results file
+        metrics (iterable): Metrics to read
+
+    Returns:
+        dict: {key: {metric: [values]}}
+    """
+    metrics = tuple(metrics)
+    if os.path.isfile(os.path.join(path, MANIFEST)):
+        return _samples_from_store(path, metrics)
+    if path.endswith(".jsonl"):
+        samples, urls = {}, set()
+        for record in read_jsonl(path):
+            urls.add(record["url"])
+            key = (record["url"], record.get("profile"), record.get("variant"))
+            values = record.get("metrics") or {}
+            for metric in metrics:
+                _add_value(samples, key, metric, values.get(metric))
+        return _keyed(samples, urls)
+    with open(path) as f:
+        return samples_from_results(json.load(f), metrics)
+
+
+def min_p_value(m, n):
+    """Smallest two-sided p-value an exact Mann-Whitney test of m and n samples can reach."""
+    return min(1.0, 2 / math.comb(m + n, m))
+
+
+def samples_needed(alpha):
+    """Smallest equal sample size per side whose exact test can reach alpha."""
+    n = MIN_SAMPLES
+    while min_p_value(n, n) > alpha:
+        n += 1
+    return n
+
+
+def _batched_tests(baseline, candidate):
+    """
+    Mann-Whitney U tests for many samples of the same sizes at once.
+
+    Args:
+        baseline (numpy.ndarray): (tests, m) baseline values
+        candidate (numpy.ndarray): (tests, n) candidate values
+
+    Returns:
+        tuple: (U statistics, p-values) arrays
+    """
+    m, n = baseline.shape[1], candidate.shape[1]
+    greater = (candidate[:, None, :] > baseline[:, :, None]).sum(axis=(1, 2))
+    equal = (candidate[:, None, :] == baseline[:, :, None]).sum(axis=(1, 2))
+    u = greater + 0.5 * equal
+    # Each value tied with t values (itself included) adds t^2 - 1, and
+    # a group of t ties sums to t^3 - t
+    pooled = numpy.concatenate([baseline, candidate], axis=1)
+    tied = (pooled[:, :, None] == pooled[:, None, :]).sum(axis=2)
+    tie_sum = (tied * tied - 1).sum(axis=1)
+
+    p_values = numpy.empty(len(u))
+    exact = tie_sum == 0
+    if m <= MANN_WHITNEY_EXACT_MAX and n <= MANN_WHITNEY_EXACT_MAX and exact.any():
+        cdf = numpy.array(mann_whitney_null_cdf(m, n))
+        extreme = numpy.minimum(u[exact], m * n - u[exact]).astype(numpy.intp)
+        p_values[exact] = numpy.minimum(1.0, 2 * cdf[extreme])
+    else:
+        exact[:] = False
+    for index in numpy.flatnonzero(~exact):
+        p_values[index] = mann_whitney_p_value(float(u[index]), m, n, float(tie_sum[index]))
+    return u, p_values
+
+
+def _run_tests(pairs):
+    """
+    Return (U, p-value) for every (baseline values, candidate values) pair.
+    """
+    if numpy is None:
+        tests = [mann_whitney_u(baseline, candidate) for baseline, candidate in pairs]
+        return [(test["statistic"], test["p_value"]) for test in tests]
+    # Batch the tests by sample sizes; runs mostly use one iteration count
+    by_shape = {}
+    for index, (baseline, candidate) in enumerate(pairs):
+        by_shape.setdefault((len(baseline), len(candidate)), []).append(index)
+    results = [None] * len(pairs)
+    for indexes in by_shape.values():
+        u, p_values = _batched_tests(
+            numpy.array([pairs[index][0] for index in indexes], dtype=numpy.float64),
+            numpy.array([pairs[index][1] for index in indexes], dtype=numpy.float64)
+        )
+        for index, statistic, p_value in zip(indexes, u.tolist(), p_values.tolist()):
+            results[index] = (statistic, p_value)
+    return results
+
+
+def compare_samples(baseline, candidate, alpha=0.05, min_effect=0.33, min_change=0.05, metrics=COMPARE_METRICS):
+    """
+    Compare two runs' per-sample values.
+
+    Args:
+        baseline (dict): {key: {metric: [values]}} of the earlier run, as
+            returned by load_samples
+        candidate (dict): The same for the run to check
+        alpha (float): False discovery rate for the Benjamini-Hochberg
+            adjusted p-values (q-values)
+        min_effect (float): Smallest Cliff's delta that counts (0.147,
+            0.33 and 0.474 are the usual small/medium/large thresholds)
+        min_change (float): Smallest relative change of the median that
+            counts, e.g. 0.05 for 5%
+        metrics (iterable, optional): Metrics to compare, None for all with
+            values in both runs
+
+    Returns:
+        dict: "comparisons" (one dict per key and metric with sample
+            sizes, medians, median_change, relative_change, cliffs_delta,
+            statistic, p_value, q_value and regression/improvement flags),
+            "regressions" and "improvements" (ranked by relative median
+            change), and "skipped" (keys only in one run, keys without
+            values, and key/metric pairs with too few samples or too few to
+            ever reach alpha)
+    """
+    metrics = set(metrics) if metrics is not None else None
+    skipped = {
+        "baseline_only": sorted(set(baseline) - set(candidate)),
+        "candidate_only": sorted(set(candidate) - set(baseline)),
+        "no_values": [],
+        "too_few_samples": [],
+        "underpowered": [],
+    }
+    rows, pairs = [], []
+    for key, old_values in baseline.items():
+        new_values = candidate.get(key)
+        if new_values is None:
+            continue
+        if not old_values or not new_values:
+            skipped["no_values"].append(key)
+            continue
+        for metric, old_samples in old_values.items():
+            new_samples = new_values.get(metric)
+            if new_samples is None or (metrics is not None and metric not in metrics):
+                continue
+            if len(old_samples) < MIN_SAMPLES or len(new_samples) < MIN_SAMPLES:
+                skipped["too_few_samples"].append((key, metric))
+                continue
+            if min_p_value(len(old_samples), len(new_samples)) > alpha:
+                skipped["underpowered"].append((key, metric, len(old_samples), len(new_samples)))
+                continue
+            rows.append({
+                "key": key,
+                "metric": metric,
+                "baseline_n": len(old_samples),
+                "candidate_n": len(new_samples),
+            })
+            pairs.append((old_samples, new_samples))
+
+    tests = _run_tests(pairs)
+    q_values = benjamini_hochberg([p_value for _, p_value in tests])
+    for row, (old_samples, new_samples), (statistic, p_value), q_value in zip(rows, pairs, tests, q_values):
+        old_median = statistics.median(old_samples)
+        new_median = statistics.median(new_samples)
+        change = new_median - old_median
+        relative = change / old_median if old_median else None
+        cliffs_delta = 2 * statistic / (row["baseline_n"] * row["candidate_n"]) - 1
+        significant = q_value <= alpha
+        # With a zero baseline median any increase is a relative change
+        large = abs(relative) >= min_change if relative is not None else change != 0
+        row.update({
+            "baseline_median": old_median,
+            "candidate_median": new_median,
+            "median_change": change,
+            "relative_change": relative,
+            "cliffs_delta": cliffs_delta,
+            "statistic": statistic,
+            "p_value": p_value,
+            "q_value": q_value,
+            "regression": significant and large and change > 0 and cliffs_delta >= min_effect,
+            "improvement": significant and large and change < 0 and cliffs_delta <= -min_effect,
+        })
+
+    def severity(row):
+        relative = row["relative_change"]
+        return (abs(relative) if relative is not None else math.inf, abs(row["cliffs_delta"]), -row["q_value"])
+
+    return {
+        "alpha": alpha,
+        "min_effect": min_effect,
+        "min_change": min_change,
+        "comparisons": rows,
+        "regressions": sorted((row for row in rows if row["regression"]), key=severity, reverse=True),
+        "improvements": sorted((row for row in rows if row["improvement"]), key=severity, reverse=True),
+        "skipped": skipped,
+    }
+
+
+def print_comparison(comparison, limit=50):
+    """Print the ranked regressions and improvements of a comparison."""
+    def relative(row):
+        return f"{row['relative_change'] * 100:+.1f}%" if row["relative_change"] is not None else "new"
+
+    for title in ("regressions", "improvements"):
+        rows = comparison[title]
+        if not rows:
+            continue
+        print(f"{title.capitalize()} ({len(rows)}):")
+        print(f"{'Key':<40}{'Metric':<26}{'n':>7}{'Median':>20}{'Change':>9}{'Delta':>7}{'q':>9}")
+        for row in rows[:limit]:
+            sizes = f"{row['baseline_n']}/{row['candidate_n']}"
+            medians = f"{row['baseline_median']:.1f} -> {row['candidate_median']:.1f}"
+            print(f"{row['key']:<40}{row['metric']:<26}{sizes:>7}{medians:>20}{relative(row):>9}"
+                  f"{row['cliffs_delta']:>7.2f}{row['q_value']:>9.4f}")
+        if len(rows) > limit:
+            print(f"... and {len(rows) - limit} more")
+
+    skipped = comparison["skipped"]
+    print(f"Compared {len(comparison['comparisons'])} URL/metric pairs: "
+          f"{len(comparison['regressions'])} regressions, {len(comparison['improvements'])} improvements "
+          f"(q <= {comparison['alpha']}, |delta| >= {comparison['min_effect']}, "
+          f"|change| >= {comparison['min_change'] * 100:.0f}%)")
+    if skipped["no_values"]:
+        print(f"Skipped {len(skipped['no_values'])} URLs without per-sample values "
+              f"(results written by an older version or without these metrics in --keep-values)")
+    if skipped["too_few_samples"]:
+        print(f"Skipped {len(skipped['too_few_samples'])} URL/metric pairs with fewer than {MIN_SAMPLES} samples")
+    if skipped["underpowered"]:
+        print(f"Warning: skipped {len(skipped['underpowered'])} URL/metric pairs whose samples are too few to "
+              f"ever reach alpha {comparison['alpha']} (at least {samples_needed(comparison['alpha'])} "
+              f"iterations per run are needed)")
+    for side in ("baseline_only", "candidate_only"):
+        if skipped[side]:
+            print(f"{len(skipped[side])} URLs only in the {side.split('_')[0]} run")
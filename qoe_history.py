@@ -0,0 +1,465 @@
+"""
+QoE History Store
+-----------------
+Keeps the results of every QoE run in one indexed SQLite database so trends
+("how has TTFB for this domain moved over 90 days?") can be answered with a
+single query instead of re-parsing every qoe_data_<timestamp>.json file.
+
+Each run's results are flattened into one row per (url, metric) with the run
+timestamp, the URL's domain and the network profile and A/B variant it was
+tested under (NULL when not used). The mean of every metric and the error
+rate are stored under the metric name; percentiles from the "stats" block
+are stored as "<metric>.p50", "<metric>.p95" and so on.
+
+Trends and aggregates are kept apart per network profile and A/B variant,
+so a 3G run is never averaged with a cable run.
+
+Usage:
+    python qoe_history.py import reports/
+    python qoe_history.py trend ttfb --domain www.github.com --days 90
+    python qoe_history.py trend ttfb --domain www.github.com --profile 3g
+    python qoe_history.py aggregate page_load_time --days 30
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import re
+import sqlite3
+import time
+from urllib.parse import urlparse
+
+# Default database location, next to the reports
+DEFAULT_DB = os.path.join("reports", "qoe_history.db")
+
+# Trend bucket sizes in seconds
+BUCKETS = {
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+}
+
+# Percentiles from a result's "stats" block that are stored
+STORED_PERCENTILES = ("p50", "p90", "p95", "p99")
+
+_FILENAME_TIMESTAMP = re.compile(r"(\d{8}_\d{6})")
+
+# Result key labels that name an A/B variant rather than a network profile
+_VARIANTS = ("baseline", "extension")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_at REAL NOT NULL,
+    source TEXT UNIQUE
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    url TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    profile TEXT,
+    variant TEXT,
+    metric TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_measurements_url_metric_ts
+    ON measurements (url, metric, timestamp);
+CREATE INDEX IF NOT EXISTS idx_measurements_domain_metric_ts
+    ON measurements (domain, metric, timestamp);
+CREATE INDEX IF NOT EXISTS idx_measurements_metric_ts
+    ON measurements (metric, timestamp);
+CREATE INDEX IF NOT EXISTS idx_measurements_run
+    ON measurements (run_id);
+"""
+
+
+def _to_epoch(value):
+    """Convert a datetime, ISO string or epoch number to epoch seconds."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _page(parsed):
+    """Return a parsed URL's path and query, "" for a site's root page."""
+    page = parsed.path.rstrip("/") + (f"?{parsed.query}" if parsed.query else "")
+    return page if not page or page.startswith("/") else "/" + page
+
+
+def shared_hosts(urls):
+    """
+    Return the hosts that more than one of the URLs (pages) is on.
+
+    Args:
+        urls (iterable): URLs of a run
+
+    Returns:
+        set: Host names (netlocs)
+    """
+    pages = {}
+    for url in urls:
+        parsed = urlparse(url)
+        pages.setdefault(parsed.netloc, set()).add(_page(parsed))
+    return {host for host, host_pages in pages.items() if len(host_pages) > 1}
+
+
+def run_timestamp(path):
+    """
+    Return the run time of a qoe_data_<timestamp>.json file in epoch seconds.
+
+    The time is taken from the file name, or the file's modification time if
+    the name has no timestamp.
+    """
+    match = _FILENAME_TIMESTAMP.search(os.path.basename(path))
+    if match:
+        return datetime.datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+    return os.path.getmtime(path)
+
+
+def result_key(url, profile=None, variant=None, page=False):
+    """
+    Return the results key of a URL tested under a network profile and A/B
+    variant, e.g. "example.com [3g] [baseline]".
+
+    Args:
+        url (str): Tested URL
+        profile (str, optional): Network profile
+        variant (str, optional): A/B variant
+        page (bool): Follow the domain with the path and query (for URLs
+            other than a site's root page), e.g. "example.com/page [3g]".
+            Runs pass True for the hosts in shared_hosts, so pages of one
+            site stay apart while single-page hosts keep their domain key.
+
+    Returns:
+        str: Result key
+    """
+    parsed = urlparse(url)
+    name = parsed.netloc + (_page(parsed) if page else "")
+    labels = [label for label in (profile, variant) if label is not None]
+    return " ".join([name] + [f"[{label}]" for label in labels])
+
+
+def split_result_key(key):
+    """
+    Split a result key such as "example.com/page [3g] [baseline]" into its parts.
+
+    Args:
+        key (str): Result key written by generate_report
+
+    Returns:
+        tuple: (domain, profile, variant), None for missing labels
+    """
+    name, *labels = key.split(" ")
+    domain = name.split("/")[0]
+    profile = variant = None
+    for label in labels:
+        label = label.strip("[]")
+        if label in _VARIANTS:
+            variant = label
+        else:
+            profile = label
+    return domain, profile, variant
+
+
+def flatten_results(results):
+    """
+    Flatten a results dict (as written by generate_report) into rows.
+
+    Args:
+        results (dict): Result key to result entry
+
+    Yields:
+        tuple: (url, domain, profile, variant, metric, value)
+    """
+    for key, result in results.items():
+        domain, profile, variant = split_result_key(key)
+        url = result.get("url") or domain
+        domain = urlparse(url).netloc or domain
+        profile = result.get("profile", profile)
+        variant = result.get("variant", variant)
+        for metric, value in result.items():
+            if _is_number(value):
+                yield url, domain, profile, variant, metric, float(value)
+        for metric, stats in (result.get("stats") or {}).items():
+            for percentile in STORED_PERCENTILES:
+                value = stats.get(percentile)
+                if _is_number(value):
+                    yield url, domain, profile, variant, f"{metric}.{percentile}", float(value)
+
+
+class HistoryStore:
+    """SQLite-backed store of QoE results across runs."""
+
+    def __init__(self, path=DEFAULT_DB):
+        """
+        Open (and create if needed) a history database.
+
+        Args:
+            path (str): SQLite database file, or ":memory:"
+        """
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:" and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def ingest_results(self, results, run_at=None, source=None):
+        """
+        Store one run's results in a single transaction.
+
+        Args:
+            results (dict): Result key (domain) to result entry
+            run_at (datetime|str|float, optional): Run time, defaults to now
+            source (str, optional): Unique origin of the run (e.g. the JSON
+                file path); ingesting the same source again is a no-op
+
+        Returns:
+            int: Run id, or None if the source was already ingested
+        """
+        run_at = _to_epoch(run_at) if run_at is not None else time.time()
+        with self.connection:
+            if source is not None:
+                existing = self.connection.execute("SELECT id FROM runs WHERE source = ?", (source,)).fetchone()
+                if existing:
+                    return None
+            run_id = self.connection.execute(
+                "INSERT INTO runs (run_at, source) VALUES (?, ?)", (run_at, source)
+            ).lastrowid
+            self.connection.executemany(
+                "INSERT INTO measurements (run_id, url, domain, profile, variant, metric, timestamp, value) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((run_id, url, domain, profile, variant, metric, run_at, value)
+                 for url, domain, profile, variant, metric, value in flatten_results(results))
+            )
+        return run_id
+
+    def import_json_file(self, path):
+        """
+        Import a qoe_data_<timestamp>.json file.
+
+        The run time is taken from the file name, or the file's modification
+        time if the name has no timestamp.
+
+        Args:
+            path (str): JSON file written by generate_report
+
+        Returns:
+            int: Run id, or None if the file was already imported
+        """
+        with open(path) as f:
+            results = json.load(f)
+        return self.ingest_results(results, run_at=run_timestamp(path), source=os.path.abspath(path))
+
+    def import_directory(self, directory="reports", pattern="qoe_data_*.json"):
+        """
+        Import every JSON result file in a directory.
+
+        Args:
+            directory (str): Directory to scan
+            pattern (str): File name glob
+
+        Returns:
+            int: Number of newly imported runs
+        """
+        imported = 0
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            if self.import_json_file(path) is not None:
+                imported += 1
+        return imported
+
+    def _filters(self, metric, url=None, domain=None, since=None, until=None, profile=None, variant=None):
+        clauses = ["metric = ?"]
+        params = [metric]
+        for column, value in (("url", url), ("domain", domain), ("profile", profile), ("variant", variant)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(_to_epoch(since))
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(_to_epoch(until))
+        return " AND ".join(clauses), params
+
+    def trend(self, metric, url=None, domain=None, since=None, until=None, bucket="day",
+              profile=None, variant=None):
+        """
+        Return a metric's trend over time, one line per network profile and
+        A/B variant.
+
+        Args:
+            metric (str): Metric name, e.g. "ttfb" or "ttfb.p95"
+            url (str, optional): Restrict to one URL
+            domain (str, optional): Restrict to one domain
+            since (datetime|str|float, optional): Start of the window
+            until (datetime|str|float, optional): End of the window
+            bucket (str): "hour", "day" or "week" (UTC boundaries)
+            profile (str, optional): Restrict to one network profile
+            variant (str, optional): Restrict to one A/B variant
+
+        Returns:
+            list: Dicts with profile, variant, bucket start (ISO), count,
+                mean, min and max, ordered by profile, variant and bucket
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"Unknown bucket: {bucket}")
+        size = BUCKETS[bucket]
+        where, params = self._filters(metric, url, domain, since, until, profile, variant)
+        rows = self.connection.execute(
+            f"""
+            SELECT profile, variant, CAST(timestamp / ? AS INTEGER) * ? AS bucket,
+                   COUNT(*), AVG(value), MIN(value), MAX(value)
+            FROM measurements
+            WHERE {where}
+            GROUP BY profile, variant, bucket
+            ORDER BY profile, variant, bucket
+            """,
+            [size, size] + params
+        ).fetchall()
+        return [
+            {
+                "profile": profile,
+                "variant": variant,
+                "bucket": datetime.datetime.fromtimestamp(start, datetime.timezone.utc).isoformat(),
+                "count": count,
+                "mean": mean,
+                "min": minimum,
+                "max": maximum,
+            }
+            for profile, variant, start, count, mean, minimum, maximum in rows
+        ]
+
+    def aggregate(self, metric, group_by="domain", since=None, until=None, profile=None, variant=None):
+        """
+        Aggregate a metric per URL or domain, network profile and A/B
+        variant over a time window.
+
+        Args:
+            metric (str): Metric name
+            group_by (str): "domain" or "url"
+            since (datetime|str|float, optional): Start of the window
+            until (datetime|str|float, optional): End of the window
+            profile (str, optional): Restrict to one network profile
+            variant (str, optional): Restrict to one A/B variant
+
+        Returns:
+            list: Dicts with the group key, profile, variant, count, mean,
+                min, max and the time of the latest run, sorted by mean
+                (slowest first)
+        """
+        if group_by not in ("domain", "url"):
+            raise ValueError(f"Unknown group_by: {group_by}")
+        where, params = self._filters(metric, since=since, until=until, profile=profile, variant=variant)
+        rows = self.connection.execute(
+            f"""
+            SELECT {group_by}, profile, variant, COUNT(*), AVG(value), MIN(value), MAX(value), MAX(timestamp)
+            FROM measurements
+            WHERE {where}
+            GROUP BY {group_by}, profile, variant
+            ORDER BY AVG(value) DESC
+            """,
+            params
+        ).fetchall()
+        return [
+            {
+                group_by: key,
+                "profile": profile,
+                "variant": variant,
+                "count": count,
+                "mean": mean,
+                "min": minimum,
+                "max": maximum,
+                "last_run": datetime.datetime.fromtimestamp(last, datetime.timezone.utc).isoformat(),
+            }
+            for key, profile, variant, count, mean, minimum, maximum, last in rows
+        ]
+
+    def metrics(self):
+        """Return the names of all stored metrics."""
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT metric FROM measurements ORDER BY metric")]
+
+
+def _print_rows(rows):
+    if not rows:
+        print("No data")
+        return
+    columns = list(rows[0])
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join(f"{row[column]:.2f}" if isinstance(row[column], float) else str(row[column]) for column in columns))
+
+
+def main(argv=None):
+    """Command line interface for the history store."""
+    parser = argparse.ArgumentParser(description="QoE history store")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Import qoe_data_*.json files")
+    import_parser.add_argument("paths", nargs="*", default=["reports"], help="JSON files or directories")
+
+    trend_parser = commands.add_parser("trend", help="Show a metric's trend")
+    trend_parser.add_argument("metric")
+    trend_parser.add_argument("--url")
+    trend_parser.add_argument("--domain")
+    trend_parser.add_argument("--days", type=int, default=90)
+    trend_parser.add_argument("--bucket", choices=sorted(BUCKETS), default="day")
+    trend_parser.add_argument("--profile")
+    trend_parser.add_argument("--variant", choices=_VARIANTS)
+
+    aggregate_parser = commands.add_parser("aggregate", help="Aggregate a metric per domain or URL")
+    aggregate_parser.add_argument("metric")
+    aggregate_parser.add_argument("--group-by", choices=("domain", "url"), default="domain")
+    aggregate_parser.add_argument("--days", type=int, default=30)
+    aggregate_parser.add_argument("--profile")
+    aggregate_parser.add_argument("--variant", choices=_VARIANTS)
+
+    args = parser.parse_args(argv)
+    with HistoryStore(args.db) as store:
+        if args.command == "import":
+            imported = 0
+            for path in args.paths:
+                if os.path.isdir(path):
+                    imported += store.import_directory(path)
+                elif store.import_json_file(path) is not None:
+                    imported += 1
+            print(f"Imported {imported} runs into {args.db}")
+        else:
+            since = time.time() - args.days * 86400
+            if args.command == "trend":
+                rows = store.trend(args.metric, url=args.url, domain=args.domain, since=since, bucket=args.bucket,
+                                   profile=args.profile, variant=args.variant)
+            else:
+                rows = store.aggregate(args.metric, group_by=args.group_by, since=since,
+                                       profile=args.profile, variant=args.variant)
+            _print_rows(rows)
+
+
+if __name__ == "__main__":
+    main()
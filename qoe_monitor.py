@@ -0,0 +1,295 @@
+"""
+Continuous QoE Monitoring
+-------------------------
+Keeps the results of a long-running monitoring loop in memory and serves
+them on a local HTTP endpoint in the OpenMetrics text format, so Prometheus
+(or anything that speaks its exposition format) can scrape fresh QoE data
+without relaunching the tool.
+
+Every URL (and network profile / A/B variant) gets:
+- a fixed-size ring buffer of its most recent samples, from which the last
+  value and windowed quantiles are exported as gauges
+- a cumulative histogram per metric with fixed buckets, exported as an
+  OpenMetrics histogram (monotonic, so rate() and histogram_quantile()
+  work across scrapes)
+- sample and error counters and the time of the last sample
+
+Timings are exported in seconds and sizes in bytes, following Prometheus
+naming conventions. The exposition text is rendered once per new sample and
+cached, so a scrape costs a dictionary lookup and a socket write.
+
+Run it through the tester's command line:
+    python qoe-testing.py monitor https://example.com --interval 300 --port 9464
+"""
+
+import bisect
+import math
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from qoe_stats import QuantileSketch
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Histogram bucket upper bounds per kind of metric (exported units)
+BUCKETS = {
+    "seconds": (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+    "bytes": (1e4, 5e4, 1e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 5e7),
+    "count": (1, 5, 10, 25, 50, 100, 250, 500, 1000),
+    "score": (0.01, 0.05, 0.1, 0.25, 0.5, 1.0),
+}
+
+# Metrics that are not timings in milliseconds
+_COUNT_METRICS = frozenset(("request_count", "failed_requests", "resource_count", "long_task_count"))
+_SCORE_METRICS = frozenset(("cumulative_layout_shift",))
+
+# Quantiles exported as gauges over the ring buffer
+WINDOW_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def metric_unit(metric):
+    """Return the exported unit of a sample metric: seconds, bytes, count or score."""
+    if metric in _COUNT_METRICS:
+        return "count"
+    if metric in _SCORE_METRICS:
+        return "score"
+    if metric.endswith("_bytes"):
+        return "bytes"
+    return "seconds"
+
+
+def metric_name(metric):
+    """Return the OpenMetrics family name of a sample metric."""
+    unit = metric_unit(metric)
+    if unit == "seconds":
+        return f"qoe_{metric}_seconds"
+    return f"qoe_{metric}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Histogram:
+    """Cumulative histogram with fixed buckets."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class _Series:
+    """Everything kept for one URL (and profile/variant)."""
+
+    def __init__(self, labels, window):
+        self.labels = labels
+        self.recent = deque(maxlen=window)
+        self.histograms = {}
+        self.samples = 0
+        self.errors = 0
+        self.last_timestamp = None
+
+
+class MonitorStore:
+    """Ring buffers, histograms and the cached OpenMetrics exposition."""
+
+    def __init__(self, metrics, window=100):
+        """
+        Initialize an empty store.
+
+        Args:
+            metrics (iterable): Sample metric names to export
+            window (int): Recent samples kept per URL for the gauges
+        """
+        self.metrics = tuple(metrics)
+        self.window = max(1, int(window))
+        self.started = time.time()
+        self._series = {}
+        self._lock = threading.Lock()
+        self._exposition = None
+
+    def add(self, sample, labels):
+        """
+        Record one sample.
+
+        Args:
+            sample (dict): Sample with "metrics" (milliseconds, counts and
+                bytes as collected) and "error"
+            labels (tuple): (name, value) pairs identifying the series, e.g.
+                (("url", "https://example.com"),)
+        """
+        now = time.time()
+        values = {}
+        for metric, value in (sample.get("metrics") or {}).items():
+            if metric in self.metrics and value is not None:
+                values[metric] = value / 1000 if metric_unit(metric) == "seconds" else value
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = _Series(labels, self.window)
+            series.samples += 1
+            series.last_timestamp = now
+            if sample.get("error"):
+                series.errors += 1
+            else:
+                series.recent.append(values)
+                for metric, value in values.items():
+                    histogram = series.histograms.get(metric)
+                    if histogram is None:
+                        histogram = series.histograms[metric] = _Histogram(BUCKETS[metric_unit(metric)])
+                    histogram.add(value)
+            self._exposition = None
+
+    def exposition(self):
+        """
+        Return the OpenMetrics text for every series.
+
+        Returns:
+            bytes: Exposition terminated by "# EOF"
+        """
+        with self._lock:
+            if self._exposition is None:
+                self._exposition = self._render().encode()
+            return self._exposition
+
+    def _render(self):
+        series_list = sorted(self._series.values(), key=lambda series: series.labels)
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        family("qoe_samples", "counter", "Samples taken")
+        for series in series_list:
+            lines.append(f"qoe_samples_total{_labels(series.labels)} {series.samples}")
+        family("qoe_errors", "counter", "Samples that failed")
+        for series in series_list:
+            lines.append(f"qoe_errors_total{_labels(series.labels)} {series.errors}")
+        family("qoe_last_sample_timestamp_seconds", "gauge", "Unix time of the last sample")
+        for series in series_list:
+            lines.append(f"qoe_last_sample_timestamp_seconds{_labels(series.labels)} {series.last_timestamp!r}")
+
+        for metric in self.metrics:
+            name = metric_name(metric)
+            with_data = [series for series in series_list if metric in series.histograms]
+            if not with_data:
+                continue
+            family(name, "histogram", f"{metric} of every sample")
+            for series in with_data:
+                histogram = series.histograms[metric]
+                cumulative = 0
+                for bound, count in zip(histogram.bounds + (math.inf,), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(series.labels, le=_number(bound))} {cumulative}")
+                lines.append(f"{name}_count{_labels(series.labels)} {histogram.count}")
+                lines.append(f"{name}_sum{_labels(series.labels)} {histogram.sum!r}")
+
+            family(f"{name}_last", "gauge", f"{metric} of the most recent successful sample")
+            for series in with_data:
+                last = next((values[metric] for values in reversed(series.recent) if metric in values), None)
+                if last is not None:
+                    lines.append(f"{name}_last{_labels(series.labels)} {_number(last)}")
+
+            family(f"{name}_window", "gauge", f"{metric} quantiles over the last {self.window} samples")
+            for series in with_data:
+                sketch = QuantileSketch()
+                sketch.extend(values[metric] for values in series.recent if metric in values)
+                if not sketch.count:
+                    continue
+                for quantile in WINDOW_QUANTILES:
+                    labels = _labels(series.labels, quantile=_number(quantile))
+                    lines.append(f"{name}_window{labels} {_number(sketch.quantile(quantile))}")
+
+        family("qoe_monitor_start_time_seconds", "gauge", "Unix time the monitor started")
+        lines.append(f"qoe_monitor_start_time_seconds {self.started!r}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.store.exposition()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """HTTP server exposing a MonitorStore on /metrics."""
+
+    def __init__(self, store, host="127.0.0.1", port=9464):
+        """
+        Start serving in a background thread.
+
+        Args:
+            store (MonitorStore): Store to expose
+            host (str): Interface to bind
+            port (int): Port to bind (0 picks a free one)
+        """
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.store = store
+        self._thread = threading.Thread(target=self._server.serve_forever, name="qoe-metrics", daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def parse_schedule(spec):
+    """
+    Parse a "URL=SECONDS" per-URL schedule.
+
+    Args:
+        spec (str): URL and re-test interval in seconds
+
+    Returns:
+        tuple: (url, interval)
+    """
+    url, separator, interval = spec.rpartition("=")
+    try:
+        if not separator or not url:
+            raise ValueError
+        interval = float(interval)
+    except ValueError:
+        raise ValueError(f"Invalid schedule {spec!r}; use URL=SECONDS")
+    if interval <= 0:
+        raise ValueError(f"Invalid schedule {spec!r}: the interval must be positive")
+    return url, interval
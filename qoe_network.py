@@ -0,0 +1,98 @@
+"""
+Network Condition Profiles
+--------------------------
+Named link profiles applied to a tab with the DevTools
+Network.emulateNetworkConditions command, so the same URLs can be measured
+as they behave on 3G, 4G or high-latency links.
+
+A profile is a dict with the added round-trip latency in milliseconds and
+the download and upload throughput in kbit/s (None for unthrottled). Presets
+follow the WebPageTest connectivity profiles. Custom profiles can be given
+as "name:latency:download:upload", e.g. "satellite:600:2000:500".
+"""
+
+# Preset profiles: name -> latency (ms), download and upload (kbit/s)
+NETWORK_PROFILES = {
+    "none": {"latency": 0, "download": None, "upload": None},
+    "3g-slow": {"latency": 400, "download": 400, "upload": 400},
+    "3g": {"latency": 300, "download": 1600, "upload": 768},
+    "3g-fast": {"latency": 170, "download": 1600, "upload": 768},
+    "4g": {"latency": 170, "download": 9000, "upload": 9000},
+    "lte": {"latency": 70, "download": 12000, "upload": 12000},
+    "dsl": {"latency": 50, "download": 1500, "upload": 384},
+    "cable": {"latency": 28, "download": 5000, "upload": 1000},
+}
+
+
+def parse_profile(spec):
+    """
+    Resolve a profile name or "name:latency:download:upload" spec.
+
+    Args:
+        spec (str): Preset name or custom spec
+
+    Returns:
+        tuple: (name, profile dict)
+    """
+    if spec in NETWORK_PROFILES:
+        return spec, NETWORK_PROFILES[spec]
+    parts = spec.split(":")
+    if len(parts) != 4:
+        raise ValueError(
+            f"Unknown network profile {spec!r}; use one of {', '.join(NETWORK_PROFILES)} "
+            "or name:latency:download:upload"
+        )
+    name, latency, download, upload = parts
+    try:
+        return name, {
+            "latency": float(latency),
+            "download": float(download) or None,
+            "upload": float(upload) or None,
+        }
+    except ValueError:
+        raise ValueError(f"Invalid network profile {spec!r}: latency and throughputs must be numbers")
+
+
+def resolve_profiles(profiles):
+    """
+    Turn profile names, specs or a name -> profile dict into an ordered dict.
+
+    Args:
+        profiles (iterable|dict): Names/specs, or profiles keyed by name
+
+    Returns:
+        dict: Profile name to profile dict, in the given order
+    """
+    if isinstance(profiles, dict):
+        return dict(profiles)
+    resolved = {}
+    for spec in profiles:
+        name, profile = parse_profile(spec)
+        if name in resolved:
+            raise ValueError(f"Duplicate network profile: {name}")
+        resolved[name] = profile
+    return resolved
+
+
+def emulation_params(profile):
+    """
+    Build Network.emulateNetworkConditions parameters for a profile.
+
+    Unthrottled directions use -1, which also lifts earlier throttling
+    from a reused tab.
+
+    Args:
+        profile (dict): latency (ms), download and upload (kbit/s or None)
+
+    Returns:
+        dict: DevTools command parameters (throughput in bytes/s)
+    """
+    def throughput(kbps):
+        return kbps * 1000 / 8 if kbps else -1
+
+    return {
+        "offline": False,
+        "latency": profile.get("latency") or 0,
+        "downloadThroughput": throughput(profile.get("download")),
+        "uploadThroughput": throughput(profile.get("upload")),
+    }
@@ -0,0 +1,245 @@
+"""
+Chrome Performance Log Processing
+---------------------------------
+Streaming helpers for the entries returned by driver.get_log("performance").
+
+Chrome is asked to log only the Network domain (perfLoggingPrefs), and
+PerformanceLogDrain empties chromedriver's buffer in small batches while the
+page loads instead of in one large transfer afterwards, so neither the
+buffer nor a single get_log response grows with the size of the page.
+
+Every entry's "message" is a JSON string wrapping one DevTools event. On heavy
+pages there are tens of thousands of them and only a handful of methods are
+of interest, so the method name is peeked from the raw string and only
+matching entries are fully decoded. Everything is a generator or a
+fixed-size accumulator, so memory use does not grow with the number of
+entries.
+"""
+
+import json
+import time
+
+# Network events consumed by NetworkMetrics
+NETWORK_METHODS = frozenset((
+    "Network.requestWillBeSent",
+    "Network.responseReceived",
+    "Network.loadingFinished",
+    "Network.loadingFailed",
+))
+
+# chromedriver perfLoggingPrefs: only the Network domain is recorded (Page
+# events and tracing are off)
+PERF_LOGGING_PREFS = {"enableNetwork": True, "enablePage": False}
+
+# chromedriver serialises events with sorted keys, so "method" sits right
+# after the "message" wrapper at the start of the string
+_METHOD_KEY = '"method":"'
+_PEEK_LIMIT = 64
+
+
+def peek_method(raw):
+    """
+    Return the DevTools method name of a raw log message without decoding it.
+
+    Args:
+        raw (str): JSON-encoded log message
+
+    Returns:
+        str: Method name, or None if it is not near the start of the message
+    """
+    start = raw.find(_METHOD_KEY, 0, _PEEK_LIMIT)
+    if start < 0:
+        return None
+    start += len(_METHOD_KEY)
+    end = raw.find('"', start)
+    if end < 0:
+        return None
+    return raw[start:end]
+
+
+def iter_log_events(logs, methods=NETWORK_METHODS):
+    """
+    Yield the DevTools events of the given methods from performance logs.
+
+    Args:
+        logs (iterable): Performance log entries from Chrome
+        methods (set): Method names to keep
+
+    Yields:
+        tuple: (method, params) for every matching event
+    """
+    for entry in logs:
+        raw = entry.get("message")
+        if not raw:
+            continue
+        method = peek_method(raw)
+        if method is not None and method not in methods:
+            continue
+        # Either a wanted method or an unexpected layout: decode it fully
+        message = json.loads(raw).get("message", {})
+        method = message.get("method")
+        if method in methods:
+            yield method, message.get("params", {})
+
+
+def _phase(timing, start_key, end_key):
+    """Return timing[end] - timing[start], or None if the phase didn't happen."""
+    start = timing.get(start_key, -1)
+    end = timing.get(end_key, -1)
+    if start is None or end is None or start < 0 or end < 0:
+        return None
+    return end - start
+
+
+class NetworkMetrics:
+    """
+    Single-pass accumulator for the network metrics of one page load.
+
+    Events can be fed in several batches (e.g. as the log is drained), and
+    only a few counters plus the main document's timing are kept.
+    """
+
+    def __init__(self):
+        self.document = None
+        self.request_count = 0
+        self.failed_requests = 0
+        self.transfer_bytes = 0
+
+    def feed(self, events):
+        """
+        Consume (method, params) events, e.g. from iter_log_events().
+
+        Args:
+            events (iterable): DevTools network events
+        """
+        for method, params in events:
+            if method == "Network.requestWillBeSent":
+                self.request_count += 1
+            elif method == "Network.loadingFinished":
+                self.transfer_bytes += params.get("encodedDataLength", 0) or 0
+            elif method == "Network.loadingFailed":
+                self.failed_requests += 1
+            elif method == "Network.responseReceived":
+                if self.document is None and params.get("type") == "Document":
+                    response = params.get("response", {})
+                    if response.get("timing"):
+                        self.document = response
+        return self
+
+    def metrics(self):
+        """
+        Return the collected metrics.
+
+        Returns:
+            dict: Timings in milliseconds (None when unavailable) and counts
+        """
+        result = {
+            "ttfb": None,
+            "latency": None,
+            "dns_time": None,
+            "connect_time": None,
+            "ssl_time": None,
+            "document_status": None,
+            "request_count": self.request_count,
+            "failed_requests": self.failed_requests,
+            "transfer_bytes": self.transfer_bytes,
+        }
+        if self.document:
+            timing = self.document["timing"]
+            # TTFB = receiveHeadersEnd - sendEnd
+            result["ttfb"] = timing.get("receiveHeadersEnd", 0) - timing.get("sendEnd", 0)
+            # Latency = request start until the first byte, including
+            # DNS, connection setup and TLS
+            result["latency"] = timing.get("receiveHeadersEnd")
+            result["dns_time"] = _phase(timing, "dnsStart", "dnsEnd")
+            result["connect_time"] = _phase(timing, "connectStart", "connectEnd")
+            result["ssl_time"] = _phase(timing, "sslStart", "sslEnd")
+            result["document_status"] = self.document.get("status")
+        return result
+
+
+def configure_performance_log(options):
+    """
+    Enable the Network-only performance log on Selenium Chrome options.
+
+    Args:
+        options: selenium.webdriver.ChromeOptions
+    """
+    options.set_capability("goog:loggingPrefs", {"performance": "INFO"})
+    options.add_experimental_option("perfLoggingPrefs", dict(PERF_LOGGING_PREFS))
+
+
+class PerformanceLogDrain:
+    """
+    Incrementally drains a driver's performance log into NetworkMetrics.
+
+    Each drain() transfers only the events logged since the previous one
+    and folds them into the accumulator (and optional waterfall) right
+    away, so nothing but the current batch is held in memory.
+    """
+
+    def __init__(self, driver, waterfall=None):
+        """
+        Initialize the drain.
+
+        Args:
+            driver: Selenium WebDriver with the performance log enabled
+            waterfall (qoe_waterfall.Waterfall, optional): Also record every
+                request
+        """
+        self.driver = driver
+        self.waterfall = waterfall
+        self.network = NetworkMetrics()
+        self.entries = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.retrieval_time = 0.0  # ms spent in get_log
+        self.parse_time = 0.0      # ms spent parsing and accumulating
+
+    def discard(self):
+        """Drop events logged before the measured navigation (e.g. a session reset)."""
+        self.driver.get_log("performance")
+
+    def drain(self):
+        """
+        Fetch and consume the events logged since the last drain.
+
+        Returns:
+            int: Number of log entries transferred
+        """
+        start = time.perf_counter()
+        logs = self.driver.get_log("performance")
+        mark = time.perf_counter()
+        events = iter_log_events(logs)
+        if self.waterfall is not None:
+            events = self.waterfall.tap(events)
+        self.network.feed(events)
+        end = time.perf_counter()
+        self.retrieval_time += (mark - start) * 1000
+        self.parse_time += (end - mark) * 1000
+        self.entries += len(logs)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(logs))
+        return len(logs)
+
+    def metrics(self):
+        """Return the network metrics collected so far, see NetworkMetrics.metrics()."""
+        return self.network.metrics()
+
+
+def extract_network_metrics(logs, waterfall=None):
+    """
+    Extract every network metric from performance logs in a single pass.
+
+    Args:
+        logs (iterable): Performance log entries from Chrome
+        waterfall (qoe_waterfall.Waterfall, optional): Also record every
+            request into this waterfall during the same pass
+
+    Returns:
+        dict: See NetworkMetrics.metrics()
+    """
+    events = iter_log_events(logs)
+    if waterfall is not None:
+        events = waterfall.tap(events)
+    return NetworkMetrics().feed(events).metrics()
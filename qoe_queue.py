@@ -0,0 +1,284 @@
+"""
+QoE Work Queue
+--------------
+Shared, lease-based queue of URL x iteration samples so several worker
+processes or hosts can split one URL list without a central service.
+
+The queue is a single SQLite file. Workers claim pending tasks with a lease,
+extend the lease with heartbeats while the sample runs and store the sample
+when it finishes. A task whose lease expires (its worker died or hung) goes
+back to pending and is picked up by another worker; after `max_attempts`
+expired leases it is marked failed so one URL that kills browsers cannot
+stall the crawl. Once everything is done the stored samples are merged into
+a single report.
+
+All workers must reach the file through a filesystem with working POSIX
+locks (a local disk, or a shared volume that supports them) and have roughly
+synchronised clocks, since lease expiry uses wall-clock time. The database
+uses the default rollback journal rather than WAL because WAL needs shared
+memory on one host.
+
+Usage:
+    python qoe-testing.py enqueue --queue crawl.db --url-file urls.txt --iterations 3
+    python qoe-testing.py work --queue crawl.db --workers 4      # on every host
+    python qoe-testing.py merge --queue crawl.db
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# Task states
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    url_id INTEGER NOT NULL REFERENCES urls(id),
+    iteration INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    finished_at REAL,
+    sample TEXT,
+    UNIQUE (url_id, iteration)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_claim
+    ON tasks (status, iteration, url_id);
+CREATE INDEX IF NOT EXISTS idx_tasks_lease
+    ON tasks (status, lease_expires);
+"""
+
+# A claimed task
+Task = namedtuple("Task", ["id", "url", "iteration", "attempts"])
+
+
+class WorkQueue:
+    """SQLite-backed queue of URL x iteration tasks with leases."""
+
+    def __init__(self, path, lease_seconds=300, max_attempts=3, busy_timeout=60):
+        """
+        Open (and create if needed) a work queue.
+
+        Args:
+            path (str): SQLite database file shared by all workers
+            lease_seconds (float): How long a claim is valid without a
+                heartbeat
+            max_attempts (int): Expired leases after which a task is marked
+                failed instead of re-queued
+            busy_timeout (float): Seconds to wait for another worker's
+                write lock
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _transaction(self, statements):
+        """Run statements(cursor) inside BEGIN IMMEDIATE ... COMMIT."""
+        with self._lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(cursor)
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+            return result
+
+    def enqueue(self, urls, iterations):
+        """
+        Add `iterations` samples of every URL.
+
+        Enqueueing a URL again only adds iterations it does not have yet,
+        so re-running the same command is safe.
+
+        Args:
+            urls (iterable): URLs to test
+            iterations (int): Samples per URL
+
+        Returns:
+            int: Number of tasks added
+        """
+        def statements(cursor):
+            before = cursor.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+            for url in urls:
+                cursor.execute("INSERT OR IGNORE INTO urls (url) VALUES (?)", (url,))
+                url_id = cursor.execute("SELECT id FROM urls WHERE url = ?", (url,)).fetchone()[0]
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO tasks (url_id, iteration) VALUES (?, ?)",
+                    ((url_id, iteration) for iteration in range(iterations))
+                )
+            return cursor.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] - before
+        return self._transaction(statements)
+
+    def claim(self, worker, limit=1):
+        """
+        Lease up to `limit` pending tasks.
+
+        Expired leases are re-queued (or failed) first. Tasks are handed out
+        iteration by iteration across URLs, so repeat samples of one site
+        are spread over the crawl.
+
+        Args:
+            worker (str): Unique worker id
+            limit (int): Maximum number of tasks to claim
+
+        Returns:
+            list: Claimed Task tuples
+        """
+        def statements(cursor):
+            now = time.time()
+            cursor.execute(
+                """
+                UPDATE tasks
+                SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    worker = NULL, lease_expires = NULL
+                WHERE status = 'leased' AND lease_expires < ?
+                """,
+                (self.max_attempts, now)
+            )
+            rows = cursor.execute(
+                """
+                SELECT tasks.id, urls.url, tasks.iteration, tasks.attempts + 1
+                FROM tasks JOIN urls ON urls.id = tasks.url_id
+                WHERE tasks.status = 'pending'
+                ORDER BY tasks.iteration, tasks.url_id
+                LIMIT ?
+                """,
+                (limit,)
+            ).fetchall()
+            cursor.executemany(
+                "UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                ((worker, now + self.lease_seconds, row[0]) for row in rows)
+            )
+            return [Task(*row) for row in rows]
+        return self._transaction(statements)
+
+    def heartbeat(self, worker, task_ids):
+        """
+        Extend the leases a worker still holds.
+
+        Args:
+            worker (str): Worker id
+            task_ids (iterable): Ids of the tasks in progress
+
+        Returns:
+            int: Number of leases extended
+        """
+        task_ids = list(task_ids)
+        if not task_ids:
+            return 0
+        with self._lock:
+            cursor = self.connection.executemany(
+                "UPDATE tasks SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                ((time.time() + self.lease_seconds, task_id, worker) for task_id in task_ids)
+            )
+            return cursor.rowcount
+
+    def complete(self, worker, task_id, sample):
+        """
+        Store a finished sample.
+
+        A sample that arrives after its lease expired is still accepted
+        unless another worker already completed the task.
+
+        Args:
+            worker (str): Worker id
+            task_id (int): Task id
+            sample (dict): Sample with "iteration", "metrics" and "error"
+
+        Returns:
+            bool: True if the sample was stored
+        """
+        record = {key: sample.get(key) for key in ("iteration", "metrics", "error")}
+        with self._lock:
+            cursor = self.connection.execute(
+                """
+                UPDATE tasks
+                SET status = 'done', worker = ?, lease_expires = NULL, finished_at = ?, sample = ?
+                WHERE id = ? AND status != 'done'
+                """,
+                (worker, time.time(), json.dumps(record, separators=(",", ":")), task_id)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, worker, task_ids):
+        """Give unfinished leases back, e.g. when a worker shuts down."""
+        task_ids = list(task_ids)
+        if not task_ids:
+            return
+        with self._lock:
+            self.connection.executemany(
+                "UPDATE tasks SET status = 'pending', worker = NULL, lease_expires = NULL, attempts = attempts - 1 "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                ((task_id, worker) for task_id in task_ids)
+            )
+
+    def counts(self):
+        """Return the number of tasks in each state."""
+        counts = dict.fromkeys((PENDING, LEASED, DONE, FAILED), 0)
+        with self._lock:
+            counts.update(self.connection.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status"))
+        return counts
+
+    def outstanding(self):
+        """Return the number of tasks that are pending or leased."""
+        counts = self.counts()
+        return counts[PENDING] + counts[LEASED]
+
+    def urls(self):
+        """Return the enqueued URLs in enqueue order."""
+        with self._lock:
+            return [row[0] for row in self.connection.execute("SELECT url FROM urls ORDER BY id")]
+
+    def iter_samples(self):
+        """
+        Iterate over finished samples, grouped by URL in enqueue order.
+
+        Failed tasks yield an error sample so they count towards the URL's
+        error rate.
+
+        Yields:
+            tuple: (url, sample dict)
+        """
+        cursor = self.connection.execute(
+            """
+            SELECT urls.url, tasks.iteration, tasks.status, tasks.attempts, tasks.sample
+            FROM tasks JOIN urls ON urls.id = tasks.url_id
+            WHERE tasks.status IN ('done', 'failed')
+            ORDER BY tasks.url_id, tasks.iteration
+            """
+        )
+        for url, iteration, status, attempts, sample in cursor:
+            if status == DONE:
+                yield url, json.loads(sample)
+            else:
+                yield url, {
+                    "iteration": iteration,
+                    "metrics": {},
+                    "error": f"Abandoned after {attempts} expired leases",
+                }
@@ -0,0 +1,402 @@
+"""
+QoE HTML Report
+---------------
+Writes the HTML report for a QoE run.
+
+The page is written to disk incrementally: a static template shell, then all
+results embedded exactly once as a compact columnar JSON blob, streamed row by
+row, then the closing template. The results table is rendered client-side from
+that blob with sorting, filtering and pagination, so only one page of rows is
+ever in the DOM. Charts show the slowest sites only. Both generating and
+opening a report with tens of thousands of URLs take seconds.
+"""
+
+import datetime
+import json
+from string import Template
+
+# Result fields shown in the results table: (key, header)
+TABLE_COLUMNS = [
+    ("page_load_time", "Page Load Time (ms)"),
+    ("above_fold_time", "Above-fold Time (ms)"),
+    ("ttfb", "Time to First Byte (ms)"),
+    ("time_to_interactive", "Time to Interactive (ms)"),
+    ("largest_contentful_paint", "Largest Contentful Paint (ms)"),
+    ("cumulative_layout_shift", "Cumulative Layout Shift"),
+    ("total_blocking_time", "Total Blocking Time (ms)"),
+    ("driver_startup_time", "Driver Startup (ms)"),
+    ("harness_overhead", "Harness Overhead (ms)"),
+    ("error_rate", "Error Rate (%)"),
+]
+
+# Charts: (canvas id, title, [(key, label, rgb)])
+CHARTS = [
+    ("pageLoadChart", "Page Load Times Comparison", [
+        ("page_load_time", "Page Load Time (ms)", "52, 152, 219"),
+        ("above_fold_time", "Above-fold Time (ms)", "46, 204, 113"),
+    ]),
+    ("ttfbChart", "Time to First Byte", [
+        ("ttfb", "Time to First Byte (ms)", "155, 89, 182"),
+    ]),
+    ("timeToInteractiveChart", "Time to Interactive", [
+        ("time_to_interactive", "Time to Interactive (ms)", "231, 76, 60"),
+        ("total_blocking_time", "Total Blocking Time (ms)", "192, 57, 43"),
+    ]),
+    ("lcpChart", "Largest Contentful Paint", [
+        ("largest_contentful_paint", "Largest Contentful Paint (ms)", "22, 160, 133"),
+    ]),
+    ("harnessChart", "Harness Time per Sample", [
+        ("harness_overhead", "Harness Overhead (ms)", "243, 156, 18"),
+        ("driver_startup_time", "Driver Startup (ms)", "127, 140, 141"),
+    ]),
+]
+
+# Number of (slowest) sites plotted per chart
+CHART_LIMIT = 50
+
+# Rows per table page
+PAGE_SIZE = 100
+
+_HEAD = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Quality of Experience Test Results</title>
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            line-height: 1.6;
+            margin: 0;
+            padding: 20px;
+            color: #333;
+        }
+        h1 {
+            color: #2c3e50;
+            border-bottom: 2px solid #3498db;
+            padding-bottom: 10px;
+        }
+        .summary {
+            margin: 20px 0;
+            padding: 15px;
+            background-color: #f8f9fa;
+            border-radius: 5px;
+        }
+        table {
+            width: 100%;
+            border-collapse: collapse;
+            margin: 20px 0;
+        }
+        th, td {
+            padding: 12px 15px;
+            border: 1px solid #ddd;
+            text-align: left;
+        }
+        th {
+            background-color: #3498db;
+            color: white;
+            position: sticky;
+            top: 0;
+        }
+        th.sortable {
+            cursor: pointer;
+        }
+        tr:nth-child(even) {
+            background-color: #f2f2f2;
+        }
+        .error {
+            color: #e74c3c;
+        }
+        .domain {
+            font-weight: bold;
+        }
+        .controls {
+            display: flex;
+            gap: 10px;
+            align-items: center;
+        }
+        .chart-container {
+            height: 400px;
+            margin: 30px 0;
+        }
+        .footer {
+            margin-top: 30px;
+            text-align: center;
+            font-size: 0.8em;
+            color: #7f8c8d;
+        }
+    </style>
+    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+</head>
+<body>
+    <h1>Quality of Experience Test Results</h1>
+    <div class="summary">
+        <p><strong>Test Date:</strong> $generated_at</p>
+        <p><strong>Number of Sites Tested:</strong> $site_count</p>
+    </div>
+
+    <h2>Results Table</h2>
+    <div class="controls">
+        <input id="filter" type="search" placeholder="Filter domains">
+        <button id="prevPage">&laquo; Prev</button>
+        <span id="pageInfo"></span>
+        <button id="nextPage">Next &raquo;</button>
+    </div>
+    <table>
+        <thead><tr id="resultsHeader"></tr></thead>
+        <tbody id="resultsBody"></tbody>
+    </table>
+
+    <h2>Distribution Summary</h2>
+    <table>
+        <thead>
+            <tr>
+                <th>Metric</th>
+                <th>Samples</th>
+                <th>Min</th>
+                <th>p50</th>
+                <th>p90</th>
+                <th>p95</th>
+                <th>p99</th>
+                <th>Max</th>
+                <th>Std Dev</th>
+            </tr>
+        </thead>
+        <tbody id="statsBody"></tbody>
+    </table>
+
+    <h2>Performance Charts</h2>
+    <p>Showing the $chart_limit slowest sites per chart.</p>
+    <div id="charts"></div>
+
+    <script id="qoe-data" type="application/json">""")
+
+_TAIL = Template("""</script>
+    <script>
+        const DATA = JSON.parse(document.getElementById('qoe-data').textContent);
+        const COLUMNS = DATA.columns;
+        const ERRORS = COLUMNS.indexOf('error_messages');
+        const PAGE_SIZE = $page_size;
+        const CHART_LIMIT = $chart_limit;
+
+        const fmt = (value, suffix) => value === null || value === undefined ? 'N/A' : value.toFixed(2) + (suffix || '');
+        const cell = (tag, text, className) => {
+            const el = document.createElement(tag);
+            el.textContent = text;
+            if (className) {
+                el.className = className;
+            }
+            return el;
+        };
+
+        // Results table: sorted, filtered and paginated client-side
+        let view = DATA.rows;
+        let needle = '';
+        let sortColumn = null;
+        let sortAscending = true;
+        let page = 0;
+
+        const header = document.getElementById('resultsHeader');
+        header.appendChild(cell('th', 'Domain', 'sortable')).onclick = () => sortBy(0);
+        DATA.table.forEach(([key, label]) => {
+            header.appendChild(cell('th', label, 'sortable')).onclick = () => sortBy(COLUMNS.indexOf(key));
+        });
+
+        function updateView() {
+            view = needle ? DATA.rows.filter(row => row[0].toLowerCase().includes(needle)) : DATA.rows.slice();
+            if (sortColumn !== null) {
+                const direction = sortAscending ? 1 : -1;
+                view.sort((a, b) => {
+                    const x = a[sortColumn], y = b[sortColumn];
+                    if (x === y) return 0;
+                    if (x === null) return 1;
+                    if (y === null) return -1;
+                    return (x < y ? -1 : 1) * direction;
+                });
+            }
+            page = 0;
+            render();
+        }
+
+        function sortBy(column) {
+            sortAscending = sortColumn === column ? !sortAscending : true;
+            sortColumn = column;
+            updateView();
+        }
+
+        document.getElementById('filter').oninput = (event) => {
+            needle = event.target.value.toLowerCase();
+            updateView();
+        };
+        document.getElementById('prevPage').onclick = () => { page = Math.max(0, page - 1); render(); };
+        document.getElementById('nextPage').onclick = () => {
+            page = Math.min(Math.max(0, Math.ceil(view.length / PAGE_SIZE) - 1), page + 1);
+            render();
+        };
+
+        function render() {
+            const body = document.getElementById('resultsBody');
+            const fragment = document.createDocumentFragment();
+            for (const row of view.slice(page * PAGE_SIZE, (page + 1) * PAGE_SIZE)) {
+                const tr = document.createElement('tr');
+                tr.appendChild(cell('td', row[0], 'domain'));
+                DATA.table.forEach(([key]) => {
+                    tr.appendChild(cell('td', fmt(row[COLUMNS.indexOf(key)], key === 'error_rate' ? '%' : '')));
+                });
+                fragment.appendChild(tr);
+                if (row[ERRORS] && row[ERRORS].length) {
+                    const errors = document.createElement('tr');
+                    const td = cell('td', '', 'error');
+                    td.colSpan = DATA.table.length + 1;
+                    td.appendChild(cell('strong', 'Errors:'));
+                    for (const message of row[ERRORS]) {
+                        td.appendChild(document.createElement('br'));
+                        td.appendChild(document.createTextNode(message));
+                    }
+                    errors.appendChild(td);
+                    fragment.appendChild(errors);
+                }
+            }
+            body.replaceChildren(fragment);
+            const pages = Math.max(1, Math.ceil(view.length / PAGE_SIZE));
+            document.getElementById('pageInfo').textContent =
+                'Page ' + (page + 1) + ' of ' + pages + ' (' + view.length + ' sites)';
+        }
+        render();
+
+        // Distribution summary
+        const statsBody = document.getElementById('statsBody');
+        for (const [metric, stats] of Object.entries(DATA.stats)) {
+            const tr = document.createElement('tr');
+            tr.appendChild(cell('td', metric, 'domain'));
+            tr.appendChild(cell('td', String(stats.count)));
+            for (const key of ['min', 'p50', 'p90', 'p95', 'p99', 'max', 'stddev']) {
+                tr.appendChild(cell('td', fmt(stats[key])));
+            }
+            statsBody.appendChild(tr);
+        }
+
+        // Charts of the slowest sites
+        if (window.Chart) {
+            const charts = document.getElementById('charts');
+            for (const chart of DATA.charts) {
+                const primary = COLUMNS.indexOf(chart.datasets[0].key);
+                const rows = DATA.rows
+                    .filter(row => row[primary] !== null)
+                    .sort((a, b) => b[primary] - a[primary])
+                    .slice(0, CHART_LIMIT);
+                const container = document.createElement('div');
+                container.className = 'chart-container';
+                const canvas = document.createElement('canvas');
+                canvas.id = chart.id;
+                container.appendChild(canvas);
+                charts.appendChild(container);
+                new Chart(canvas.getContext('2d'), {
+                    type: 'bar',
+                    data: {
+                        labels: rows.map(row => row[0]),
+                        datasets: chart.datasets.map(dataset => ({
+                            label: dataset.label,
+                            data: rows.map(row => row[COLUMNS.indexOf(dataset.key)] || 0),
+                            backgroundColor: 'rgba(' + dataset.rgb + ', 0.7)',
+                            borderColor: 'rgba(' + dataset.rgb + ', 1)',
+                            borderWidth: 1
+                        }))
+                    },
+                    options: {
+                        responsive: true,
+                        maintainAspectRatio: false,
+                        animation: false,
+                        plugins: {
+                            title: {
+                                display: true,
+                                text: chart.title
+                            }
+                        },
+                        scales: {
+                            y: {
+                                beginAtZero: true,
+                                title: {
+                                    display: true,
+                                    text: 'Time (ms)'
+                                }
+                            }
+                        }
+                    }
+                });
+            }
+        }
+    </script>
+
+    <div class="footer">
+        <p>Generated on $generated_at</p>
+    </div>
+</body>
+</html>
+""")
+
+
+def _dumps(value):
+    """Compact JSON that is safe to embed inside a <script> element."""
+    return json.dumps(value, separators=(",", ":")).replace("</", "<\\/")
+
+
+def write_html_report(results, report_file, run_statistics=None, table_columns=None,
+                      charts=None, generated_at=None):
+    """
+    Write the HTML report for a run.
+
+    Args:
+        results (dict): Result key (domain) to result entry
+        report_file (str): Path of the HTML file to write
+        run_statistics (dict, optional): Metric to distribution summary
+            (see QoETester.run_statistics)
+        table_columns (list, optional): (key, header) pairs for the results
+            table, defaults to TABLE_COLUMNS
+        charts (list, optional): Chart definitions, defaults to CHARTS
+        generated_at (datetime, optional): Report time, defaults to now
+
+    Returns:
+        str: Path to the generated report
+    """
+    table_columns = table_columns or TABLE_COLUMNS
+    charts = charts or CHARTS
+    generated_at = (generated_at or datetime.datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+
+    keys = [key for key, _ in table_columns]
+    for _, _, datasets in charts:
+        keys.extend(key for key, _, _ in datasets if key not in keys)
+    columns = ["domain"] + keys + ["error_messages"]
+
+    with open(report_file, "w", encoding="utf-8") as f:
+        f.write(_HEAD.substitute(
+            generated_at=generated_at,
+            site_count=len(results),
+            chart_limit=CHART_LIMIT
+        ))
+
+        # Embed the data once, streaming one row at a time
+        f.write('{"columns":' + _dumps(columns))
+        f.write(',"table":' + _dumps(table_columns))
+        f.write(',"charts":' + _dumps([
+            {
+                "id": chart_id,
+                "title": title,
+                "datasets": [{"key": key, "label": label, "rgb": rgb} for key, label, rgb in datasets]
+            }
+            for chart_id, title, datasets in charts
+        ]))
+        f.write(',"stats":' + _dumps(run_statistics or {}))
+        f.write(',"rows":[')
+        for i, (domain, data) in enumerate(results.items()):
+            row = [domain] + [data.get(key) for key in keys] + [data.get("error_messages") or []]
+            f.write(("," if i else "") + _dumps(row))
+        f.write("]}")
+
+        f.write(_TAIL.substitute(
+            generated_at=generated_at,
+            page_size=PAGE_SIZE,
+            chart_limit=CHART_LIMIT
+        ))
+
+    return report_file
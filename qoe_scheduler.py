@@ -0,0 +1,352 @@
+"""
+Deadline Scheduler
+------------------
+Runs QoE samples on a thread pool under wall-clock budgets so a run's total
+time is predictable and not dominated by a few hanging pages.
+
+- Run budget: once it is spent, loads in flight are cancelled and every
+  sample not taken yet is recorded as skipped.
+- URL budget: each URL (or URL and network profile) gets at most this much
+  wall-clock time across all of its samples.
+- Hedging: when a load runs past the typical latency of that URL (a
+  quantile of its earlier successful attempts, or of the whole run until
+  the URL has enough of them), a duplicate attempt is launched on a spare
+  slot. The first attempt to succeed wins and the other is cancelled.
+  Samples won by a duplicate are marked "hedge_won", since they are biased
+  towards the faster of two loads; result summaries keep them out of the
+  URL's means and percentiles.
+- Retries: attempts that fail with a transient error are retried with
+  exponential backoff and jitter.
+
+Cancelling an attempt quits the browsers bound to it, which makes the
+blocked WebDriver call return; its result is then ignored. Budgets and hedge
+delays count from the moment an attempt starts running, not from when it was
+submitted, and a cancelled attempt keeps its slot until its thread returns,
+so no more than workers + hedge_slots browsers ever run at once.
+"""
+
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from qoe_stats import QuantileSketch
+
+# Seconds between checks for submitted attempts a worker thread has not
+# picked up yet; their budget and hedge clocks only start then
+_START_POLL = 0.05
+
+
+class AttemptCancelled(Exception):
+    """Raised when a cancelled attempt tries to bind a new browser."""
+
+
+class Attempt:
+    """One try at taking a sample, which the scheduler can cancel."""
+
+    def __init__(self, job, number, hedge=False):
+        self.job = job
+        self.number = number
+        self.hedge = hedge
+        # time.monotonic() once a worker thread picked the attempt up
+        self.started = None
+        # Set once the attempt finished or was cancelled
+        self.settled = False
+        self.cancelled = False
+        self._drivers = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Mark the attempt as running.
+
+        Raises:
+            AttemptCancelled: If the attempt was cancelled before it started
+        """
+        with self._lock:
+            if self.cancelled:
+                raise AttemptCancelled("attempt cancelled")
+            self.started = time.monotonic()
+
+    def bind(self, driver):
+        """
+        Register a browser the attempt is using, so cancel() can stop it.
+
+        Raises:
+            AttemptCancelled: If the attempt was cancelled meanwhile
+        """
+        with self._lock:
+            if self.cancelled:
+                raise AttemptCancelled("attempt cancelled")
+            self._drivers.append(driver)
+
+    def cancel(self):
+        """Mark the attempt cancelled and quit its browsers."""
+        with self._lock:
+            self.cancelled = True
+            drivers, self._drivers = self._drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+
+class _Job:
+    """A sample that has to be taken, with the attempts made so far."""
+
+    def __init__(self, index, iteration):
+        self.index = index
+        self.iteration = iteration
+        self.attempts = []
+        self.retries = 0
+        self.hedged = False
+        self.done = False
+        self.last_sample = None
+
+
+class DeadlineScheduler:
+    """Take the samples of a SamplingPlan under run and URL budgets."""
+
+    def __init__(self, runner, workers=1, run_budget=None, url_budget=None,
+                 hedge_quantile=0.9, hedge_min_samples=3, hedge_slots=1,
+                 max_retries=2, backoff=1.0, max_backoff=30.0, is_retryable=None,
+                 skipped_sample=None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            runner (callable): Called with (url, iteration, profile,
+                attempt=Attempt) and returns a sample dict
+            workers (int): Primary attempts run at once
+            run_budget (float, optional): Seconds for the whole run
+            url_budget (float, optional): Seconds per URL across all of its
+                samples
+            hedge_quantile (float): Quantile of earlier attempt durations
+                after which a duplicate attempt is launched
+            hedge_min_samples (int): Successful attempts needed before the
+                durations are trusted for hedging
+            hedge_slots (int): Duplicate attempts run at once (0 disables
+                hedging)
+            max_retries (int): Retries of a sample after transient errors
+            backoff (float): Seconds before the first retry, doubled for
+                every further retry
+            max_backoff (float): Upper bound of the retry delay
+            is_retryable (callable, optional): Called with a failed sample,
+                returns True if the error is transient
+            skipped_sample (callable, optional): Called with (url,
+                iteration, profile, error) and returns the sample recorded
+                for a sample that was never taken
+        """
+        self.runner = runner
+        self.workers = max(1, int(workers))
+        self.run_budget = run_budget
+        self.url_budget = url_budget
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_slots = max(0, int(hedge_slots))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.is_retryable = is_retryable or (lambda sample: False)
+        self.skipped_sample = skipped_sample or (
+            lambda url, iteration, profile, error:
+            {"url": url, "iteration": iteration, "profile": profile, "metrics": {}, "error": error}
+        )
+        self.stats = collections.Counter()
+
+    def _hedge_delay(self, index):
+        """Seconds after which an attempt of a case gets a duplicate, or None."""
+        for sketch in (self._case_durations.get(index), self._run_durations):
+            if sketch is not None and sketch.count >= self.hedge_min_samples:
+                return sketch.quantile(self.hedge_quantile)
+        return None
+
+    def _settle(self, attempt, now):
+        """Charge a finished or cancelled primary attempt's time to its case."""
+        if not attempt.settled:
+            attempt.settled = True
+            if not attempt.hedge and attempt.started is not None:
+                self._case_spent[attempt.job.index] += now - attempt.started
+
+    def _remaining(self, index, running, now):
+        """Seconds left in a case's URL budget, or None without a budget."""
+        if self.url_budget is None:
+            return None
+        in_flight = sum(now - attempt.started for attempt in running
+                        if attempt.job.index == index and not attempt.hedge and not attempt.settled
+                        and attempt.started is not None)
+        return self.url_budget - self._case_spent[index] - in_flight
+
+    def _execute(self, attempt, url, iteration, profile):
+        """Run one attempt on a worker thread."""
+        attempt.start()
+        return self.runner(url, iteration, profile, attempt=attempt)
+
+    def run(self, plan, cases, deliver):
+        """
+        Take every sample the plan asks for.
+
+        Args:
+            plan (SamplingPlan): Decides which samples to take
+            cases (list): (url, profile) pairs indexed like the plan
+            deliver (callable): Called with (index, sample) for every
+                finished, failed or skipped sample; returns follow-up
+                (index, iteration) tasks
+        """
+        self._case_durations = {}
+        self._run_durations = QuantileSketch()
+        self._case_spent = collections.defaultdict(float)
+        run_deadline = time.monotonic() + self.run_budget if self.run_budget is not None else None
+        queue = collections.deque(_Job(*task) for task in plan.initial_tasks())
+        retry_heap = []
+        sequence = itertools.count()
+        futures = {}
+
+        pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers + self.hedge_slots, thread_name_prefix="qoe-attempt"
+        )
+
+        def launch(job, hedge=False):
+            url, profile = cases[job.index]
+            attempt = Attempt(job, len(job.attempts) + 1, hedge)
+            job.attempts.append(attempt)
+            self.stats["hedges" if hedge else "attempts"] += 1
+            futures[pool.submit(self._execute, attempt, url, job.iteration, profile)] = attempt
+
+        def finish(job, sample, winner=None):
+            job.done = True
+            now = time.monotonic()
+            for attempt in job.attempts:
+                if attempt is not winner and not attempt.settled:
+                    self.stats["cancelled"] += 1
+                    self._settle(attempt, now)
+                    attempt.cancel()
+            sample["attempts"] = len(job.attempts)
+            sample["hedged"] = job.hedged
+            sample["hedge_won"] = winner is not None and winner.hedge
+            queue.extend(_Job(*task) for task in deliver(job.index, sample))
+
+        def skip(job, reason):
+            url, profile = cases[job.index]
+            self.stats["skipped"] += 1
+            error = f"Skipped: {reason}"
+            if job.last_sample is not None:
+                finish(job, dict(job.last_sample, error=error))
+            else:
+                finish(job, self.skipped_sample(url, job.iteration, profile, error))
+
+        try:
+            while queue or retry_heap or futures:
+                now = time.monotonic()
+
+                # Run budget: cancel and skip everything that is left
+                if run_deadline is not None and now >= run_deadline:
+                    pending = [attempt.job for attempt in futures.values()]
+                    pending.extend(job for _, _, job in retry_heap)
+                    retry_heap.clear()
+                    for job in pending:
+                        if not job.done:
+                            skip(job, "run budget exhausted")
+                    # Includes follow-ups the skips produced
+                    while queue:
+                        skip(queue.popleft(), "run budget exhausted")
+                    break
+
+                # URL budgets of samples in flight
+                running = list(futures.values())
+                for attempt in running:
+                    job = attempt.job
+                    if job.done:
+                        continue
+                    remaining = self._remaining(job.index, running, now)
+                    if remaining is not None and remaining <= 0:
+                        skip(job, "URL budget exhausted")
+
+                # Retries whose backoff has passed go first
+                while retry_heap and retry_heap[0][0] <= now:
+                    queue.appendleft(heapq.heappop(retry_heap)[2])
+
+                # Primary attempts; cancelled attempts hold their slot until
+                # their thread returns
+                primary = sum(1 for attempt in futures.values() if not attempt.hedge)
+                while queue and primary < self.workers:
+                    job = queue.popleft()
+                    remaining = self._remaining(job.index, futures.values(), now)
+                    if remaining is not None and remaining <= 0:
+                        skip(job, "URL budget exhausted")
+                        continue
+                    launch(job)
+                    primary += 1
+
+                # Hedges for attempts running past their case's typical latency
+                wakeups = [run_deadline] if run_deadline is not None else []
+                hedges = sum(1 for attempt in futures.values() if attempt.hedge)
+                running = list(futures.values())
+                for attempt in running:
+                    job = attempt.job
+                    if job.done or attempt.settled:
+                        continue
+                    if attempt.started is None:
+                        wakeups.append(now + _START_POLL)
+                        continue
+                    remaining = self._remaining(job.index, running, now)
+                    if remaining is not None:
+                        wakeups.append(now + remaining)
+                    if job.hedged or attempt.hedge or not self.hedge_slots:
+                        continue
+                    delay = self._hedge_delay(job.index)
+                    if delay is None:
+                        continue
+                    if now - attempt.started < delay:
+                        wakeups.append(attempt.started + delay)
+                    elif hedges < self.hedge_slots:
+                        job.hedged = True
+                        hedges += 1
+                        launch(job, hedge=True)
+                if retry_heap:
+                    wakeups.append(retry_heap[0][0])
+
+                if not futures:
+                    if retry_heap and not queue:
+                        time.sleep(max(0.0, min(wakeups) - time.monotonic()))
+                    continue
+
+                timeout = max(0.01, min(wakeups) - time.monotonic()) if wakeups else None
+                done, _ = concurrent.futures.wait(futures, timeout=timeout,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                now = time.monotonic()
+                for future in done:
+                    attempt = futures.pop(future)
+                    job = attempt.job
+                    if attempt.settled or job.done:
+                        continue
+                    self._settle(attempt, now)
+                    sample = future.result()
+                    if not sample["error"]:
+                        duration = now - attempt.started
+                        self._case_durations.setdefault(job.index, QuantileSketch()).add(duration)
+                        self._run_durations.add(duration)
+                        if attempt.hedge:
+                            self.stats["hedge_wins"] += 1
+                        finish(job, sample, winner=attempt)
+                        continue
+                    job.last_sample = sample
+                    if any(not other.settled for other in job.attempts):
+                        # The other attempt may still succeed
+                        continue
+                    if self.is_retryable(sample) and job.retries < self.max_retries:
+                        job.retries += 1
+                        job.hedged = False
+                        self.stats["retries"] += 1
+                        delay = min(self.max_backoff, self.backoff * 2 ** (job.retries - 1))
+                        heapq.heappush(retry_heap, (now + delay * random.uniform(0.5, 1.5), next(sequence), job))
+                        continue
+                    finish(job, sample)
+        finally:
+            for attempt in futures.values():
+                attempt.cancel()
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,289 @@
+"""
+WebDriver Session Pool
+----------------------
+Keeps headless Chrome sessions alive across samples so QoE runs only pay
+browser startup when a measurement really needs a cold browser.
+
+Two profile policies are supported:
+- "fresh": every sample gets a brand new browser (and profile), which is
+  then quit. This matches a first-visit, cold-start measurement.
+- "reused": sessions are kept warm and reset between navigations by
+  clearing the HTTP cache, cookies, storage and service workers of every
+  origin the previous page touched. Chrome's DNS cache and socket pool are
+  not flushed, so connection setup may be cheaper than on a cold browser.
+
+Independently of the profile policy, sessions can be attached to a small
+ServicePool of long-lived chromedriver processes instead of every session
+spawning and tearing down its own chromedriver.
+"""
+
+import itertools
+import threading
+import time
+from urllib.parse import urlparse
+
+from selenium.webdriver.chrome.service import Service
+
+PROFILE_POLICIES = ("fresh", "reused")
+
+
+def _origin(url):
+    """Return the scheme://host[:port] origin of a URL, or None."""
+    parsed = urlparse(url or "")
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        return None
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def reset_driver(driver, visited_urls=()):
+    """
+    Reset browser state so the next navigation behaves like a first visit.
+
+    Args:
+        driver: WebDriver instance to reset
+        visited_urls (iterable): URLs the last navigation touched; their
+            origins get their storage and service workers cleared
+    """
+    origins = {_origin(url) for url in visited_urls}
+    origins.add(_origin(driver.current_url))
+    origins.discard(None)
+
+    # Leave the page first so no script can write state back afterwards
+    driver.get("about:blank")
+
+    # Close any windows the page opened
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+
+    driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    for origin in sorted(origins):
+        # "all" covers local/session storage, IndexedDB, cache storage
+        # and service worker registrations
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+
+    # Drop performance log entries produced by the reset itself
+    driver.get_log("performance")
+
+
+class SharedService(Service):
+    """
+    chromedriver Service that outlives the sessions attached to it.
+
+    WebDriver starts its service when a session is created and stops it on
+    quit(). Here start() only launches chromedriver if it is not already
+    running and stop() does nothing; shutdown() stops it for real.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._start_lock = threading.Lock()
+        # Milliseconds spent launching chromedriver, one entry per launch
+        self.startup_times = []
+
+    def is_running(self):
+        process = getattr(self, "process", None)
+        return process is not None and process.poll() is None
+
+    def start(self):
+        with self._start_lock:
+            if self.is_running():
+                return
+            start_time = time.perf_counter()
+            super().start()
+            self.startup_times.append((time.perf_counter() - start_time) * 1000)
+
+    def stop(self):
+        pass
+
+    def shutdown(self):
+        """Stop chromedriver."""
+        with self._start_lock:
+            if self.is_running():
+                super().stop()
+
+    def __del__(self):
+        try:
+            self.shutdown()
+        except Exception:
+            pass
+
+
+class ServicePool:
+    """Small round-robin pool of long-lived chromedriver services."""
+
+    def __init__(self, size=1, factory=SharedService):
+        """
+        Initialize the pool.
+
+        Args:
+            size (int): Number of chromedriver processes
+            factory (callable): Returns a new SharedService
+        """
+        self.size = max(1, int(size))
+        self.factory = factory
+        self.sessions = 0
+        # Session startup in milliseconds: "cold" sessions launched their
+        # chromedriver, "warm" ones attached to a running one
+        self.session_startup_times = {"cold": [], "warm": []}
+        self._services = []
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the service the next session should attach to."""
+        with self._lock:
+            self.sessions += 1
+            if len(self._services) < self.size:
+                self._services.append(self.factory())
+                return self._services[-1]
+            return self._services[next(self._next) % self.size]
+
+    def start_session(self, create):
+        """
+        Start a session attached to the next service and time its startup.
+
+        Args:
+            create (callable): Takes the service and returns a new WebDriver
+
+        Returns:
+            WebDriver returned by create
+        """
+        service = self.get()
+        launches = len(service.startup_times)
+        start_time = time.perf_counter()
+        driver = create(service)
+        elapsed = (time.perf_counter() - start_time) * 1000
+        kind = "cold" if len(service.startup_times) > launches else "warm"
+        with self._lock:
+            self.session_startup_times[kind].append(elapsed)
+        return driver
+
+    def stats(self):
+        """
+        Return how much driver startup the pool saved.
+
+        A cold session launches its chromedriver, as every session would
+        without the pool; a warm one attaches to a running chromedriver. The
+        saving is the measured difference of their mean startup times,
+        counted for every warm session.
+
+        Returns:
+            dict: services, sessions, launches, mean service_startup_time,
+                mean cold_session_time and warm_session_time, and the total
+                and per warm session saved_time in milliseconds (None until
+                both kinds of session were measured)
+        """
+        with self._lock:
+            startup_times = [t for service in self._services for t in service.startup_times]
+            cold = list(self.session_startup_times["cold"])
+            warm = list(self.session_startup_times["warm"])
+            sessions = self.sessions
+        mean = sum(startup_times) / len(startup_times) if startup_times else None
+        cold_mean = sum(cold) / len(cold) if cold else None
+        warm_mean = sum(warm) / len(warm) if warm else None
+        saved_per_session = cold_mean - warm_mean if cold and warm else None
+        return {
+            "services": len(self._services),
+            "sessions": sessions,
+            "launches": len(startup_times),
+            "service_startup_time": mean,
+            "cold_session_time": cold_mean,
+            "warm_session_time": warm_mean,
+            "saved_time": saved_per_session * len(warm) if saved_per_session is not None else None,
+            "saved_time_per_session": saved_per_session,
+        }
+
+    def close(self):
+        """Stop every chromedriver process."""
+        with self._lock:
+            services, self._services = self._services, []
+        for service in services:
+            service.shutdown()
+
+
+class DriverPool:
+    """Thread-safe pool of WebDriver sessions."""
+
+    def __init__(self, factory, policy="fresh", max_uses=50):
+        """
+        Initialize the pool.
+
+        Args:
+            factory (callable): Returns a new WebDriver instance
+            policy (str): "fresh" or "reused" profile policy
+            max_uses (int, optional): Quit a reused session after this many
+                samples to bound browser memory growth
+        """
+        if policy not in PROFILE_POLICIES:
+            raise ValueError(f"Unknown profile policy: {policy}")
+
+        self.factory = factory
+        self.policy = policy
+        self.max_uses = max_uses
+        self._idle = []
+        self._uses = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self):
+        """Return a ready-to-use driver, starting one if none is idle."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        driver = self.factory()
+        with self._lock:
+            self._uses[id(driver)] = 0
+        return driver
+
+    def release(self, driver, visited_urls=(), discard=False):
+        """
+        Return a driver to the pool.
+
+        Args:
+            driver: Driver previously returned by acquire()
+            visited_urls (iterable): URLs loaded with the driver
+            discard (bool): Quit the driver instead of reusing it, e.g.
+                after a WebDriver error left it in an unknown state
+        """
+        with self._lock:
+            uses = self._uses.get(id(driver), 0) + 1
+            self._uses[id(driver)] = uses
+
+        keep = (
+            self.policy == "reused"
+            and not discard
+            and not self._closed
+            and (not self.max_uses or uses < self.max_uses)
+        )
+        if keep:
+            try:
+                reset_driver(driver, visited_urls)
+            except Exception:
+                keep = False
+
+        if keep:
+            with self._lock:
+                if not self._closed:
+                    self._idle.append(driver)
+                    return
+        self._quit(driver)
+
+    def _quit(self, driver):
+        with self._lock:
+            self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        """Quit every idle driver and stop accepting returned ones."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            self._quit(driver)
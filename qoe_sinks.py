@@ -0,0 +1,149 @@
+"""
+Result Sinks
+------------
+Incremental, crash-tolerant output for per-iteration QoE samples.
+
+JSONLSink appends one JSON object per line. Lines are buffered in memory and
+written out whenever the buffer fills up or a flush interval passes, so the
+file can be tailed while a run is in progress. The file is fsync'ed
+periodically and on close, so a crash loses at most the last few seconds of
+samples. Reopening a file after a crash first cuts off its partial last
+record, so appended records never land in the middle of one.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class JSONLSink:
+    """Thread-safe buffered JSON Lines writer with periodic fsync."""
+
+    def __init__(self, path, buffer_size=64, flush_interval=1.0, fsync_interval=5.0):
+        """
+        Open (or append to) a JSON Lines file.
+
+        Args:
+            path (str): File to append records to
+            buffer_size (int): Records kept in memory before writing
+            flush_interval (float): Seconds after which buffered records are
+                written even if the buffer is not full
+            fsync_interval (float): Seconds between fsync calls
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.path = path
+        self.buffer_size = max(1, int(buffer_size))
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        _drop_partial_line(path)
+        self._file = open(path, "a", encoding="utf-8")
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._last_flush = self._last_fsync = time.monotonic()
+        self.records_written = 0
+
+    def write(self, record):
+        """
+        Append a record.
+
+        Args:
+            record (dict): JSON-serializable record
+        """
+        line = json.dumps(record, separators=(",", ":"), default=str)
+        with self._lock:
+            if self._file is None:
+                raise ValueError("write to closed JSONLSink")
+            self._buffer.append(line)
+            now = time.monotonic()
+            if len(self._buffer) >= self.buffer_size or now - self._last_flush >= self.flush_interval:
+                self._flush(now)
+
+    def _flush(self, now, force_fsync=False):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self.records_written += len(self._buffer)
+            self._buffer = []
+        self._file.flush()
+        self._last_flush = now
+        if force_fsync or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def flush(self, fsync=True):
+        """Write buffered records, and fsync them unless fsync is False."""
+        with self._lock:
+            if self._file is not None:
+                self._flush(time.monotonic(), force_fsync=fsync)
+
+    def close(self):
+        """Flush, fsync and close the file."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._flush(time.monotonic(), force_fsync=True)
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _drop_partial_line(path):
+    """Cut a record left incomplete by a crash off the end of a file before appending."""
+    try:
+        f = open(path, "rb+")
+    except FileNotFoundError:
+        return
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        # Scan back to the last newline
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            chunk = f.read(end - start)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end != size:
+            f.truncate(end)
+
+
+def read_jsonl(path):
+    """
+    Iterate over the records of a JSON Lines file.
+
+    A truncated final line (e.g. from a crash mid-write) is skipped; a
+    malformed line anywhere else is corruption and raises.
+
+    Args:
+        path (str): JSON Lines file
+
+    Yields:
+        dict: One record per line
+
+    Raises:
+        ValueError: If a line other than the last one is not valid JSON
+    """
+    with open(path, encoding="utf-8") as f:
+        pending = None
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if pending is not None:
+                raise ValueError(f"{path}:{pending[0]}: malformed JSON Lines record: {pending[1]}")
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                # Only acceptable if nothing follows it
+                pending = (number, e)
@@ -0,0 +1,503 @@
+"""
+Streaming QoE Statistics
+------------------------
+Mergeable distribution summaries for QoE metrics.
+
+QuantileSketch stores values in logarithmically sized buckets (the scheme
+used by HDR histograms and DDSketch), so any quantile is reported within a
+fixed relative error while memory only grows with the dynamic range of the
+data, not with the number of samples. Count, mean and standard deviation
+are tracked exactly with running moments. Two sketches with the same
+accuracy merge losslessly, which lets per-worker, per-URL and per-run
+summaries be combined without keeping raw samples around.
+"""
+
+import functools
+import math
+from statistics import NormalDist
+
+# Quantiles reported for every metric
+DEFAULT_QUANTILES = (50, 90, 95, 99)
+
+# Values closer to zero than this land in a dedicated zero bucket
+_MIN_INDEXABLE = 1e-9
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch with exact count, min, max, mean and stddev."""
+
+    def __init__(self, relative_accuracy=0.01):
+        """
+        Initialize an empty sketch.
+
+        Args:
+            relative_accuracy (float): Maximum relative error of reported
+                quantiles, e.g. 0.01 for 1%
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._positive = {}
+        self._negative = {}
+        self._zero = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def _index(self, value):
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def _value(self, index):
+        # Midpoint of bucket (gamma^(i-1), gamma^i] in relative terms
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value, count=1):
+        """
+        Add a value to the sketch.
+
+        Args:
+            value (float): Observed value
+            count (int): Number of times the value was observed
+        """
+        value = float(value)
+        if math.isnan(value) or count <= 0:
+            return
+        if value > _MIN_INDEXABLE:
+            index = self._index(value)
+            self._positive[index] = self._positive.get(index, 0) + count
+        elif value < -_MIN_INDEXABLE:
+            index = self._index(-value)
+            self._negative[index] = self._negative.get(index, 0) + count
+        else:
+            self._zero += count
+
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+        # Welford's update, generalised to repeated values
+        total = self.count + count
+        delta = value - self.mean
+        self.mean += delta * count / total
+        self._m2 += delta * (value - self.mean) * count
+        self.count = total
+
+    def extend(self, values):
+        """Add every value of an iterable."""
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one.
+
+        Args:
+            other (QuantileSketch): Sketch built with the same accuracy
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        if not other.count:
+            return self
+        for index, count in other._positive.items():
+            self._positive[index] = self._positive.get(index, 0) + count
+        for index, count in other._negative.items():
+            self._negative[index] = self._negative.get(index, 0) + count
+        self._zero += other._zero
+
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+        # Chan et al. parallel combination of running moments
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        return self
+
+    @property
+    def variance(self):
+        """Sample variance, or None with fewer than two values."""
+        if self.count < 2:
+            return None
+        return self._m2 / (self.count - 1)
+
+    @property
+    def stddev(self):
+        """Sample standard deviation, or None with fewer than two values."""
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+    def quantile(self, q):
+        """
+        Estimate a quantile.
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            float: Estimated value, or None if the sketch is empty
+        """
+        if not self.count:
+            return None
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        # Nearest-rank definition: the smallest value with at least q of
+        # the samples at or below it
+        rank = max(0, math.ceil(q * self.count) - 1)
+
+        seen = 0
+        value = None
+        for index in sorted(self._negative, reverse=True):
+            seen += self._negative[index]
+            if seen > rank:
+                value = -self._value(index)
+                break
+        if value is None:
+            seen += self._zero
+            if seen > rank:
+                value = 0.0
+        if value is None:
+            for index in sorted(self._positive):
+                seen += self._positive[index]
+                if seen > rank:
+                    value = self._value(index)
+                    break
+        if value is None:
+            value = self.max
+        # Bucket midpoints can fall outside the observed range
+        return min(max(value, self.min), self.max)
+
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        """
+        Summarize the distribution.
+
+        Args:
+            quantiles (tuple): Percentiles to report (0-100)
+
+        Returns:
+            dict: count, min, max, mean, stddev and "p<N>" entries
+        """
+        result = {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean if self.count else None,
+            "stddev": self.stddev,
+        }
+        for percentile in quantiles:
+            result[f"p{percentile:g}"] = self.quantile(percentile / 100)
+        return result
+
+    def to_dict(self):
+        """Serialize the sketch to JSON-compatible data."""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "positive": {str(index): count for index, count in self._positive.items()},
+            "negative": {str(index): count for index, count in self._negative.items()},
+            "zero": self._zero,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean,
+            "m2": self._m2,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a sketch serialized with to_dict()."""
+        sketch = cls(data["relative_accuracy"])
+        sketch._positive = {int(index): count for index, count in data["positive"].items()}
+        sketch._negative = {int(index): count for index, count in data["negative"].items()}
+        sketch._zero = data["zero"]
+        sketch.count = data["count"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch.mean = data["mean"]
+        sketch._m2 = data["m2"]
+        return sketch
+
+
+def t_two_sided_cdf(t, df):
+    """
+    P(|T| <= t) for Student's t distribution with integer degrees of freedom.
+
+    Exact closed-form series (Abramowitz & Stegun 26.7.3/26.7.4).
+
+    Args:
+        t (float): Non-negative t statistic
+        df (int): Degrees of freedom
+
+    Returns:
+        float: Two-sided cumulative probability
+    """
+    theta = math.atan(abs(t) / math.sqrt(df))
+    c, s = math.cos(theta), math.sin(theta)
+    if df % 2:
+        total = 0.0
+        if df > 1:
+            term = total = c
+            for k in range(3, df - 1, 2):
+                term *= c * c * (k - 1) / k
+                total += term
+        return 2 / math.pi * (theta + s * total)
+    term = total = 1.0
+    for k in range(2, df - 1, 2):
+        term *= c * c * (k - 1) / k
+        total += term
+    return s * total
+
+
+def t_critical(df, confidence=0.95):
+    """
+    Two-sided Student's t critical value.
+
+    Args:
+        df (int): Degrees of freedom
+        confidence (float): Confidence level, e.g. 0.95
+
+    Returns:
+        float: Critical value t such that P(|T| <= t) = confidence
+    """
+    if df < 1:
+        raise ValueError("df must be at least 1")
+    if df > 1000:
+        return NormalDist().inv_cdf(0.5 + confidence / 2)
+    low, high = 0.0, 1.0
+    while t_two_sided_cdf(high, df) < confidence:
+        high *= 2
+    for _ in range(100):
+        middle = (low + high) / 2
+        if t_two_sided_cdf(middle, df) < confidence:
+            low = middle
+        else:
+            high = middle
+        if high - low < 1e-9:
+            break
+    return (low + high) / 2
+
+
+def relative_ci_halfwidth(sketch, confidence=0.95):
+    """
+    Half-width of the confidence interval on the mean, relative to the mean.
+
+    Args:
+        sketch (QuantileSketch): Distribution of a metric
+        confidence (float): Confidence level
+
+    Returns:
+        float: Relative half-width (0.05 means mean +/- 5%), or None with
+            fewer than two values or a zero mean
+    """
+    if sketch.count < 2 or not sketch.mean:
+        return None
+    halfwidth = t_critical(sketch.count - 1, confidence) * sketch.stddev / math.sqrt(sketch.count)
+    return halfwidth / abs(sketch.mean)
+
+
+def _mean_stddev(values):
+    n = len(values)
+    mean = sum(values) / n
+    variance = sum((value - mean) ** 2 for value in values) / (n - 1) if n > 1 else 0.0
+    return mean, math.sqrt(variance)
+
+
+def paired_t_test(differences, confidence=0.95):
+    """
+    Paired Student's t-test on per-pair differences (H0: mean difference 0).
+
+    Args:
+        differences (list): Differences within each pair
+        confidence (float): Confidence level of the interval
+
+    Returns:
+        dict: n, mean, t, two-sided p_value and ci_low/ci_high for the mean
+            difference, or None with fewer than two pairs
+    """
+    n = len(differences)
+    if n < 2:
+        return None
+    mean, stddev = _mean_stddev(differences)
+    halfwidth = t_critical(n - 1, confidence) * stddev / math.sqrt(n)
+    if stddev == 0:
+        t, p_value = (math.inf, 0.0) if mean else (0.0, 1.0)
+    else:
+        t = mean / (stddev / math.sqrt(n))
+        p_value = max(0.0, 1.0 - t_two_sided_cdf(t, n - 1))
+    return {"n": n, "mean": mean, "t": t, "p_value": p_value,
+            "ci_low": mean - halfwidth, "ci_high": mean + halfwidth}
+
+
+def _ranks(values):
+    """Return 1-based ranks of values, averaging ties."""
+    order = sorted(range(len(values)), key=values.__getitem__)
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+
+def wilcoxon_signed_rank(differences):
+    """
+    Wilcoxon signed-rank test on per-pair differences (H0: median 0).
+
+    Zero differences are dropped. Without ties and with at most 25 pairs
+    the exact null distribution is used; otherwise the normal
+    approximation with tie and continuity correction.
+
+    Args:
+        differences (list): Differences within each pair
+
+    Returns:
+        dict: n (non-zero pairs), statistic (W+) and two-sided p_value, or
+            None without any non-zero difference
+    """
+    nonzero = [d for d in differences if d]
+    n = len(nonzero)
+    if not n:
+        return None
+    ranks = _ranks([abs(d) for d in nonzero])
+    w_plus = sum(rank for rank, d in zip(ranks, nonzero) if d > 0)
+    expected = n * (n + 1) / 4
+    ties = len(set(ranks)) < n
+
+    if n <= 25 and not ties:
+        # counts[s] = number of sign assignments with W+ == s
+        total = n * (n + 1) // 2
+        counts = [1] + [0] * total
+        for rank in range(1, n + 1):
+            for s in range(total, rank - 1, -1):
+                counts[s] += counts[s - rank]
+        extreme = min(w_plus, total - w_plus)
+        p_value = min(1.0, 2 * sum(counts[:int(extreme) + 1]) / 2 ** n)
+    else:
+        tie_sizes = {}
+        for rank in ranks:
+            tie_sizes[rank] = tie_sizes.get(rank, 0) + 1
+        variance = n * (n + 1) * (2 * n + 1) / 24 - sum(t ** 3 - t for t in tie_sizes.values()) / 48
+        if variance <= 0:
+            p_value = 1.0
+        else:
+            z = max(0.0, abs(w_plus - expected) - 0.5) / math.sqrt(variance)
+            p_value = 2 * (1 - NormalDist().cdf(z))
+    return {"n": n, "statistic": w_plus, "p_value": p_value}
+
+
+# Largest sample size per side for which Mann-Whitney p-values are exact
+MANN_WHITNEY_EXACT_MAX = 20
+
+
+@functools.lru_cache(maxsize=None)
+def mann_whitney_null_cdf(m, n):
+    """
+    Return the exact null CDF of the Mann-Whitney U statistic without ties.
+
+    Args:
+        m (int): Size of the first sample
+        n (int): Size of the second sample
+
+    Returns:
+        tuple: P(U <= u) for u = 0 .. m * n
+    """
+    # Coefficients of the Gaussian binomial [m + n choose m], built one
+    # factor (1 - q^(n+i)) / (1 - q^i) at a time
+    size = m * n + 1
+    counts = [1] + [0] * (size - 1)
+    for i in range(1, m + 1):
+        for u in range(size - 1, n + i - 1, -1):
+            counts[u] -= counts[u - n - i]
+        for u in range(i, size):
+            counts[u] += counts[u - i]
+    total = sum(counts)
+    cdf, running = [], 0
+    for count in counts:
+        running += count
+        cdf.append(running / total)
+    return tuple(cdf)
+
+
+def mann_whitney_p_value(u, m, n, tie_sum=0.0):
+    """
+    Two-sided p-value of a Mann-Whitney U statistic.
+
+    Without ties and with at most MANN_WHITNEY_EXACT_MAX values per sample
+    the exact null distribution is used; otherwise the normal
+    approximation with tie and continuity correction.
+
+    Args:
+        u (float): U statistic
+        m (int): Size of the first sample
+        n (int): Size of the second sample
+        tie_sum (float): Sum of t^3 - t over groups of t tied values in
+            the pooled sample
+
+    Returns:
+        float
+    """
+    if not tie_sum and m <= MANN_WHITNEY_EXACT_MAX and n <= MANN_WHITNEY_EXACT_MAX:
+        extreme = int(min(u, m * n - u))
+        return min(1.0, 2 * mann_whitney_null_cdf(m, n)[extreme])
+    total = m + n
+    variance = m * n / 12 * ((total + 1) - tie_sum / (total * (total - 1)))
+    if variance <= 0:
+        return 1.0
+    z = max(0.0, abs(u - m * n / 2) - 0.5) / math.sqrt(variance)
+    return min(1.0, math.erfc(z / math.sqrt(2)))
+
+
+def mann_whitney_u(x, y):
+    """
+    Mann-Whitney U test between two independent samples (H0: neither
+    sample tends to have larger values).
+
+    Args:
+        x (list): First sample, e.g. the baseline run's values
+        y (list): Second sample, e.g. the candidate run's values
+
+    Returns:
+        dict: statistic (U of y: pairs where y is larger, ties counting
+            half), two-sided p_value and Cliff's delta (from -1, y always
+            smaller, to 1, y always larger), or None if a sample is empty
+    """
+    m, n = len(x), len(y)
+    if not m or not n:
+        return None
+    ranks = _ranks(list(x) + list(y))
+    u = sum(ranks[m:]) - n * (n + 1) / 2
+    tie_sizes = {}
+    for rank in ranks:
+        tie_sizes[rank] = tie_sizes.get(rank, 0) + 1
+    tie_sum = sum(t ** 3 - t for t in tie_sizes.values())
+    return {"statistic": u, "p_value": mann_whitney_p_value(u, m, n, tie_sum),
+            "cliffs_delta": 2 * u / (m * n) - 1}
+
+
+def benjamini_hochberg(p_values):
+    """
+    Benjamini-Hochberg adjusted p-values (q-values), which control the
+    false discovery rate across many tests.
+
+    Args:
+        p_values (list): p-value of every test
+
+    Returns:
+        list: q-value of every test, in the same order
+    """
+    count = len(p_values)
+    order = sorted(range(count), key=p_values.__getitem__, reverse=True)
+    q_values = [0.0] * count
+    smallest = 1.0
+    for position, index in enumerate(order):
+        smallest = min(smallest, p_values[index] * count / (count - position))
+        q_values[index] = smallest
+    return q_values
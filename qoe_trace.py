@@ -0,0 +1,231 @@
+"""
+Harness Self-Profiling
+----------------------
+Instrumentation spans around the phases of a QoE run (browser startup,
+driver.get, performance log retrieval and parsing, in-page scripts, report
+generation, ...), so slow runs can be broken down with data.
+
+Spans are exported in the Chrome trace-event format (load the file in
+chrome://tracing or https://ui.perfetto.dev) with one track per worker
+thread, and summarized as a table of total, mean and maximum time per span
+name. Optionally the whole run is also captured with cProfile.
+
+Worker processes record spans in their own tracer and hand them over with
+export(); the parent adds them with merge() under the worker's pid. Both
+sides time spans with time.perf_counter(), a system-wide monotonic clock,
+so the worker spans line up with the parent's.
+
+A disabled tracer hands out a shared no-op context manager, so the spans
+cost next to nothing unless tracing is switched on.
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+
+# Shared no-op span of a disabled tracer
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    """Collects timed spans and exports them as Chrome trace events."""
+
+    def __init__(self, enabled=True, profile=False):
+        """
+        Initialize the tracer.
+
+        Args:
+            enabled (bool): Record spans; a disabled tracer records nothing
+            profile (bool): Also run cProfile between start_profile() and
+                stop_profile()
+        """
+        self.enabled = enabled
+        self.events = []
+        self._thread_names = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._profiler = cProfile.Profile() if profile else None
+        self._profiling = False
+
+    def span(self, name, **args):
+        """
+        Time a block of code.
+
+        Args:
+            name (str): Span name, e.g. "driver.get"
+            **args: Extra details shown with the span (URL, iteration, ...)
+
+        Returns:
+            context manager
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name, args)
+
+    @contextlib.contextmanager
+    def _span(self, name, args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.add(name, start, end, args)
+
+    def add(self, name, start, end, args=None):
+        """
+        Record a span measured elsewhere.
+
+        Args:
+            name (str): Span name
+            start (float): time.perf_counter() at the start
+            end (float): time.perf_counter() at the end
+            args (dict, optional): Extra details
+        """
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": (start - self._origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": self._pid,
+            "tid": thread.ident,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._thread_names.setdefault((self._pid, thread.ident), thread.name)
+            self.events.append(event)
+
+    def export(self):
+        """
+        Hand over the spans recorded so far, e.g. from a worker process.
+
+        Returns:
+            dict: Picklable batch for merge(); the spans are removed from
+                this tracer
+        """
+        with self._lock:
+            events, self.events = self.events, []
+            threads = [[pid, tid, name] for (pid, tid), name in self._thread_names.items()]
+        return {"origin": self._origin, "events": events, "threads": threads}
+
+    def merge(self, batch):
+        """
+        Add spans exported by another tracer, e.g. a worker process's.
+
+        Args:
+            batch (dict): Returned by the other tracer's export()
+        """
+        if not self.enabled:
+            return
+        shift = (batch["origin"] - self._origin) * 1e6
+        with self._lock:
+            for pid, tid, name in batch["threads"]:
+                self._thread_names.setdefault((pid, tid), name)
+            for event in batch["events"]:
+                self.events.append(dict(event, ts=event["ts"] + shift))
+
+    def trace_events(self):
+        """
+        Return the recorded spans in Chrome trace-event format.
+
+        Returns:
+            dict: {"traceEvents": [...], "displayTimeUnit": "ms"}
+        """
+        with self._lock:
+            metadata = [
+                {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                for (pid, tid), name in self._thread_names.items()
+            ]
+            events = list(self.events)
+        for pid in sorted({pid for pid, _ in self._thread_names} | {self._pid}):
+            name = "qoe-testing" if pid == self._pid else f"qoe-worker {pid}"
+            metadata.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}})
+        return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+    def write(self, path):
+        """
+        Write the recorded spans as a Chrome trace-event JSON file.
+
+        Args:
+            path (str): Output file
+
+        Returns:
+            str: The path written
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.trace_events(), f, separators=(",", ":"))
+        return path
+
+    def summary(self):
+        """
+        Aggregate the spans by name.
+
+        Returns:
+            list: Dicts with name, count, total, mean and max (ms), sorted
+                by total time
+        """
+        totals = {}
+        with self._lock:
+            for event in self.events:
+                entry = totals.setdefault(event["name"], [0, 0.0, 0.0])
+                duration = event["dur"] / 1000
+                entry[0] += 1
+                entry[1] += duration
+                entry[2] = max(entry[2], duration)
+        rows = [
+            {"name": name, "count": count, "total": total, "mean": total / count, "max": longest}
+            for name, (count, total, longest) in totals.items()
+        ]
+        return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+    def print_summary(self):
+        """Print the span summary as a table."""
+        rows = self.summary()
+        if not rows:
+            return
+        width = max(24, max(len(row["name"]) for row in rows) + 2)
+        print(f"{'Span':<{width}}{'Count':>8}{'Total (ms)':>14}{'Mean (ms)':>12}{'Max (ms)':>12}")
+        for row in rows:
+            print(f"{row['name']:<{width}}{row['count']:>8}{row['total']:>14.1f}"
+                  f"{row['mean']:>12.1f}{row['max']:>12.1f}")
+
+    def start_profile(self):
+        """Start cProfile (if enabled) on the calling thread."""
+        if self._profiler is not None and not self._profiling:
+            self._profiler.enable()
+            self._profiling = True
+
+    def stop_profile(self, path=None, limit=20):
+        """
+        Stop cProfile and report the hottest functions.
+
+        Args:
+            path (str, optional): Write the raw pstats data here (readable
+                with pstats or snakeviz)
+            limit (int): Functions printed, by cumulative time
+
+        Returns:
+            str: The printed statistics, or None if nothing was profiled
+        """
+        if self._profiler is None or not self._profiling:
+            return None
+        self._profiler.disable()
+        self._profiling = False
+        if path:
+            self._profiler.dump_stats(path)
+        output = io.StringIO()
+        pstats.Stats(self._profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+        print(output.getvalue())
+        return output.getvalue()
@@ -0,0 +1,162 @@
+"""
+Core Web Vitals
+---------------
+In-page collection of Largest Contentful Paint, Cumulative Layout Shift,
+long tasks, Total Blocking Time and Time to Interactive.
+
+VITALS_SCRIPT is registered with the DevTools command
+Page.addScriptToEvaluateOnNewDocument, so it runs before any of the page's
+own scripts. Its PerformanceObservers use `buffered: true` and record every
+entry from the start of the load. Nothing is polled or awaited: the page
+metrics script reads window.__qoeVitals.snapshot() in the same round trip
+that collects the other in-page metrics.
+
+Definitions follow Lighthouse:
+- LCP: start time of the last largest-contentful-paint entry
+- CLS: largest session window of layout shifts without recent input (shifts
+  less than 1 s apart, windows of at most 5 s)
+- TTI: start of the first 5 s window after First Contentful Paint with no
+  long task and at most two network requests in flight (never earlier than
+  DOMContentLoaded)
+- TBT: time beyond 50 ms of every long task between FCP and TTI
+
+The snapshot is taken right after the load event, so a quiet window may
+still be open. In that case "tti_settled" is false and the TTI is a lower
+bound (the end of the last busy period seen so far). Requests that are
+still in flight have no resource timing entry yet and are not counted.
+"""
+
+# Sample metrics taken from the snapshot, besides time_to_interactive
+VITALS_METRICS = (
+    "largest_contentful_paint", "cumulative_layout_shift",
+    "total_blocking_time", "long_task_count"
+)
+
+# Runs at document start in every frame; the snapshot is taken by the page
+# metrics script
+VITALS_SCRIPT = """
+(() => {
+if (window !== window.top || window.__qoeVitals) {
+    return;
+}
+const QUIET_WINDOW = 5000;
+const BLOCKING_THRESHOLD = 50;
+const MAX_BUSY_REQUESTS = 2;
+
+const state = {lcp: null, longTasks: [], shifts: []};
+
+const observe = (type, callback) => {
+    try {
+        new PerformanceObserver(list => list.getEntries().forEach(callback))
+            .observe({type: type, buffered: true});
+    } catch (e) {
+        // Entry type not supported by this browser
+    }
+};
+observe('largest-contentful-paint', entry => {
+    state.lcp = entry.renderTime || entry.loadTime || entry.startTime;
+});
+observe('layout-shift', entry => {
+    if (!entry.hadRecentInput) {
+        state.shifts.push([entry.startTime, entry.value]);
+    }
+});
+observe('longtask', entry => {
+    state.longTasks.push([entry.startTime, entry.startTime + entry.duration]);
+});
+
+const cumulativeLayoutShift = () => {
+    let worst = 0, current = 0, first = null, last = null;
+    for (const [time, value] of state.shifts) {
+        if (first === null || time - last >= 1000 || time - first >= 5000) {
+            first = time;
+            current = 0;
+        }
+        current += value;
+        last = time;
+        worst = Math.max(worst, current);
+    }
+    return worst;
+};
+
+// Returns [start, end] of the first moment after `from` when more than
+// MAX_BUSY_REQUESTS requests are in flight, or null
+const busyNetwork = (requests, from, until) => {
+    const edges = [];
+    for (const [start, end] of requests) {
+        if (end > from && start < until) {
+            edges.push([Math.max(start, from), 1], [end, -1]);
+        }
+    }
+    edges.sort((a, b) => a[0] - b[0] || a[1] - b[1]);
+    let inFlight = 0, busySince = null;
+    for (const [time, change] of edges) {
+        inFlight += change;
+        if (busySince === null && inFlight > MAX_BUSY_REQUESTS) {
+            busySince = time;
+        } else if (busySince !== null && inFlight <= MAX_BUSY_REQUESTS) {
+            return [busySince, time];
+        }
+    }
+    return busySince === null ? null : [busySince, Infinity];
+};
+
+const snapshot = () => {
+    const perf = window.performance;
+    const now = perf.now();
+    const fcpEntry = perf.getEntriesByName('first-contentful-paint')[0];
+    const navigation = perf.getEntriesByType('navigation')[0];
+    const tasks = state.longTasks.slice().sort((a, b) => a[0] - b[0]);
+    const result = {
+        lcp: state.lcp,
+        cls: cumulativeLayoutShift(),
+        long_tasks: tasks.length,
+        tbt: null,
+        tti: null,
+        tti_settled: false
+    };
+    if (!fcpEntry) {
+        return result;
+    }
+    const fcp = fcpEntry.startTime;
+    const requests = perf.getEntriesByType('resource')
+        .map(entry => [entry.startTime, entry.responseEnd || entry.startTime]);
+    if (navigation) {
+        requests.push([navigation.startTime, navigation.responseEnd]);
+    }
+
+    // Push the candidate past every long task and busy network period
+    // that starts before its quiet window ends
+    let candidate = Math.max(fcp, navigation ? navigation.domContentLoadedEventEnd : 0);
+    for (;;) {
+        const windowEnd = candidate + QUIET_WINDOW;
+        const task = tasks.find(([start, end]) => end > candidate && start < windowEnd);
+        if (task) {
+            candidate = task[1];
+            continue;
+        }
+        const busy = busyNetwork(requests, candidate, windowEnd);
+        if (busy && busy[1] !== Infinity) {
+            candidate = busy[1];
+            continue;
+        }
+        result.tti_settled = !busy && windowEnd <= now;
+        break;
+    }
+    result.tti = candidate;
+
+    let blocking = 0;
+    for (const [start, end] of tasks) {
+        const clippedStart = Math.max(start, fcp);
+        const clippedEnd = Math.min(end, candidate);
+        if (clippedEnd - clippedStart > BLOCKING_THRESHOLD) {
+            blocking += clippedEnd - clippedStart - BLOCKING_THRESHOLD;
+        }
+    }
+    result.tbt = blocking;
+    return result;
+};
+
+window.__qoeVitals = {snapshot: snapshot};
+})();
+"""
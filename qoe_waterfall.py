@@ -0,0 +1,286 @@
+"""
+Resource Waterfall Capture
+--------------------------
+Records every request of a page load (URL, type, size, priority and timing
+phases) from the DevTools Network events the harness already parses.
+
+Requests are stored column by column in array-module arrays (4-byte floats
+for timings, small integers for enums and sizes) with repeated strings such
+as MIME types interned, instead of one dict per request. A page keeps at
+most `max_requests` rows; requests beyond that are only counted. A
+200-request page therefore costs a few kilobytes plus its URLs, and
+thousands of loads can be captured in one run.
+
+A capture can be exported as a HAR-like dict (HAR 1.2 layout, without
+headers, cookies or bodies) or, if NumPy is installed, as NumPy arrays
+sharing the same memory.
+"""
+
+import datetime
+import json
+import os
+from array import array
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+# HAR timing phases, in milliseconds (-1 when a phase did not happen)
+PHASES = ("blocked", "dns", "connect", "ssl", "send", "wait", "receive")
+
+# Columns and their array typecodes
+_COLUMNS = {
+    "url": "I",          # index into the string table
+    "method": "I",       # index into the string table
+    "resource_type": "I",
+    "priority": "I",
+    "mime_type": "I",
+    "status": "H",
+    "failed": "B",
+    "transfer_bytes": "I",
+    "start": "f",        # ms since the page's first request
+    "time": "f",         # ms from request start to the last byte
+}
+_COLUMNS.update((phase, "f") for phase in PHASES)
+
+
+def _phase(timing, start_key, end_key):
+    start = timing.get(start_key, -1)
+    end = timing.get(end_key, -1)
+    if start is None or end is None or start < 0 or end < 0:
+        return -1.0
+    return end - start
+
+
+class Waterfall:
+    """Columnar, bounded capture of one page load's requests."""
+
+    def __init__(self, max_requests=500):
+        """
+        Initialize an empty capture.
+
+        Args:
+            max_requests (int): Maximum number of requests kept; later
+                requests are counted in `dropped`
+        """
+        self.max_requests = max(1, int(max_requests))
+        self.columns = {name: array(typecode) for name, typecode in _COLUMNS.items()}
+        self.strings = []
+        self.dropped = 0
+        self._string_ids = {}
+        self._in_flight = {}
+        self._first_timestamp = None
+        self._first_wall_time = None
+
+    def __len__(self):
+        return len(self.columns["url"])
+
+    def _intern(self, value):
+        value = value or ""
+        index = self._string_ids.get(value)
+        if index is None:
+            index = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def _add_row(self, request_id, params):
+        if len(self) >= self.max_requests:
+            self.dropped += 1
+            return
+        timestamp = params.get("timestamp") or 0.0
+        if self._first_timestamp is None:
+            self._first_timestamp = timestamp
+            self._first_wall_time = params.get("wallTime")
+        request = params.get("request", {})
+        columns = self.columns
+        columns["url"].append(self._intern(request.get("url")))
+        columns["method"].append(self._intern(request.get("method")))
+        columns["resource_type"].append(self._intern(params.get("type")))
+        columns["priority"].append(self._intern(request.get("initialPriority")))
+        columns["mime_type"].append(self._intern(None))
+        columns["status"].append(0)
+        columns["failed"].append(0)
+        columns["transfer_bytes"].append(0)
+        columns["start"].append((timestamp - self._first_timestamp) * 1000)
+        columns["time"].append(-1.0)
+        for phase in PHASES:
+            columns[phase].append(-1.0)
+        # Row, start timestamp, requestTime and receiveHeadersEnd of a
+        # request still in flight
+        self._in_flight[request_id] = [len(self) - 1, timestamp, None, None]
+
+    def _respond(self, state, response):
+        row = state[0]
+        columns = self.columns
+        columns["status"][row] = int(response.get("status") or 0) & 0xFFFF
+        columns["mime_type"][row] = self._intern(response.get("mimeType"))
+        timing = response.get("timing")
+        if not timing or timing.get("requestTime") is None:
+            return
+        first_phase = next(
+            (timing[key] for key in ("dnsStart", "connectStart", "sendStart") if timing.get(key, -1) >= 0), 0.0
+        )
+        columns["blocked"][row] = max(0.0, (timing["requestTime"] - state[1]) * 1000 + first_phase)
+        columns["dns"][row] = _phase(timing, "dnsStart", "dnsEnd")
+        columns["connect"][row] = _phase(timing, "connectStart", "connectEnd")
+        columns["ssl"][row] = _phase(timing, "sslStart", "sslEnd")
+        columns["send"][row] = _phase(timing, "sendStart", "sendEnd")
+        columns["wait"][row] = _phase(timing, "sendEnd", "receiveHeadersEnd")
+        state[2] = timing["requestTime"]
+        state[3] = timing.get("receiveHeadersEnd")
+
+    def _finish(self, state, timestamp):
+        row, start, request_time, headers_end = state
+        self.columns["time"][row] = max(0.0, (timestamp - start) * 1000)
+        if request_time is not None and headers_end is not None:
+            self.columns["receive"][row] = max(0.0, (timestamp - request_time) * 1000 - headers_end)
+
+    def feed(self, events):
+        """
+        Consume (method, params) network events, e.g. from iter_log_events().
+
+        Args:
+            events (iterable): DevTools network events
+        """
+        for method, params in events:
+            self.add(method, params)
+        return self
+
+    def tap(self, events):
+        """Feed events while passing them through to another consumer."""
+        for method, params in events:
+            self.add(method, params)
+            yield method, params
+
+    def add(self, method, params):
+        """
+        Consume one DevTools network event.
+
+        Args:
+            method (str): Event name, e.g. "Network.responseReceived"
+            params (dict): Event parameters
+        """
+        request_id = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            state = self._in_flight.pop(request_id, None)
+            if state is not None and params.get("redirectResponse"):
+                # The redirect hop ends where the next request starts
+                self._respond(state, params["redirectResponse"])
+                self._finish(state, params.get("timestamp") or 0.0)
+            self._add_row(request_id, params)
+            return
+        state = self._in_flight.get(request_id)
+        if state is None:
+            return
+        if method == "Network.responseReceived":
+            self._respond(state, params.get("response", {}))
+            if params.get("type"):
+                self.columns["resource_type"][state[0]] = self._intern(params["type"])
+        elif method in ("Network.loadingFinished", "Network.loadingFailed"):
+            del self._in_flight[request_id]
+            if method == "Network.loadingFinished":
+                self.columns["transfer_bytes"][state[0]] = min(int(params.get("encodedDataLength") or 0), 0xFFFFFFFF)
+            else:
+                self.columns["failed"][state[0]] = 1
+            self._finish(state, params.get("timestamp") or 0.0)
+
+    def string_column(self, name):
+        """Return a string column (url, method, resource_type, ...) as a list."""
+        strings = self.strings
+        return [strings[index] for index in self.columns[name]]
+
+    def to_numpy(self):
+        """
+        Return the numeric columns as NumPy arrays (views, no copy).
+
+        Returns:
+            dict: Column name to numpy.ndarray
+        """
+        if numpy is None:
+            raise RuntimeError("to_numpy requires NumPy (pip install numpy)")
+        return {name: numpy.frombuffer(column, dtype=column.typecode) for name, column in self.columns.items()}
+
+    def to_har(self, page_url=None, title=None):
+        """
+        Export the capture as a HAR-like dict.
+
+        Args:
+            page_url (str, optional): Page the requests belong to
+            title (str, optional): Page title, defaults to the URL
+
+        Returns:
+            dict: {"log": {...}} in HAR 1.2 layout
+        """
+        wall_time = self._first_wall_time or 0.0
+        columns = self.columns
+        strings = self.strings
+        page_id = "page_1"
+        started = datetime.datetime.fromtimestamp(wall_time, datetime.timezone.utc)
+        entries = []
+        for row in range(len(self)):
+            entries.append({
+                "pageref": page_id,
+                "startedDateTime": (started + datetime.timedelta(milliseconds=columns["start"][row])).isoformat(),
+                "time": round(columns["time"][row], 3),
+                "request": {
+                    "method": strings[columns["method"][row]],
+                    "url": strings[columns["url"][row]],
+                    "httpVersion": "",
+                    "headers": [],
+                    "queryString": [],
+                    "cookies": [],
+                    "headersSize": -1,
+                    "bodySize": -1,
+                },
+                "response": {
+                    "status": columns["status"][row],
+                    "statusText": "",
+                    "httpVersion": "",
+                    "headers": [],
+                    "cookies": [],
+                    "content": {"size": -1, "mimeType": strings[columns["mime_type"][row]]},
+                    "redirectURL": "",
+                    "headersSize": -1,
+                    "bodySize": -1,
+                    "_transferSize": columns["transfer_bytes"][row],
+                },
+                "cache": {},
+                "timings": {phase: round(columns[phase][row], 3) for phase in PHASES},
+                "_resourceType": strings[columns["resource_type"][row]],
+                "_priority": strings[columns["priority"][row]],
+                "_failed": bool(columns["failed"][row]),
+            })
+        return {
+            "log": {
+                "version": "1.2",
+                "creator": {"name": "qoe-testing", "version": "1.0"},
+                "pages": [{
+                    "startedDateTime": started.isoformat(),
+                    "id": page_id,
+                    "title": title or page_url or "",
+                    "pageTimings": {},
+                    "_droppedRequests": self.dropped,
+                }],
+                "entries": entries,
+            }
+        }
+
+    def write_har(self, path, page_url=None, title=None):
+        """
+        Write the capture to a HAR-like JSON file.
+
+        Args:
+            path (str): Output file
+            page_url (str, optional): Page the requests belong to
+            title (str, optional): Page title
+
+        Returns:
+            str: The path written
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_har(page_url, title), f, separators=(",", ":"))
+        return path
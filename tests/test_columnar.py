@@ -0,0 +1,96 @@
+import math
+
+import pytest
+
+import qoe_columnar
+from qoe_columnar import ColumnarWriter, ColumnStore, export_jsonl, load_column
+from qoe_sinks import JSONLSink
+
+
+def record(iteration, metrics, url="https://a.test", error=None):
+    return {
+        "run_id": "run-1",
+        "timestamp": "2025-04-24T16:56:07",
+        "url": url,
+        "domain": "a.test",
+        "profile": None,
+        "variant": None,
+        "iteration": iteration,
+        "metrics": metrics,
+        "error": error,
+    }
+
+
+def values(column):
+    return [float(value) for value in column]
+
+
+@pytest.fixture(params=["numpy", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(qoe_columnar, "numpy", None)
+    elif qoe_columnar.numpy is None:
+        pytest.skip("numpy is not installed")
+    return request.param
+
+
+def test_round_trip(tmp_path, backend):
+    path = str(tmp_path / "run.qoecol")
+    with ColumnarWriter(path) as writer:
+        writer.write(record(0, {"page_load_time": 100.0}))
+        writer.write(record(1, {}, url="https://b.test", error="Timeout"))
+    with ColumnStore(path) as store:
+        assert len(store) == 2
+        assert store.metrics == ("page_load_time",)
+        assert store.strings("url") == ["https://a.test", "https://b.test"]
+        assert store.strings("error") == [None, "Timeout"]
+        assert store.strings("profile") == [None, None]
+        assert list(store.column("iteration")) == [0, 1]
+        load_times = values(store.column("page_load_time"))
+        assert load_times[0] == 100.0 and math.isnan(load_times[1])
+
+
+def test_late_columns_are_back_filled(tmp_path, backend):
+    path = str(tmp_path / "run.qoecol")
+    with ColumnarWriter(path, chunk_rows=3) as writer:
+        for iteration in range(7):
+            writer.write(record(iteration, {"page_load_time": float(iteration)}))
+        # First seen after two chunks were written
+        writer.write(record(7, {"page_load_time": 7.0, "cumulative_layout_shift": 0.25}))
+        writer.write(record(8, {"page_load_time": 8.0}))
+    with ColumnStore(path) as store:
+        assert store.metrics == ("page_load_time", "cumulative_layout_shift")
+        assert values(store.column("page_load_time")) == [float(i) for i in range(9)]
+        shifts = values(store.column("cumulative_layout_shift"))
+        assert len(shifts) == 9
+        assert all(math.isnan(value) for value in shifts[:7] + shifts[8:])
+        assert shifts[7] == 0.25
+
+
+def test_flushed_store_is_readable_before_close(tmp_path):
+    path = str(tmp_path / "run.qoecol")
+    writer = ColumnarWriter(path)
+    writer.write(record(0, {"page_load_time": 1.0}))
+    writer.flush()
+    assert len(ColumnStore(path)) == 1
+    writer.close()
+
+
+def test_export_and_load_column_across_stores(tmp_path, backend):
+    stores = []
+    for name, metrics in (("first", {"page_load_time": 1.0}), ("second", {"first_paint": 2.0})):
+        stream = str(tmp_path / f"{name}.jsonl")
+        with JSONLSink(stream) as sink:
+            sink.write(record(0, metrics))
+        stores.append(str(tmp_path / f"{name}.qoecol"))
+        assert export_jsonl([stream], stores[-1]) == 1
+    load_times = values(load_column(stores, "page_load_time"))
+    assert load_times[0] == 1.0 and math.isnan(load_times[1])
+
+
+def test_unknown_column_raises(tmp_path):
+    path = str(tmp_path / "run.qoecol")
+    with ColumnarWriter(path) as writer:
+        writer.write(record(0, {}))
+    with pytest.raises(KeyError):
+        ColumnStore(path).column("page_load_time")
@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+import qoe_compare
+from qoe_compare import compare_samples, load_samples, min_p_value, samples_needed, samples_from_results
+from qoe_sinks import JSONLSink
+from qoe_stats import mann_whitney_u
+
+
+def test_min_p_value_and_samples_needed():
+    assert min_p_value(3, 3) == pytest.approx(0.1)
+    assert min_p_value(1, 1) == 1.0
+    assert samples_needed(0.05) == 4
+    assert samples_needed(0.01) == 5
+
+
+@pytest.mark.skipif(qoe_compare.numpy is None, reason="numpy is not installed")
+def test_batched_tests_match_mann_whitney_u():
+    rng = random.Random(1)
+    pairs = []
+    for m, n in ((5, 5), (5, 5), (8, 6), (25, 30)):
+        pairs.append(([rng.randint(90, 110) for _ in range(m)], [rng.randint(95, 115) for _ in range(n)]))
+    pairs.append(([1.5, 2.5, 3.5, 4.5, 5.5], [6.5, 7.5, 8.5, 9.5, 10.5]))
+    for (statistic, p_value), (baseline, candidate) in zip(qoe_compare._run_tests(pairs), pairs):
+        expected = mann_whitney_u(baseline, candidate)
+        assert statistic == expected["statistic"]
+        assert p_value == pytest.approx(expected["p_value"])
+
+
+def test_flags_a_regression_and_ranks_it(monkeypatch):
+    baseline = {
+        "a.com": {"page_load_time": [100, 101, 102, 103, 104, 105]},
+        "b.com": {"page_load_time": [100, 101, 102, 103, 104, 105]},
+    }
+    candidate = {
+        "a.com": {"page_load_time": [130, 131, 132, 133, 134, 135]},
+        "b.com": {"page_load_time": [101, 100, 103, 102, 105, 104]},
+    }
+    for backend in (qoe_compare.numpy, None):
+        monkeypatch.setattr(qoe_compare, "numpy", backend)
+        comparison = compare_samples(baseline, candidate)
+        [regression] = comparison["regressions"]
+        assert regression["key"] == "a.com"
+        assert regression["cliffs_delta"] == 1.0
+        assert regression["relative_change"] == pytest.approx(30 / 102.5)
+        assert regression["q_value"] == pytest.approx(2 * 2 / 924)
+        assert comparison["improvements"] == []
+        assert len(comparison["comparisons"]) == 2
+
+
+def test_skips_pairs_that_cannot_be_tested():
+    baseline = {
+        "a.com": {"ttfb": [1, 2, 3]},
+        "b.com": {"ttfb": [1]},
+        "c.com": {},
+        "d.com": {"ttfb": [1, 2]},
+    }
+    candidate = {
+        "a.com": {"ttfb": [4, 5, 6]},
+        "b.com": {"ttfb": [1, 2]},
+        "c.com": {"ttfb": [1, 2]},
+        "e.com": {"ttfb": [1, 2]},
+    }
+    comparison = compare_samples(baseline, candidate)
+    assert comparison["comparisons"] == []
+    assert comparison["skipped"] == {
+        "baseline_only": ["d.com"],
+        "candidate_only": ["e.com"],
+        "no_values": ["c.com"],
+        "too_few_samples": [("b.com", "ttfb")],
+        "underpowered": [("a.com", "ttfb", 3, 3)],
+    }
+
+
+def test_load_samples_from_a_results_stream(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    with JSONLSink(path) as sink:
+        for url in ("https://a.com/x", "https://a.com/y", "https://b.com/"):
+            for iteration in range(2):
+                sink.write({"url": url, "profile": "3g", "variant": None, "iteration": iteration,
+                            "metrics": {"ttfb": 10.0 + iteration, "page_load_time": None}, "error": None})
+    assert load_samples(path, metrics=("ttfb", "page_load_time")) == {
+        "a.com/x [3g]": {"ttfb": [10.0, 11.0]},
+        "a.com/y [3g]": {"ttfb": [10.0, 11.0]},
+        "b.com [3g]": {"ttfb": [10.0, 11.0]},
+    }
+
+
+def test_samples_from_results_keeps_keys_without_values():
+    results = {"a.com": {"values": {"ttfb": [1, 2], "fcp": [3]}}, "b.com": {"ttfb": 5}}
+    assert samples_from_results(results, metrics=["ttfb"]) == {"a.com": {"ttfb": [1.0, 2.0]}, "b.com": {}}
@@ -0,0 +1,52 @@
+from qoe_history import HistoryStore, flatten_results, result_key, shared_hosts, split_result_key
+
+
+def test_result_key_is_the_domain_with_labels():
+    assert result_key("https://www.example.com/") == "www.example.com"
+    assert result_key("https://www.example.com/news?page=2") == "www.example.com"
+    assert result_key("https://example.com", "3g") == "example.com [3g]"
+    assert result_key("https://example.com", "3g", "baseline") == "example.com [3g] [baseline]"
+    assert result_key("https://example.com", variant="extension") == "example.com [extension]"
+
+
+def test_result_key_with_page():
+    assert result_key("https://example.com/", page=True) == "example.com"
+    assert result_key("https://example.com/news/", "3g", page=True) == "example.com/news [3g]"
+    assert result_key("https://example.com/?q=1", page=True) == "example.com/?q=1"
+
+
+def test_shared_hosts():
+    urls = ["https://a.com", "https://a.com/", "https://b.com/x", "https://b.com/y", "https://c.com/z"]
+    assert shared_hosts(urls) == {"b.com"}
+
+
+def test_split_result_key():
+    assert split_result_key("example.com") == ("example.com", None, None)
+    assert split_result_key("example.com/news [3g] [baseline]") == ("example.com", "3g", "baseline")
+    assert split_result_key("example.com [extension]") == ("example.com", None, "extension")
+
+
+def test_flatten_results_uses_the_result_url():
+    results = {"a.com/x [3g]": {"url": "https://a.com/x", "ttfb": 10, "stats": {"ttfb": {"p95": 20}}}}
+    assert sorted(flatten_results(results)) == [
+        ("https://a.com/x", "a.com", "3g", None, "ttfb", 10.0),
+        ("https://a.com/x", "a.com", "3g", None, "ttfb.p95", 20.0),
+    ]
+
+
+def test_trend_keeps_profiles_apart():
+    with HistoryStore(":memory:") as store:
+        store.ingest_results({
+            "a.com [3g]": {"url": "https://a.com", "ttfb": 10},
+            "a.com [cable]": {"url": "https://a.com", "ttfb": 2},
+        }, run_at=86400)
+        rows = store.trend("ttfb", domain="a.com")
+        assert [(row["profile"], row["mean"]) for row in rows] == [("3g", 10.0), ("cable", 2.0)]
+        assert [row["mean"] for row in store.aggregate("ttfb", profile="3g")] == [10.0]
+
+
+def test_ingesting_a_source_twice_is_a_no_op():
+    with HistoryStore(":memory:") as store:
+        assert store.ingest_results({"a.com": {"ttfb": 1}}, source="run.json") is not None
+        assert store.ingest_results({"a.com": {"ttfb": 1}}, source="run.json") is None
+        assert store.metrics() == ["ttfb"]
@@ -0,0 +1,92 @@
+import pytest
+
+import qoe_queue
+from qoe_queue import WorkQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(qoe_queue, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    with WorkQueue(str(tmp_path / "queue.db"), lease_seconds=10, max_attempts=2) as queue:
+        yield queue
+
+
+def test_enqueue_is_idempotent(queue):
+    assert queue.enqueue(["https://a.test", "https://b.test"], 2) == 4
+    assert queue.enqueue(["https://a.test", "https://b.test"], 3) == 2
+    assert queue.urls() == ["https://a.test", "https://b.test"]
+    assert queue.counts() == {"pending": 6, "leased": 0, "done": 0, "failed": 0}
+
+
+def test_claims_spread_iterations_across_urls(queue):
+    queue.enqueue(["https://a.test", "https://b.test"], 2)
+    tasks = queue.claim("w1", limit=3)
+    assert [(task.url, task.iteration, task.attempts) for task in tasks] == [
+        ("https://a.test", 0, 1), ("https://b.test", 0, 1), ("https://a.test", 1, 1)
+    ]
+    [task] = queue.claim("w2", limit=3)
+    assert (task.url, task.iteration) == ("https://b.test", 1)
+    assert task.id not in {claimed.id for claimed in tasks}
+    assert queue.claim("w3") == []
+
+
+def test_expired_leases_are_requeued_then_failed(queue, clock):
+    queue.enqueue(["https://a.test"], 1)
+    [task] = queue.claim("w1")
+    clock.now += 5
+    assert queue.claim("w2") == []
+
+    clock.now += 6
+    [task] = queue.claim("w2")
+    assert task.attempts == 2
+
+    clock.now += 11
+    assert queue.claim("w3") == []
+    assert queue.counts()["failed"] == 1
+    assert list(queue.iter_samples()) == [
+        ("https://a.test", {"iteration": 0, "metrics": {}, "error": "Abandoned after 2 expired leases"})
+    ]
+
+
+def test_heartbeat_keeps_the_lease(queue, clock):
+    queue.enqueue(["https://a.test"], 1)
+    [task] = queue.claim("w1")
+    clock.now += 8
+    assert queue.heartbeat("w1", [task.id]) == 1
+    assert queue.heartbeat("w2", [task.id]) == 0
+    clock.now += 8
+    assert queue.claim("w2") == []
+
+
+def test_late_completion_is_accepted_once(queue, clock):
+    queue.enqueue(["https://a.test"], 1)
+    [task] = queue.claim("w1")
+    clock.now += 11
+    [retry] = queue.claim("w2")
+    assert queue.complete("w1", task.id, {"iteration": 0, "metrics": {"page_load_time": 1.0}, "error": None})
+    assert not queue.complete("w2", retry.id, {"iteration": 0, "metrics": {}, "error": "late"})
+    assert queue.outstanding() == 0
+    assert list(queue.iter_samples()) == [
+        ("https://a.test", {"iteration": 0, "metrics": {"page_load_time": 1.0}, "error": None})
+    ]
+
+
+def test_release_returns_the_task_without_charging_an_attempt(queue):
+    queue.enqueue(["https://a.test"], 1)
+    [task] = queue.claim("w1")
+    queue.release("w1", [task.id])
+    assert queue.claim("w2")[0].attempts == 1
@@ -0,0 +1,150 @@
+import threading
+import time
+
+from qoe_scheduler import Attempt, AttemptCancelled, DeadlineScheduler
+
+
+class FixedPlan:
+    """Plan that takes `iterations` samples of every case, with no follow-ups."""
+
+    def __init__(self, cases, iterations):
+        self.tasks = [(index, iteration) for iteration in range(iterations) for index in range(len(cases))]
+
+    def initial_tasks(self):
+        return list(self.tasks)
+
+
+class FakeDriver:
+    """Stands in for a browser; cancelling the attempt quits it."""
+
+    def __init__(self):
+        self.quit_event = threading.Event()
+
+    def quit(self):
+        self.quit_event.set()
+
+
+class FakeRunner:
+    """
+    Runner that takes `duration(url, iteration, attempt)` seconds per sample,
+    or until its attempt is cancelled.
+    """
+
+    def __init__(self, duration=lambda url, iteration, attempt: 0.0, error=lambda url, iteration, attempt: None):
+        self.duration = duration
+        self.error = error
+        self.running = 0
+        self.peak = 0
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, url, iteration, profile, attempt=None):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.calls.append((url, iteration, attempt.hedge))
+        try:
+            driver = FakeDriver()
+            attempt.bind(driver)
+            cancelled = driver.quit_event.wait(self.duration(url, iteration, attempt))
+            return {
+                "url": url,
+                "iteration": iteration,
+                "profile": profile,
+                "metrics": {} if cancelled else {"page_load_time": 100.0},
+                "error": "WebDriver error: quit" if cancelled else self.error(url, iteration, attempt),
+            }
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def run(scheduler, urls, iterations=1):
+    cases = [(url, None) for url in urls]
+    delivered = []
+    scheduler.run(FixedPlan(cases, iterations), cases, lambda index, sample: delivered.append(sample) or [])
+    return delivered
+
+
+def test_every_sample_is_delivered_once():
+    runner = FakeRunner(lambda url, iteration, attempt: 0.01)
+    samples = run(DeadlineScheduler(runner, workers=3, hedge_slots=0), ["a", "b"], iterations=3)
+    assert sorted((sample["url"], sample["iteration"]) for sample in samples) == [
+        ("a", 0), ("a", 1), ("a", 2), ("b", 0), ("b", 1), ("b", 2)
+    ]
+    assert all(sample["attempts"] == 1 and not sample["hedged"] and not sample["error"] for sample in samples)
+    assert runner.peak <= 3
+
+
+def test_run_budget_cancels_and_skips_the_rest():
+    runner = FakeRunner(lambda url, iteration, attempt: 30)
+    scheduler = DeadlineScheduler(runner, workers=2, run_budget=0.2, hedge_slots=0)
+    start = time.monotonic()
+    samples = run(scheduler, ["a", "b", "c"], iterations=2)
+    assert time.monotonic() - start < 5
+    assert len(samples) == 6
+    assert all(sample["error"] == "Skipped: run budget exhausted" for sample in samples)
+    assert scheduler.stats["skipped"] == 6
+    # Samples that never started did not get a browser
+    assert len(runner.calls) == 2
+
+
+def test_url_budget_only_skips_the_slow_url():
+    runner = FakeRunner(lambda url, iteration, attempt: 30 if url == "slow" else 0.01)
+    scheduler = DeadlineScheduler(runner, workers=2, url_budget=0.2, hedge_slots=0)
+    samples = run(scheduler, ["slow", "fast"], iterations=2)
+    errors = {(sample["url"], sample["iteration"]): sample["error"] for sample in samples}
+    assert errors[("slow", 0)] == errors[("slow", 1)] == "Skipped: URL budget exhausted"
+    assert errors[("fast", 0)] is None and errors[("fast", 1)] is None
+
+
+def test_hedge_wins_over_a_stuck_primary_attempt():
+    def duration(url, iteration, attempt):
+        # The fourth sample's primary attempt hangs; its hedge is fast
+        return 30 if iteration == 3 and not attempt.hedge else 0.01
+
+    runner = FakeRunner(duration)
+    scheduler = DeadlineScheduler(runner, workers=1, hedge_slots=1, hedge_min_samples=3, hedge_quantile=0.9)
+    samples = run(scheduler, ["a"], iterations=4)
+    last = next(sample for sample in samples if sample["iteration"] == 3)
+    assert last["hedged"] and last["hedge_won"] and last["attempts"] == 2 and not last["error"]
+    assert not any(sample["hedge_won"] for sample in samples if sample["iteration"] < 3)
+    assert scheduler.stats["hedges"] == 1
+    assert scheduler.stats["hedge_wins"] == 1
+    assert scheduler.stats["cancelled"] == 1
+    assert runner.peak <= 2
+
+
+def test_transient_errors_are_retried():
+    def error(url, iteration, attempt):
+        return "WebDriver error: flaky" if attempt.number == 1 else None
+
+    runner = FakeRunner(error=error)
+    scheduler = DeadlineScheduler(runner, hedge_slots=0, max_retries=2, backoff=0.01,
+                                  is_retryable=lambda sample: sample["error"].startswith("WebDriver error:"))
+    samples = run(scheduler, ["a"])
+    assert samples[0]["error"] is None and samples[0]["attempts"] == 2
+    assert scheduler.stats["retries"] == 1
+
+
+def test_permanent_errors_are_not_retried():
+    runner = FakeRunner(error=lambda url, iteration, attempt: "Error: boom")
+    scheduler = DeadlineScheduler(runner, hedge_slots=0, max_retries=2, backoff=0.01)
+    samples = run(scheduler, ["a"])
+    assert samples[0]["error"] == "Error: boom" and samples[0]["attempts"] == 1
+
+
+def test_a_cancelled_attempt_refuses_to_start_or_bind():
+    attempt = Attempt(job=None, number=1)
+    driver = FakeDriver()
+    attempt.start()
+    attempt.bind(driver)
+    attempt.cancel()
+    assert driver.quit_event.is_set()
+    for method in (attempt.start, lambda: attempt.bind(FakeDriver())):
+        try:
+            method()
+        except AttemptCancelled:
+            pass
+        else:
+            raise AssertionError("cancelled attempt was not refused")
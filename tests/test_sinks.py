@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from qoe_sinks import JSONLSink, read_jsonl
+
+
+def test_records_round_trip(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    with JSONLSink(path, buffer_size=2) as sink:
+        for iteration in range(5):
+            sink.write({"iteration": iteration, "metrics": {"page_load_time": 100.0 + iteration}})
+    assert [record["iteration"] for record in read_jsonl(path)] == [0, 1, 2, 3, 4]
+
+
+def test_reopening_drops_a_partial_last_record(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(json.dumps({"iteration": 0}) + "\n" + '{"iteration": 1, "metr')
+    assert [record["iteration"] for record in read_jsonl(str(path))] == [0]
+    with JSONLSink(str(path)) as sink:
+        sink.write({"iteration": 2})
+    assert [json.loads(line)["iteration"] for line in path.read_text().splitlines()] == [0, 2]
+
+
+def test_malformed_record_before_the_end_raises(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text('{"iteration": 0}\n{"iteration": \n{"iteration": 2}\n')
+    with pytest.raises(ValueError, match=":2: malformed"):
+        list(read_jsonl(str(path)))
+
+
+def test_write_after_close_raises(tmp_path):
+    sink = JSONLSink(str(tmp_path / "results.jsonl"))
+    sink.close()
+    with pytest.raises(ValueError):
+        sink.write({})
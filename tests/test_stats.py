@@ -0,0 +1,99 @@
+import math
+import random
+
+import pytest
+
+from qoe_stats import (
+    QuantileSketch, benjamini_hochberg, mann_whitney_null_cdf, mann_whitney_p_value, mann_whitney_u,
+    paired_t_test, relative_ci_halfwidth, t_critical, wilcoxon_signed_rank
+)
+
+
+def test_t_critical_matches_tables():
+    assert t_critical(1) == pytest.approx(12.7062, abs=1e-4)
+    assert t_critical(10) == pytest.approx(2.2281, abs=1e-4)
+    assert t_critical(30) == pytest.approx(2.0423, abs=1e-4)
+    assert t_critical(10, confidence=0.99) == pytest.approx(3.1693, abs=1e-4)
+
+
+def test_paired_t_test():
+    result = paired_t_test([1, 2, 3, 4, 5])
+    assert result["t"] == pytest.approx(math.sqrt(18))
+    assert result["p_value"] == pytest.approx(0.013236, abs=1e-6)
+    assert result["ci_low"] == pytest.approx(3 - 2.7764 * math.sqrt(2.5 / 5), abs=1e-3)
+    assert paired_t_test([1]) is None
+    assert paired_t_test([0, 0, 0])["p_value"] == 1.0
+
+
+def test_wilcoxon_signed_rank_exact():
+    assert wilcoxon_signed_rank([1, 2, 3, 4, 5]) == {"n": 5, "statistic": 15.0, "p_value": 0.0625}
+    result = wilcoxon_signed_rank([1, -2, 3, 4, 5, 6, 0])
+    assert result["n"] == 6
+    assert result["statistic"] == 19.0
+    assert result["p_value"] == pytest.approx(0.09375)
+    assert wilcoxon_signed_rank([0, 0]) is None
+
+
+def test_mann_whitney_u_exact():
+    result = mann_whitney_u([1, 2, 3], [4, 5, 6])
+    assert result == {"statistic": 9.0, "p_value": pytest.approx(0.1), "cliffs_delta": 1.0}
+    assert mann_whitney_u([1, 2, 3, 4, 5], [6, 7, 8, 9, 10])["p_value"] == pytest.approx(2 / 252)
+    assert mann_whitney_u([6, 7, 8], [1, 2, 3])["cliffs_delta"] == -1.0
+    assert mann_whitney_u([], [1]) is None
+
+
+def test_mann_whitney_u_with_ties_uses_the_normal_approximation():
+    result = mann_whitney_u([1, 2, 2, 3], [2, 3, 4, 5])
+    assert result["statistic"] == 13.5
+    # Tie-corrected variance 16 / 12 * (9 - 30 / 56), continuity corrected
+    z = (13.5 - 8 - 0.5) / math.sqrt(16 / 12 * (9 - 30 / 56))
+    assert result["p_value"] == pytest.approx(math.erfc(z / math.sqrt(2)))
+    assert result["p_value"] == pytest.approx(0.13666, abs=1e-5)
+
+
+def test_mann_whitney_null_cdf():
+    assert mann_whitney_null_cdf(2, 2) == pytest.approx((1 / 6, 2 / 6, 4 / 6, 5 / 6, 1.0))
+    cdf = mann_whitney_null_cdf(4, 7)
+    assert len(cdf) == 29
+    assert cdf[0] == pytest.approx(1 / math.comb(11, 4))
+    # The null distribution is symmetric
+    assert mann_whitney_p_value(3, 4, 7) == pytest.approx(mann_whitney_p_value(25, 4, 7))
+
+
+def test_benjamini_hochberg():
+    assert benjamini_hochberg([0.01, 0.04, 0.03, 0.005]) == pytest.approx([0.02, 0.04, 0.04, 0.02])
+    assert benjamini_hochberg([0.5, 0.9]) == pytest.approx([0.9, 0.9])
+    assert benjamini_hochberg([]) == []
+
+
+def test_quantile_sketch_accuracy_and_moments():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(6, 1) for _ in range(5000)]
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    sketch.extend(values)
+    ordered = sorted(values)
+    for q in (0.5, 0.9, 0.99):
+        exact = ordered[math.ceil(q * len(ordered)) - 1]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+    assert sketch.count == len(values)
+    assert sketch.mean == pytest.approx(sum(values) / len(values))
+    assert sketch.min == min(values) and sketch.max == max(values)
+
+
+def test_quantile_sketch_merge_and_round_trip():
+    rng = random.Random(3)
+    left, right, both = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for index in range(1000):
+        value = rng.uniform(10, 1000)
+        (left if index % 2 else right).add(value)
+        both.add(value)
+    left.merge(right)
+    assert left.summary() == pytest.approx(both.summary())
+    assert QuantileSketch.from_dict(both.to_dict()).summary() == pytest.approx(both.summary())
+
+
+def test_relative_ci_halfwidth():
+    sketch = QuantileSketch()
+    sketch.extend([90, 100, 110])
+    assert relative_ci_halfwidth(sketch) == pytest.approx(t_critical(2) * 10 / math.sqrt(3) / 100, rel=1e-6)
+    assert relative_ci_halfwidth(QuantileSketch()) is None